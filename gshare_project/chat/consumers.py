@@ -1,14 +1,15 @@
 import json
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .models import Message, ChatGroup, DirectMessageThread, Notification
+from .models import Message, ChatGroup, DirectMessageThread
 from django.contrib.auth.models import User
 from channels.db import database_sync_to_async
 from core.utils.aws_s3 import upload_image_to_aws, presigned_url
 import base64
 from io import BytesIO
 from django.core.files.uploadedfile import InMemoryUploadedFile
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from .notify import create_notifications, fan_out, run_in_background
+from . import history, media, unread, wire
 
 class ChatConsumer(AsyncWebsocketConsumer):
 
@@ -23,6 +24,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.thread_id = self.scope['url_route']['kwargs']['thread_id']
             self.room_group_name = f'dm_{self.thread_id}'
 
+        # Sender, conversation and members are resolved once per connection;
+        # membership_changed events refresh the member list
+        if not await self.load_context():
+            await self.close()
+            return
+
         # Join the chat room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -37,8 +44,28 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
+        # A reconnecting client passes the last message id it saw and gets
+        # everything it missed in one frame instead of refetching the room
+        since_id = self._since_id()
+        if since_id is not None:
+            await self.send(text_data=wire.encode(await self.build_resume(since_id)))
+
+    def _since_id(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            return int(query['since_id'][0])
+        except (KeyError, ValueError):
+            return None
+
+    @database_sync_to_async
+    def build_resume(self, since_id):
+        messages = Message.objects.filter(group=self.group, thread=self.thread)
+        return history.resume(messages, since_id, self.scope['user'])
+
     async def disconnect(self, close_code):
         user = self.scope['user']
+        if not hasattr(self, 'members'):
+            return  # closed during connect, never joined any group
 
         # Leave the chat room group
         await self.channel_layer.group_discard(
@@ -53,30 +80,45 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
 
     @database_sync_to_async
-    def handle_new_message(self, sender_username, chat_group_slug, message_content):
-        """
-        Creates notifications for all members of the chat except the sender
-        and returns a list of usernames who should receive real-time notifications.
-        """
-        notified_users = []
-
+    def load_context(self):
+        """Cache the sender, the target conversation and its members. False if the conversation is gone."""
+        user = self.scope['user']
+        self.sender = user if user.is_authenticated else None
         try:
-            # Get the chat group
-            group = ChatGroup.objects.get(slug=chat_group_slug)
+            if hasattr(self, 'room_name'):
+                self.group = ChatGroup.objects.get(slug=self.room_name)
+                self.thread = None
+                members = self.group.members
+            else:
+                self.thread = DirectMessageThread.objects.get(id=self.thread_id)
+                self.group = None
+                members = self.thread.participants
+        except (ChatGroup.DoesNotExist, DirectMessageThread.DoesNotExist, ValueError):
+            print(f"Chat connection to missing conversation: {self.room_group_name}")
+            return False
+        self.members = list(members.values_list('id', 'username'))
+        return True
 
-            for member in group.members.all():
-                if member.username != sender_username:
-                    # Create a notification in the database
-                    Notification.objects.create(
-                        user=member,
-                        message=f"New message from {sender_username}: {message_content[:50]}"
-                    )
-                    notified_users.append(member.username)
+    async def membership_changed(self, event):
+        await self.load_context()
 
-        except ChatGroup.DoesNotExist:
-            print(f"ChatGroup with slug {chat_group_slug} does not exist.")
+    def _recipients(self, sender_username):
+        return [(uid, name) for uid, name in self.members if name != sender_username]
 
-        return notified_users
+    @database_sync_to_async
+    def handle_new_message(self, sender_username, message_content, message_obj=None):
+        """
+        Creates notifications for all members of the chat except the sender
+        and returns a list of usernames who should receive real-time notifications.
+        """
+        recipients = self._recipients(sender_username)
+        if message_obj is not None:
+            unread.bump(message_obj, [uid for uid, _ in recipients])
+        return create_notifications(
+            recipients,
+            f"New message from {sender_username}: {message_content[:50]}",
+            message_obj,
+        )
 
     @database_sync_to_async
     def get_presigned_url(self, image_key):
@@ -85,28 +127,21 @@ class ChatConsumer(AsyncWebsocketConsumer):
     
     @database_sync_to_async
     def save_message(self, username, message, image_key=None):
-        from django.contrib.auth.models import User
-        from .models import Message, ChatGroup, DirectMessageThread
-
+        # one INSERT: sender and conversation come from the connection's context;
+        # unread counters and notifications follow in the background stage
         try:
-            user = User.objects.get(username=username)
-
-            if hasattr(self, 'room_name'):
-                group = ChatGroup.objects.get(slug=self.room_name)
-                msg = Message.objects.create(
-                    group=group,
-                    sender=user,
-                    content=message,
-                    image=image_key  # store the S3 key here
-                )
+            if self.sender is not None and self.sender.username == username:
+                user = self.sender
             else:
-                thread = DirectMessageThread.objects.get(id=self.thread_id)
-                msg = Message.objects.create(
-                    thread=thread,
-                    sender=user,
-                    content=message,
-                    image=image_key  # store the S3 key here
-                )
+                user = User.objects.get(username=username)
+
+            msg = Message.objects.create(
+                group=self.group,
+                thread=self.thread,
+                sender=user,
+                content=message,
+                image=image_key  # store the S3 key here
+            )
 
             print(f"Message saved successfully. ID: {msg.id}, Image: {image_key}")
             return msg
@@ -127,11 +162,18 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 image_data = data.get('image')
                 image_key = None
 
-                # Handle image upload asynchronously
-                if image_data:
+                if data.get('image_key'):
+                    # uploaded straight to S3 via chat_upload_url; the frame only carries the key
+                    # ownership follows the authenticated socket, not the username in the frame
+                    if media.is_own_upload(data['image_key'], self.scope['user'].username):
+                        image_key = data['image_key']
+                    else:
+                        print(f"Rejected image key from {username}: {data['image_key']}")
+                elif image_data:
+                    # legacy base64 frames: decode and upload on the shared media pool
                     try:
                         print("Processing image upload...")
-                        image_file = self._base64_to_file(image_data)
+                        image_file = await media.run(self._base64_to_file, image_data)
                         image_key = await self._upload_to_aws_async(username, image_file)
                         print(f"Image uploaded successfully: {image_key}")
                     except Exception as e:
@@ -139,60 +181,45 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
                 # Save the message asynchronously
                 msg = await self.save_message(username, message, image_key)
+                media.schedule_thumbnail(msg)
+
+                # Sign the image once here; every receiver gets the same URL
+                image_url = await self.get_presigned_url(image_key) if image_key else None
 
-                # Send the message to the room group
+                # Send the message to the room group, encoded once for every receiver
                 await self.channel_layer.group_send(
                     self.room_group_name,
-                    {
-                        'type': 'chat_message',
+                    wire.frame('chat_message', {
+                        'type': 'message',
+                        'id': msg.id,
+                        'cursor': history.encode_cursor(msg),
                         'username': username,
                         'message': message,
-                        'image_url': image_key
-                    }
+                        'image_url': image_url
+                    })
                 )
 
-                # Handle notifications
-                notified_users = []
-
-                if hasattr(self, 'room_name'):
-                    # Group chat notifications
-                    notified_users = await self.handle_new_message(
-                        sender_username=username,
-                        chat_group_slug=self.room_name,
-                        message_content=message
-                    )
-                elif hasattr(self, 'thread_id'):
-                    # DM notifications
-                    notified_users = await self._notify_dm_participants(self.thread_id, username)
-
-                # Send notifications to each user's personal group
-                for u in notified_users:
-                    await self.channel_layer.group_send(
-                        f"user_{u}",
-                        {
-                            'type': 'chat_notification',
-                            'username': username,
-                            'message': message
-                        }
-                    )
+                # Notifications are written and fanned out in the background so
+                # this socket can take its next frame right away
+                run_in_background(self._send_notifications(username, message, msg))
 
             elif message_type == 'typing_start':
                 username = data['username']
                 await self.channel_layer.group_send(
                     self.room_group_name,
-                    {
-                        'type': 'user_typing_start',
+                    wire.frame('user_typing_start', {
+                        'type': 'typing_start',
                         'username': username
-                    }
+                    })
                 )
             elif message_type == 'typing_stop':
                 username = data['username']
                 await self.channel_layer.group_send(
                     self.room_group_name,
-                    {
-                        'type': 'user_typing_stop',
+                    wire.frame('user_typing_stop', {
+                        'type': 'typing_stop',
                         'username': username
-                    }
+                    })
                 )
 
         except json.JSONDecodeError:
@@ -222,76 +249,58 @@ class ChatConsumer(AsyncWebsocketConsumer):
             raise Exception(f"Error converting base64 to file: {e}")
     
     async def _upload_to_aws_async(self, username, file):
-        """Run AWS upload in thread pool to avoid blocking"""
-        loop = asyncio.get_event_loop()
-        executor = ThreadPoolExecutor()
+        """Run AWS upload on the shared media pool to avoid blocking"""
         folder = f'chat/{username}'.strip('/')  # remove trailing slash
-        return await loop.run_in_executor(
-            executor,
-            upload_image_to_aws,
-            file,
-            folder
-        )
+        return await media.run(upload_image_to_aws, file, folder)
                 
+    # Group events carry a frame already encoded by the sender (chat.wire);
+    # receivers only forward it.
     async def chat_message(self, event):
-        username = event['username']
-        message = event['message']
-        image_key = event.get('image_url')
-        
-        presigned = None
-        if image_key:
-            presigned = await self.get_presigned_url(image_key)
-            print(f"Image key: {image_key}, presigned URL: {presigned}")
-        
-        await self.send(text_data=json.dumps({
-            'type': 'message',
-            'username': username,
-            'message': message,
-            'image_url': presigned
-        }))
-    
+        await self.send(text_data=event['text'])
+
+    async def message_edited(self, event):
+        await self.send(text_data=event['text'])
+
     async def user_typing_start(self, event):
-        username = event['username']
-        await self.send(text_data=json.dumps({
-            'type': 'typing_start',
-            'username': username
-        }))
-    
+        await self.send(text_data=event['text'])
+
     async def user_typing_stop(self, event):
-        username = event['username']
-        await self.send(text_data=json.dumps({
-            'type': 'typing_stop',
-            'username': username
-        }))
-    
+        await self.send(text_data=event['text'])
+
     async def chat_notification(self, event):
-        username = event['username']
-        message = event['message']
-        
-        if self.scope['user'].username != username:
-            await self.send(text_data=json.dumps({
-                'type': 'notification',
-                'title': f"New message from {username}",
-                'body': message[:50] + ("..." if len(message) > 50 else "")
-            }))
+        if self.scope['user'].username != event['username']:
+            await self.send(text_data=event['text'])
     
+    async def _send_notifications(self, username, message, msg):
+        if hasattr(self, 'room_name'):
+            # Group chat notifications
+            notified_users = await self.handle_new_message(
+                sender_username=username,
+                message_content=message,
+                message_obj=msg,
+            )
+        else:
+            # DM notifications
+            notified_users = await self._notify_dm_participants(self.thread_id, username, msg)
+
+        # Send notifications to each user's personal group
+        await fan_out(self.channel_layer, notified_users, wire.frame('chat_notification', {
+            'type': 'notification',
+            'title': f"New message from {username}",
+            'body': message[:50] + ("..." if len(message) > 50 else "")
+        }, username=username))
+
     @database_sync_to_async
     def get_dm_thread(thread_id):
         return DirectMessageThread.objects.get(id=thread_id)
 
     @database_sync_to_async
-    def _notify_dm_participants(self, thread_id, sender_username):
+    def _notify_dm_participants(self, thread_id, sender_username, message_obj=None):
         """Notify all participants in a DM thread except the sender."""
-        thread = DirectMessageThread.objects.get(id=thread_id)
-        notified_users = []
-        for member in thread.participants.all():
-            if member.username != sender_username:
-                Notification.objects.create(
-                    user=member,
-                    message=f"{sender_username} sent a DM"
-                )
-                notified_users.append(member.username)
-        return notified_users
+        recipients = self._recipients(sender_username)
+        if message_obj is not None:
+            unread.bump(message_obj, [uid for uid, _ in recipients])
+        return create_notifications(recipients, f"{sender_username} sent a DM", message_obj)
 
 
             
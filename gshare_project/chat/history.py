@@ -0,0 +1,127 @@
+# chat/history.py
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Q
+
+from core.utils.aws_s3 import presigned_urls
+
+# Messages rendered with the page; older ones are fetched as the user scrolls up.
+INITIAL_WINDOW = 30
+PAGE_SIZE = 50
+MAX_PAGE = 200
+# A reconnecting socket gets at most this many missed messages/edits in its
+# resume frame; past that it is told to refetch through list_messages.
+RESUME_LIMIT = 200
+RESUME_NOTIFICATIONS = 20
+DELETED = "(deleted)"
+
+
+def encode_cursor(msg) -> str:
+    """Opaque keyset position of a message: '<epoch microseconds>_<id>'."""
+    ts = msg.timestamp
+    micros = int(ts.timestamp()) * 1_000_000 + ts.microsecond
+    return f"{micros}_{msg.id}"
+
+
+def decode_cursor(value):
+    """(timestamp, id) for a cursor string, or None if it is malformed."""
+    try:
+        micros, pk = (int(p) for p in str(value).split("_", 1))
+        ts = datetime.fromtimestamp(micros // 1_000_000, tz=dt_timezone.utc).replace(microsecond=micros % 1_000_000)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    return ts, pk
+
+
+def page(queryset, before=None, after=None, limit=PAGE_SIZE):
+    """
+    One page of a room's messages in chronological order, keyed on (timestamp, id).
+
+    before: cursor -> the `limit` messages just older than it (scrolling up)
+    after:  cursor -> the `limit` messages just newer than it (polling)
+    neither -> the newest `limit` messages
+
+    Returns (messages, has_more) where has_more says whether another page
+    exists further in the same direction.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE))
+    qs = queryset.select_related("sender")
+
+    if after is not None:
+        ts, pk = after
+        rows = list(
+            qs.filter(Q(timestamp__gt=ts) | Q(timestamp=ts, id__gt=pk))
+            .order_by("timestamp", "id")[:limit + 1]
+        )
+        return rows[:limit], len(rows) > limit
+
+    if before is not None:
+        ts, pk = before
+        qs = qs.filter(Q(timestamp__lt=ts) | Q(timestamp=ts, id__lt=pk))
+    rows = list(qs.order_by("-timestamp", "-id")[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
+
+
+def serialize(messages) -> list:
+    """JSON-ready dicts for a page, signing every image and thumbnail in one batch."""
+    image_urls = presigned_urls(k for m in messages for k in (m.image, m.thumbnail) if k)
+    return [
+        {
+            "id": m.id,
+            "username": m.sender.username,
+            "content": m.content,
+            "image_url": image_urls.get(m.image) if m.image else None,
+            # history renders the small derivative; image_url is the full-size original
+            "thumb_url": image_urls.get(m.thumbnail) if m.image and m.thumbnail else None,
+            "timestamp": m.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            "cursor": encode_cursor(m),
+        }
+        for m in messages
+    ]
+
+
+def resume(queryset, since_id, user) -> dict:
+    """
+    Everything a socket that last saw message since_id has missed in this
+    conversation, as one frame: newer messages, edits/deletes of older ones,
+    and the user's unread notifications since then.
+    """
+    from .models import Notification
+
+    anchor = queryset.filter(id=since_id).values_list("timestamp", flat=True).first()
+    if anchor is None:
+        return {"type": "resume", "messages": [], "edits": [], "notifications": [], "truncated": True}
+
+    missed = list(
+        queryset.select_related("sender").filter(id__gt=since_id).order_by("id")[:RESUME_LIMIT + 1]
+    )
+    # edits made after the anchor was sent may already have been seen; replaying them is harmless
+    edited = list(
+        queryset.filter(id__lte=since_id, edited_at__gt=anchor)
+        .order_by("edited_at").only("id", "content", "image", "thumbnail")[:RESUME_LIMIT + 1]
+    )
+    notifications = (
+        Notification.objects.filter(user=user, is_read=False, created_at__gt=anchor)
+        .order_by("-id").values("id", "message", "created_at")[:RESUME_NOTIFICATIONS]
+    )
+
+    return {
+        "type": "resume",
+        "messages": serialize(missed[:RESUME_LIMIT]),
+        "edits": [edit_payload(m) for m in edited[:RESUME_LIMIT]],
+        "notifications": [
+            {"id": n["id"], "message": n["message"], "created_at": n["created_at"].isoformat()}
+            for n in notifications
+        ],
+        "truncated": len(missed) > RESUME_LIMIT or len(edited) > RESUME_LIMIT,
+    }
+
+
+def edit_payload(message) -> dict:
+    """Compact edit/delete record, as broadcast by edit_message/delete_message."""
+    if message.content == DELETED and not message.image:
+        return {"id": message.id, "deleted": True}
+    return {"id": message.id, "content": message.content}
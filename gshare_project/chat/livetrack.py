@@ -1,6 +1,135 @@
-import json
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from itertools import count
+from uuid import uuid4
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
+from .wire import frame
+
+# Pings are collected per room and emitted as one "positions" frame per tick.
+TICK = 0.5
+# Movements smaller than this (metres) since the last emitted position are dropped.
+MIN_MOVE_M = 5.0
+# Latest-position buffer per room, replayed to late joiners.
+MAX_TRACKED = 200
+
+EARTH_RADIUS_M = 6_371_000
+
+
+def _distance_m(a, b) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+def _coord(value, limit):
+    """float(value) if it is a finite coordinate within +-limit, else None."""
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(v) or abs(v) > limit:
+        return None
+    return v
+
+
+class RoomAggregator:
+    """
+    Per-room, per-process ping buffer. Consumers in this process add pings;
+    a ticker task sends whatever moved as one batched frame every TICK seconds.
+    Frames from every process update `latest`, so a late joiner on any process
+    gets the room's current positions straight away.
+    """
+
+    def __init__(self, room, channel_layer):
+        self.room = room
+        self.channel_layer = channel_layer
+        self.members = 0
+        self.pending = {}          # username -> payload waiting for the next tick
+        self.emitted = {}          # username -> (lat, lng) last sent from this process
+        self.latest = OrderedDict()  # username -> payload, most recently moved last
+        self.task = None
+        # batches are tagged so each process applies one only once, not once per consumer
+        self.origin = uuid4().hex
+        self.batches = count()
+        self.last_batch = None
+
+    def add(self, payload) -> bool:
+        """Queue a ping for the next tick. Returns False if it was dropped as sub-threshold."""
+        name = payload["username"]
+        prev = self.emitted.get(name)
+        prev_role = (self.latest.get(name) or {}).get("role")
+        if prev is not None and prev_role == payload["role"] and \
+                _distance_m(prev, (payload["lat"], payload["lng"])) < MIN_MOVE_M:
+            return False
+
+        self.pending[name] = payload
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._tick())
+        return True
+
+    def seen(self, positions, batch=None) -> None:
+        if batch is not None:
+            if batch == self.last_batch:
+                return
+            self.last_batch = batch
+        for p in positions:
+            self.latest.pop(p["username"], None)
+            self.latest[p["username"]] = p
+        while len(self.latest) > MAX_TRACKED:
+            name, _ = self.latest.popitem(last=False)
+            self.emitted.pop(name, None)
+
+    def snapshot(self) -> list:
+        return list(self.latest.values())
+
+    async def _tick(self):
+        try:
+            while self.members > 0:
+                await asyncio.sleep(TICK)
+                if not self.pending:
+                    continue
+                batch, self.pending = list(self.pending.values()), {}
+                for p in batch:
+                    self.emitted[p["username"]] = (p["lat"], p["lng"])
+                batch_id = f"{self.origin}:{next(self.batches)}"
+                self.seen(batch, batch_id)
+                # positions ride along so every process can refresh its snapshot
+                await self.channel_layer.group_send(self.room, frame(
+                    "positions", {"type": "positions", "positions": batch, "ts": time.time()},
+                    positions=batch, batch=batch_id,
+                ))
+        finally:
+            self.task = None
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+_rooms = {}
+
+
+def join_room(room, channel_layer) -> RoomAggregator:
+    agg = _rooms.get(room)
+    if agg is None:
+        agg = _rooms[room] = RoomAggregator(room, channel_layer)
+    agg.members += 1
+    return agg
+
+
+def leave_room(room) -> None:
+    agg = _rooms.get(room)
+    if agg is None:
+        return
+    agg.members -= 1
+    if agg.members <= 0:
+        agg.close()
+        del _rooms[room]
+
+
 class Tracking(AsyncJsonWebsocketConsumer):
     async def connect(self):
         user = self.scope.get("user")
@@ -13,30 +142,36 @@ class Tracking(AsyncJsonWebsocketConsumer):
         self.room = f"livetrack_room_{self.slug}"
 
         await self.channel_layer.group_add(self.room, self.channel_name)
+        self.aggregator = join_room(self.room, self.channel_layer)
         await self.accept()
+        await self.send_json({"type": "positions", "positions": self.aggregator.snapshot(), "snapshot": True})
 
     async def disconnect(self, code):
         if hasattr(self, "room"):
             await self.channel_layer.group_discard(self.room, self.channel_name)
+        if hasattr(self, "aggregator"):
+            leave_room(self.room)
 
     async def receive_json(self, content, **kwargs):
         if content.get("type") != "ping":
             return
 
-        lat, lng = content.get("lat"), content.get("lng")
-        role = content.get("role", "")
+        lat = _coord(content.get("lat"), 90)
+        lng = _coord(content.get("lng"), 180)
         if lat is None or lng is None:
             return
+        role = str(content.get("role") or "")[:20]
 
         user = self.scope["user"]
-        payload = {
+        self.aggregator.add({
             "type": "update",
             "username": user.username,
-            "lat": float(lat),
-            "lng": float(lng),
+            "lat": lat,
+            "lng": lng,
             "role": role,
-        }
-        await self.channel_layer.group_send(self.room, {"type": "broadcast", "payload": payload})
+        })
 
-    async def broadcast(self, event):
-        await self.send_json(event["payload"])
\ No newline at end of file
+    async def positions(self, event):
+        # frames from other processes keep this process's snapshot current too
+        self.aggregator.seen(event["positions"], event.get("batch"))
+        await self.send(text_data=event["text"])
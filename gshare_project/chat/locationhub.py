@@ -1,19 +1,54 @@
+import asyncio
+import math
 import time
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from django.core.cache import cache
 
-TTL = 120  
-INDEX_KEY = "loc:index" 
+from core.utils.spatial_index import cell_of, cells_for_viewport
+from .presence import get_presence
+from .wire import frame
 
-def _index_add(user_id: int) -> None:
-    ids = cache.get(INDEX_KEY) or []
-    if user_id not in ids:
-        ids.append(user_id)
-    cache.set(INDEX_KEY, ids, TTL)
+# A client viewing more cells than this (zoomed far out) gets no live stream.
+MAX_SUBSCRIBED_CELLS = 100
+MAX_FOLLOWED_USERS = 20
+# Pings from one socket are forwarded at most once per interval; newer ones
+# inside the window replace the pending one (only the latest position is sent).
+PING_INTERVAL = 1.0
+
+
+def cell_group(cell) -> str:
+    return f"loc_cell_{cell[0]}_{cell[1]}"
+
+
+def user_group(uid) -> str:
+    return f"loc_user_{uid}"
+
+
+def subscription_groups(bbox, follow=()) -> set:
+    """Groups a client viewing bbox (and following these user ids) should be in."""
+    groups = set()
+    cells = cells_for_viewport(*bbox) if bbox else None
+    if cells is not None and len(cells) <= MAX_SUBSCRIBED_CELLS:
+        groups.update(cell_group(c) for c in cells)
+    groups.update(user_group(uid) for uid in list(follow)[:MAX_FOLLOWED_USERS])
+    return groups
+
+
+def ping_groups(uid, cell, prev_cell=None) -> set:
+    """Groups a ping is routed to: the sender's cell (and the one it just left) plus its followers."""
+    groups = {cell_group(cell), user_group(uid)}
+    if prev_cell is not None:
+        groups.add(cell_group(prev_cell))
+    return groups
 
 
 class LocationHub(AsyncJsonWebsocketConsumer):
-    group = "location_stream"
+    """
+    Live location stream. Clients send
+      {"type": "subscribe", "bbox": [min_lat, min_lng, max_lat, max_lng], "follow": [uid, ...]}
+    whenever their map settles, and only receive pings from the grid cells in
+    that viewport (plus the users they follow). Pings are throttled per socket.
+    """
 
     async def connect(self):
         user = self.scope.get("user")
@@ -21,27 +56,65 @@ class LocationHub(AsyncJsonWebsocketConsumer):
             await self.close(code=4401)
             return
 
-        await self.channel_layer.group_add(self.group, self.channel_name)
+        self.groups_joined = set()
+        self.last_cell = None
+        self.pending = None
+        self.last_sent = 0.0
+        self.flush_task = None
+
         await self.accept()
         await self.send_json({"type": "hello"})
 
     async def disconnect(self, code):
-        await self.channel_layer.group_discard(self.group, self.channel_name)
+        if getattr(self, "flush_task", None):
+            self.flush_task.cancel()
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(g, self.channel_name)
+            for g in getattr(self, "groups_joined", ())
+        ))
 
     async def receive_json(self, content, **kwargs):
-        if content.get("type") != "ping":
+        kind = content.get("type")
+        if kind == "subscribe":
+            await self.subscribe(content)
+        elif kind == "ping":
+            await self.ping(content)
+
+    async def subscribe(self, content):
+        try:
+            bbox = [float(v) for v in content.get("bbox") or []]
+            follow = [int(v) for v in content.get("follow") or []]
+        except (TypeError, ValueError):
             return
+        # json accepts NaN/Infinity, which the grid maths can't place
+        if not all(map(math.isfinite, bbox)):
+            return
+        if len(bbox) != 4:
+            bbox = None
+
+        wanted = subscription_groups(bbox, follow)
+        added = wanted - self.groups_joined
+        removed = self.groups_joined - wanted
+        await asyncio.gather(
+            *(self.channel_layer.group_add(g, self.channel_name) for g in added),
+            *(self.channel_layer.group_discard(g, self.channel_name) for g in removed),
+        )
+        self.groups_joined = wanted
+        await self.send_json({"type": "subscribed", "groups": len(wanted)})
 
+    async def ping(self, content):
         try:
             lat = float(content["lat"])
             lng = float(content["lng"])
         except Exception:
             return
+        if not (math.isfinite(lat) and math.isfinite(lng)):
+            return
 
         role = (content.get("role") or "").strip()
         user = self.scope["user"]
 
-        payload = {
+        self.pending = {
             "type": "loc",
             "uid": user.id,
             "username": user.username,
@@ -51,12 +124,38 @@ class LocationHub(AsyncJsonWebsocketConsumer):
             "ts": int(time.time()),
         }
 
-        cache.set(f"loc:{user.id}", payload, TTL)  
-        _index_add(user.id)
+        if self.flush_task is not None:
+            return  # a send is already scheduled; it will pick up this position
+        wait = self.last_sent + PING_INTERVAL - time.monotonic()
+        if wait <= 0:
+            await self.flush()
+        else:
+            self.flush_task = asyncio.ensure_future(self.flush_later(wait))
 
-        await self.channel_layer.group_send(
-            self.group, {"type": "broadcast", "payload": payload}
-        )
+    async def flush_later(self, wait):
+        await asyncio.sleep(wait)
+        self.flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        payload, self.pending = self.pending, None
+        if payload is None:
+            return
+        self.last_sent = time.monotonic()
+
+        cell = cell_of(payload["lat"], payload["lng"])
+        prev_cell = self.last_cell if self.last_cell != cell else None
+        self.last_cell = cell
+
+        # presence may be a Redis round trip; keep it off the event loop
+        await sync_to_async(get_presence().update, thread_sensitive=False)(payload["uid"], payload)
+
+        groups = ping_groups(payload["uid"], cell, prev_cell)
+        event = frame("broadcast", payload)
+        await asyncio.gather(*(self.channel_layer.group_send(g, event) for g in groups))
+        # the sender always sees its own position, even when it isn't viewing that cell
+        if not (groups & self.groups_joined):
+            await self.send(text_data=event["text"])
 
     async def broadcast(self, event):
-        await self.send_json(event["payload"])
\ No newline at end of file
+        await self.send(text_data=event["text"])
@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+
+from chat import notify, unread
+from chat.consumers import ChatConsumer
+from chat.models import ChatGroup, DirectMessageThread, Message, Notification
+
+PREFIX = "bench_consumer_"
+
+
+class LegacyChatConsumer(ChatConsumer):
+    """The per-frame lookups ChatConsumer did before caching its context at connect."""
+
+    @database_sync_to_async
+    def save_message(self, username, message, image_key=None):
+        user = User.objects.get(username=username)
+        if hasattr(self, 'room_name'):
+            group = ChatGroup.objects.get(slug=self.room_name)
+            msg = Message.objects.create(group=group, sender=user, content=message, image=image_key)
+        else:
+            thread = DirectMessageThread.objects.get(id=self.thread_id)
+            msg = Message.objects.create(thread=thread, sender=user, content=message, image=image_key)
+        unread.bump(msg)
+        return msg
+
+    @database_sync_to_async
+    def handle_new_message(self, sender_username, message_content, message_obj=None):
+        group = ChatGroup.objects.get(slug=self.room_name)
+        recipients = list(group.members.exclude(username=sender_username).values_list('id', 'username'))
+        return notify.create_notifications(recipients, f"New message from {sender_username}", message_obj)
+
+
+class _QueryMeter:
+    """Counts queries on the DB threads and optionally adds a fixed round-trip delay to each."""
+
+    def __init__(self, latency_s):
+        self.latency_s = latency_s
+        self.count = 0
+        self.connections = []
+
+    def attach(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+            self.connections.append(connection)
+
+    def detach(self):
+        connection_created.disconnect(self.attach)
+        for conn in self.connections:
+            conn.execute_wrappers.remove(self)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark messages/sec on one chat connection: per-frame sender/group/member lookups vs. "
+        f"the context cached at connect. Creates and removes its own '{PREFIX}*' users and group."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=300)
+        parser.add_argument("--members", type=int, default=20)
+        parser.add_argument(
+            "--query-latency-ms", type=float, default=0.0,
+            help="Simulated DB round trip per query (the local sqlite has none).",
+        )
+
+    def handle(self, *args, **opts):
+        self._cleanup()
+        try:
+            group, sender = self._fixture(opts["members"])
+            self.stdout.write(
+                f"{opts['messages']} messages, {opts['members']} members, "
+                f"{opts['query_latency_ms']}ms per query"
+            )
+            for label, consumer in (("per-frame lookups", LegacyChatConsumer), ("cached context", ChatConsumer)):
+                meter = _QueryMeter(opts["query_latency_ms"] / 1000)
+                connection_created.connect(meter.attach)
+                try:
+                    rate, hot, total, stage = asyncio.run(
+                        self._measure(consumer, group, sender, opts["messages"], meter)
+                    )
+                finally:
+                    meter.detach()
+                self.stdout.write(
+                    f"{label:18} {rate:>7.0f} msg/s  queries/msg: {hot:.1f} before the echo, "
+                    f"{total:.1f} in total  background drained {stage:.0f}ms after the last echo"
+                )
+        finally:
+            self._cleanup()
+
+    def _fixture(self, n):
+        User.objects.bulk_create([User(username=f"{PREFIX}{i}") for i in range(n)])
+        members = list(User.objects.filter(username__startswith=PREFIX))
+        group = ChatGroup.objects.create(name=f"{PREFIX}room", slug="bench-consumer-room")
+        group.members.add(*members)
+        return group, members[0]
+
+    def _cleanup(self):
+        Notification.objects.filter(user__username__startswith=PREFIX).delete()
+        Message.objects.filter(sender__username__startswith=PREFIX).delete()
+        ChatGroup.objects.filter(name__startswith=PREFIX).delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
+
+    async def _send(self, comm, sender, i):
+        await comm.send_to(text_data=f'{{"type": "message", "username": "{sender.username}", "message": "m{i}"}}')
+        await comm.receive_from(timeout=10)  # the room echo
+
+    async def _measure(self, consumer_cls, group, sender, count, meter):
+        comm = WebsocketCommunicator(consumer_cls.as_asgi(), f"/ws/chat/{group.slug}/")
+        comm.scope["url_route"] = {"kwargs": {"room_name": group.slug}}
+        comm.scope["user"] = sender
+        connected, _ = await comm.connect()
+        assert connected
+
+        # query counts: one message at a time, background stage drained in between
+        samples = max(1, count // 10)
+        hot = total = 0
+        for i in range(samples):
+            start = meter.count
+            await self._send(comm, sender, i)
+            hot += meter.count - start
+            await asyncio.gather(*list(notify._background))
+            total += meter.count - start
+
+        # throughput: back to back, background stages overlap with the next frames
+        t0 = time.perf_counter()
+        for i in range(count):
+            await self._send(comm, sender, i)
+        rate = count / (time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*list(notify._background))
+        stage = (time.perf_counter() - t0) * 1000
+        await comm.disconnect()
+        return rate, hot / samples, total / samples, stage
@@ -0,0 +1,97 @@
+import asyncio
+import statistics
+import time
+
+from asgiref.sync import sync_to_async
+from channels.layers import InMemoryChannelLayer
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from chat.consumers import ChatConsumer
+from chat.models import ChatGroup, Notification
+from chat.notify import run_in_background
+
+PREFIX = "bench_notify_"
+
+
+def _legacy_create(group, sender):
+    # the old handle_new_message: one INSERT per member
+    notified = []
+    for member in group.members.all():
+        if member.username != sender:
+            Notification.objects.create(user=member, message=f"New message from {sender}: hi")
+            notified.append(member.username)
+    return notified
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark chat message -> notification delivery vs. group size: per-row INSERTs and serial "
+        "sends on the receive path vs. the bulk background stage. Creates and removes its own "
+        f"'{PREFIX}*' users and groups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200])
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **opts):
+        self._cleanup()
+        try:
+            self.stdout.write(
+                f"{'members':>8} {'legacy hot':>11} {'legacy last':>12} {'bulk hot':>10} {'bulk last':>10}"
+            )
+            for n in opts["sizes"]:
+                group = self._fixture(n)
+                row = asyncio.run(self._measure(group, opts["runs"]))
+                self.stdout.write(
+                    f"{n:>8} {row[0]:>9.2f}ms {row[1]:>10.2f}ms {row[2]:>8.2f}ms {row[3]:>8.2f}ms"
+                )
+        finally:
+            self._cleanup()
+
+    def _fixture(self, n):
+        users = User.objects.bulk_create([User(username=f"{PREFIX}{n}_{i}") for i in range(n + 1)])
+        group = ChatGroup.objects.create(name=f"{PREFIX}{n}", slug=f"{PREFIX}{n}".replace("_", "-"))
+        group.members.add(*User.objects.filter(username__startswith=f"{PREFIX}{n}_"))
+        return group
+
+    def _cleanup(self):
+        Notification.objects.filter(user__username__startswith=PREFIX).delete()
+        ChatGroup.objects.filter(name__startswith=PREFIX).delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
+
+    async def _measure(self, group, runs):
+        layer = InMemoryChannelLayer(capacity=10 ** 6)
+        members = await sync_to_async(lambda: list(group.members.values_list("username", flat=True)))()
+        sender, recipients = members[0], members[1:]
+        for u in recipients:
+            await layer.group_add(f"user_{u}", await layer.new_channel())
+
+        consumer = ChatConsumer()
+        consumer.channel_layer = layer
+        consumer.room_name = group.slug
+        consumer.room_group_name = f"chat_{group.slug}"
+        consumer.scope = {"user": await sync_to_async(User.objects.get)(username=sender)}
+        await consumer.load_context()
+
+        legacy_hot, legacy_last, bulk_hot, bulk_last = [], [], [], []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            notified = await sync_to_async(_legacy_create)(group, sender)
+            for u in notified:
+                await layer.group_send(f"user_{u}", {"type": "chat_notification", "username": sender, "message": "hi"})
+            elapsed = (time.perf_counter() - t0) * 1000
+            # the old receive() returned only after every insert and send
+            legacy_hot.append(elapsed)
+            legacy_last.append(elapsed)
+            layer.channels.clear()
+
+            t0 = time.perf_counter()
+            task = run_in_background(consumer._send_notifications(sender, "hi", None))
+            bulk_hot.append((time.perf_counter() - t0) * 1000)
+            await task
+            bulk_last.append((time.perf_counter() - t0) * 1000)
+            layer.channels.clear()
+
+        return tuple(statistics.median(s) for s in (legacy_hot, legacy_last, bulk_hot, bulk_last))
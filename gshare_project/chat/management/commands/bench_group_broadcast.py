@@ -0,0 +1,149 @@
+import asyncio
+import json
+import statistics
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from chat import wire
+from chat.consumers import ChatConsumer
+from chat.livetrack import RoomAggregator, Tracking
+
+ROOM = "bench_room"
+
+
+def _chat_payload():
+    return {
+        "type": "message",
+        "id": 123456,
+        "cursor": "1760000000000000_123456",
+        "username": "bench_sender",
+        "message": "on my way, grabbing the milk and eggs too " * 4,
+        "image_url": "https://example-bucket.s3.us-east-2.amazonaws.com/chat/bench_sender/" + "a" * 32 +
+                     ".jpg?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Signature=" + "f" * 64,
+    }
+
+
+def _positions_payload(n=50):
+    return {
+        "type": "positions",
+        "positions": [
+            {"type": "update", "username": f"driver{i}", "lat": 40.7 + i / 1000, "lng": -111.9 - i / 1000, "role": "driver"}
+            for i in range(n)
+        ],
+        "ts": time.time(),
+    }
+
+
+async def _legacy_chat_message(consumer, event):
+    # the handler before chat.wire: every receiver built and encoded its own frame
+    await consumer.send(text_data=json.dumps({
+        "type": "message",
+        "id": event.get("id"),
+        "cursor": event.get("cursor"),
+        "username": event["username"],
+        "message": event["message"],
+        "image_url": event.get("image_url"),
+    }))
+
+
+async def _legacy_positions(consumer, event):
+    consumer.aggregator.seen(event["positions"])
+    await consumer.send(text_data=json.dumps({"type": "positions", "positions": event["positions"], "ts": event["ts"]}))
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark group broadcasts: every receiving consumer encoding the payload itself vs. "
+        "one pre-encoded frame (chat.wire) forwarded as is."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, nargs="+", default=[10, 100, 1000])
+        parser.add_argument("--broadcasts", type=int, default=50)
+
+    def handle(self, *args, **opts):
+        asyncio.run(self._run(opts))
+
+    async def _consumers(self, cls, layer, n):
+        sent = []
+
+        async def send(text_data=None, bytes_data=None, close=False):
+            sent.append(len(text_data))
+
+        consumers = []
+        for _ in range(n):
+            c = cls()
+            c.channel_layer = layer
+            c.channel_name = await layer.new_channel()
+            c.scope = {"user": None}
+            c.send = send
+            await layer.group_add(ROOM, c.channel_name)
+            consumers.append(c)
+        return consumers, sent
+
+    async def _time(self, layer, consumers, make_event, handler, broadcasts):
+        """
+        Median ms per broadcast spent building the event and running every
+        receiver's handler. Layer transport is the same for both paths and
+        is left out of the timing.
+        """
+        samples = []
+        for _ in range(broadcasts):
+            t0 = time.perf_counter()
+            event = make_event()
+            build = time.perf_counter() - t0
+
+            await layer.group_send(ROOM, event)
+            received = [(c, await layer.receive(c.channel_name)) for c in consumers]
+
+            t0 = time.perf_counter()
+            for c, ev in received:
+                await handler(c, ev)
+            samples.append((build + time.perf_counter() - t0) * 1000)
+        return statistics.median(samples)
+
+    async def _run(self, opts):
+        chat, positions = _chat_payload(), _positions_payload()
+        chat_event = {"type": "chat_message", **{k: v for k, v in chat.items() if k != "type"}}
+        scenarios = [
+            ("chat message", ChatConsumer, chat,
+             lambda: chat_event, _legacy_chat_message, ChatConsumer.chat_message),
+            ("positions x50", Tracking, positions,
+             lambda: {"type": "positions", "positions": positions["positions"], "ts": positions["ts"]},
+             _legacy_positions, Tracking.positions),
+        ]
+        have_orjson = wire.orjson is not None
+        self.stdout.write(f"sender + receiver handler time per broadcast; medians of {opts['broadcasts']} broadcasts"
+                          + ("" if have_orjson else " (orjson not installed)"))
+        self.stdout.write(f"{'payload':<14} {'subs':>5} {'per-receiver':>13} {'once (json)':>12} {'once (orjson)':>14}")
+
+        for label, cls, payload, legacy_event, legacy_handler, handler in scenarios:
+            extra = {"positions": payload["positions"], "batch": "bench:0"} if cls is Tracking else {}
+            for n in opts["subscribers"]:
+                layer = InMemoryChannelLayer(capacity=10 ** 6)
+                consumers, _ = await self._consumers(cls, layer, n)
+                if cls is Tracking:
+                    agg = RoomAggregator(ROOM, layer)
+                    for c in consumers:
+                        c.aggregator = agg
+
+                results = [await self._time(layer, consumers, legacy_event, legacy_handler, opts["broadcasts"])]
+                fast = wire.orjson
+                for encoder in (None, fast):
+                    if encoder is None and fast is None:
+                        continue
+                    wire.orjson = encoder
+                    try:
+                        make = lambda: wire.frame(handler.__name__, payload, **extra)
+                        results.append(await self._time(layer, consumers, make, handler, opts["broadcasts"]))
+                    finally:
+                        wire.orjson = fast
+                if not have_orjson:
+                    results.append(float("nan"))
+
+                self.stdout.write(
+                    f"{label:<14} {n:>5} {results[0]:>11.2f}ms {results[1]:>10.2f}ms {results[2]:>12.2f}ms"
+                )
+                await layer.flush()
@@ -0,0 +1,72 @@
+import asyncio
+import random
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from chat.locationhub import PING_INTERVAL, ping_groups, subscription_groups
+from core.utils.spatial_index import cell_of
+
+
+def _queued(layer) -> int:
+    return sum(q.qsize() for q in layer.channels.values())
+
+
+class Command(BaseCommand):
+    help = "Load-test LocationHub fan-out: one global group vs. per-cell subscriptions with ping throttling."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, nargs="+", default=[1_000, 10_000])
+        parser.add_argument("--pings", type=int, default=100, help="Pings routed per scenario.")
+        parser.add_argument("--ping-hz", type=float, default=4.0, help="How often a sharing client's GPS fires.")
+        parser.add_argument("--sharing", type=float, default=0.3, help="Fraction of sockets that share their location.")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **opts):
+        asyncio.run(self._run(opts))
+
+    async def _run(self, opts):
+        rnd = random.Random(opts["seed"])
+        forwarded_hz = min(opts["ping_hz"], 1 / PING_INTERVAL)
+
+        self.stdout.write(
+            f"{'sockets':>8} {'mode':<7} {'fan-out':>9} {'route/s':>10} {'msgs/s @ load':>15}"
+        )
+        for n in opts["sockets"]:
+            # everyone spread over the Salt Lake valley, viewing a neighbourhood-sized map
+            users = []
+            for uid in range(n):
+                lat, lng = rnd.uniform(40.5, 40.9), rnd.uniform(-112.1, -111.7)
+                bbox = (lat - 0.02, lng - 0.03, lat + 0.02, lng + 0.03)
+                users.append((uid, lat, lng, bbox))
+            senders = [rnd.choice(users) for _ in range(opts["pings"])]
+            sharing = n * opts["sharing"]
+
+            for mode in ("global", "cells"):
+                layer = InMemoryChannelLayer(expiry=3600, capacity=10 ** 6)
+                names = {}
+                for uid, _, _, bbox in users:
+                    names[uid] = name = await layer.new_channel()
+                    groups = {"location_stream"} if mode == "global" else subscription_groups(bbox)
+                    for g in groups:
+                        await layer.group_add(g, name)
+
+                t0 = time.perf_counter()
+                for uid, lat, lng, _ in senders:
+                    msg = {"type": "broadcast", "payload": {"uid": uid, "lat": lat, "lng": lng}}
+                    if mode == "global":
+                        await layer.group_send("location_stream", msg)
+                    else:
+                        for g in ping_groups(uid, cell_of(lat, lng)):
+                            await layer.group_send(g, msg)
+                elapsed = time.perf_counter() - t0
+
+                fan_out = _queued(layer) / len(senders)
+                # messages/sec the hub emits when `sharing` sockets ping continuously
+                ping_rate = sharing * (opts["ping_hz"] if mode == "global" else forwarded_hz)
+                self.stdout.write(
+                    f"{n:>8} {mode:<7} {fan_out:>9.1f} {len(senders) / elapsed:>10.0f} "
+                    f"{ping_rate * fan_out:>15,.0f}"
+                )
+                await layer.flush()
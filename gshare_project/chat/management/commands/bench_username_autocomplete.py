@@ -0,0 +1,78 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from chat.usernames import UsernameIndex
+
+PREFIX = "zbench"
+
+
+def _p95(samples):
+    return statistics.quantiles(samples, n=20)[18]
+
+
+def _names(n, seed=7):
+    rng = random.Random(seed)
+    syllables = ["al", "ex", "jo", "mar", "ka", "ri", "son", "lee", "dan", "el", "ty", "ra", "no", "vi"]
+    out = set()
+    while len(out) < n:
+        base = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        out.add(f"{PREFIX}{base}{rng.randint(0, 99999)}")
+    return sorted(out)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark chat username autocomplete: username__icontains on auth_user vs. the in-process "
+        f"index. Inserts and removes its own '{PREFIX}*' users unless --skip-orm."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=300)
+        parser.add_argument("--skip-orm", action="store_true", help="Only time the index (no DB rows).")
+
+    def handle(self, *args, **opts):
+        n = opts["users"]
+        names = _names(n)
+        rng = random.Random(11)
+        queries = []
+        for _ in range(opts["queries"]):
+            name = rng.choice(names)[len(PREFIX):]
+            start = rng.randint(0, max(0, len(name) - 4))
+            # mix of prefix-style and infix-style keystrokes
+            queries.append(PREFIX + name[:rng.randint(2, 5)] if rng.random() < 0.5 else name[start:start + rng.randint(3, 5)])
+
+        index = UsernameIndex()
+        t0 = time.perf_counter()
+        index.load(names)
+        build = time.perf_counter() - t0
+        index._sync = lambda: True  # benchmark the lookup itself, not the cache check
+
+        idx = []
+        for q in queries:
+            t0 = time.perf_counter()
+            index.search(q, limit=10)
+            idx.append((time.perf_counter() - t0) * 1000)
+
+        self.stdout.write(f"{n} usernames, {len(queries)} queries")
+        self.stdout.write(f"index built in {build:.1f}s")
+        self.stdout.write(f"{'':10} {'median':>10} {'p95':>10}")
+        self.stdout.write(f"{'index':10} {statistics.median(idx):>8.3f}ms {_p95(idx):>8.3f}ms")
+
+        if opts["skip_orm"]:
+            return
+        User.objects.filter(username__startswith=PREFIX).delete()
+        try:
+            User.objects.bulk_create([User(username=u) for u in names], batch_size=5000)
+            orm = []
+            for q in queries[:50]:
+                t0 = time.perf_counter()
+                list(User.objects.filter(username__icontains=q)[:10].values_list("username", flat=True))
+                orm.append((time.perf_counter() - t0) * 1000)
+            self.stdout.write(f"{'icontains':10} {statistics.median(orm):>8.3f}ms {_p95(orm):>8.3f}ms")
+        finally:
+            User.objects.filter(username__startswith=PREFIX).delete()
@@ -0,0 +1,89 @@
+# chat/media.py
+import asyncio
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from uuid import uuid4
+
+from django.db import close_old_connections
+
+from core.utils.aws_s3 import get_bucket_and_region, get_s3_client, presigned_post
+from .models import Message
+
+# Every blocking media job (legacy base64 uploads, thumbnails) shares this pool,
+# so a burst of images queues instead of spawning threads.
+MEDIA_WORKERS = 4
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+THUMB_SIZE = (320, 320)
+
+_pool = ThreadPoolExecutor(max_workers=MEDIA_WORKERS, thread_name_prefix="chat-media")
+
+
+def _job(fn, *args):
+    try:
+        return fn(*args)
+    finally:
+        # pool threads hold their own DB connections
+        close_old_connections()
+
+
+def submit(fn, *args):
+    """Queue fn(*args) on the media pool from sync code; returns its Future."""
+    return _pool.submit(_job, fn, *args)
+
+
+async def run(fn, *args):
+    """Await fn(*args) on the media pool without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_pool, fn, *args)
+
+
+def upload_prefix(username) -> str:
+    return f"chat/{username}/"
+
+
+def is_own_upload(key, username) -> bool:
+    """Only keys under the sender's own prefix may be attached to a message."""
+    return bool(key) and key.startswith(upload_prefix(username)) and ".." not in key
+
+
+def create_upload(username, filename, content_type) -> dict:
+    """Presigned POST for one chat image; the client sends the returned key with its message."""
+    ext = os.path.splitext(filename or "")[1].lower() or mimetypes.guess_extension(content_type) or ".jpg"
+    key = f"{upload_prefix(username)}{uuid4().hex}{ext}"
+    post = presigned_post(key, content_type, MAX_UPLOAD_BYTES)
+    return {"key": key, "url": post["url"], "fields": post["fields"], "max_bytes": MAX_UPLOAD_BYTES}
+
+
+def thumbnail_key(key) -> str:
+    return f"thumbs/{os.path.splitext(key)[0]}.jpg"
+
+
+def make_thumbnail(message_id) -> None:
+    """Download a message's image, store a small JPEG next to it and record its key."""
+    from PIL import Image, ImageOps
+
+    try:
+        msg = Message.objects.only("image").get(pk=message_id)
+        if not msg.image:
+            return
+        s3 = get_s3_client()
+        bucket, _ = get_bucket_and_region()
+        body = s3.get_object(Bucket=bucket, Key=msg.image)["Body"].read()
+
+        with Image.open(BytesIO(body)) as img:
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail(THUMB_SIZE)
+            out = BytesIO()
+            img.convert("RGB").save(out, "JPEG", quality=80, optimize=True)
+
+        key = thumbnail_key(msg.image)
+        s3.put_object(Bucket=bucket, Key=key, Body=out.getvalue(), ContentType="image/jpeg")
+        Message.objects.filter(pk=message_id, image=msg.image).update(thumbnail=key)
+    except Exception as e:
+        print(f"Thumbnail for message {message_id} failed: {e}")
+
+
+def schedule_thumbnail(message) -> None:
+    if message.image:
+        submit(make_thumbnail, message.id)
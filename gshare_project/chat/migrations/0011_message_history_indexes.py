@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-17 13:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_notification_message_obj_lastread'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['group', 'timestamp', 'id'], name='chat_msg_group_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['thread', 'timestamp', 'id'], name='chat_msg_thread_ts_idx'),
+        ),
+    ]
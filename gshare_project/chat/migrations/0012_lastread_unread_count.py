@@ -0,0 +1,46 @@
+# Generated by Django 5.1.15 on 2026-10-17 13:53
+
+from django.db import migrations, models
+
+
+def backfill_unread_counts(apps, schema_editor):
+    """Seed the counters with what json_notifications used to compute per poll."""
+    LastRead = apps.get_model('chat', 'LastRead')
+    Message = apps.get_model('chat', 'Message')
+    ChatGroup = apps.get_model('chat', 'ChatGroup')
+    DirectMessageThread = apps.get_model('chat', 'DirectMessageThread')
+
+    def seed(conv, member_ids):
+        reads = {lr.user_id: lr for lr in LastRead.objects.filter(**conv)}
+        for uid in member_ids:
+            others = Message.objects.filter(**conv).exclude(sender_id=uid)
+            lr = reads.get(uid)
+            if lr is not None:
+                # .update() so last_read_at (auto_now) is left alone
+                count = others.filter(timestamp__gt=lr.last_read_at).count()
+                LastRead.objects.filter(pk=lr.pk).update(unread_count=count)
+            else:
+                count = others.count()
+                if count:
+                    LastRead.objects.create(user_id=uid, unread_count=count, **conv)
+
+    for group in ChatGroup.objects.all():
+        seed({'group_id': group.id, 'thread_id': None}, group.members.values_list('id', flat=True))
+    for thread in DirectMessageThread.objects.all():
+        seed({'group_id': None, 'thread_id': thread.id}, thread.participants.values_list('id', flat=True))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0011_message_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lastread',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0012_lastread_unread_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='thumbnail',
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.15 on 2026-10-17 14:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def collapse_duplicate_threads(apps, schema_editor):
+    """Key every thread by its participant pair and fold duplicates into the oldest one."""
+    DirectMessageThread = apps.get_model('chat', 'DirectMessageThread')
+    Message = apps.get_model('chat', 'Message')
+    LastRead = apps.get_model('chat', 'LastRead')
+    TypingState = apps.get_model('chat', 'TypingState')
+
+    kept = {}
+    for thread in DirectMessageThread.objects.order_by('id').prefetch_related('participants'):
+        pair = tuple(sorted(u.id for u in thread.participants.all()))
+        if len(pair) != 2:
+            continue  # not a two-person thread; left without a key
+        keep_id = kept.get(pair)
+        if keep_id is None:
+            kept[pair] = thread.id
+            DirectMessageThread.objects.filter(pk=thread.id).update(user_low_id=pair[0], user_high_id=pair[1])
+            continue
+
+        Message.objects.filter(thread_id=thread.id).update(thread_id=keep_id)
+        for lr in LastRead.objects.filter(thread_id=thread.id):
+            target = LastRead.objects.filter(user_id=lr.user_id, group__isnull=True, thread_id=keep_id).first()
+            if target is None:
+                LastRead.objects.filter(pk=lr.pk).update(thread_id=keep_id)
+            else:
+                LastRead.objects.filter(pk=target.pk).update(unread_count=target.unread_count + lr.unread_count)
+                lr.delete()
+        TypingState.objects.filter(thread_id=thread.id).delete()
+        thread.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0013_message_thumbnail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='directmessagethread',
+            name='user_high',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='directmessagethread',
+            name='user_low',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(collapse_duplicate_threads, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='directmessagethread',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='chat_dm_unique_pair'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0014_directmessagethread_pair_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='edited_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
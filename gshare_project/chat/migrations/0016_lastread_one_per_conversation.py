@@ -0,0 +1,59 @@
+from django.db import migrations, models
+
+
+def merge_duplicate_reads(apps, schema_editor):
+    """Fold each user's extra LastRead rows for a conversation into the oldest one."""
+    LastRead = apps.get_model('chat', 'LastRead')
+    kept = {}
+    for lr in LastRead.objects.order_by('id'):
+        key = (lr.user_id, lr.group_id, lr.thread_id)
+        keep = kept.get(key)
+        if keep is None:
+            kept[key] = lr
+            continue
+        # .update() so last_read_at (auto_now) keeps the newest read, not now()
+        LastRead.objects.filter(pk=keep.pk).update(
+            unread_count=keep.unread_count + lr.unread_count,
+            last_read_at=max(keep.last_read_at, lr.last_read_at),
+        )
+        keep.unread_count += lr.unread_count
+        keep.last_read_at = max(keep.last_read_at, lr.last_read_at)
+        lr.delete()
+
+
+# MySQL skips the conditional constraints below; this key covers both cases there.
+ADD_MYSQL_KEY = (
+    "ALTER TABLE `chat_lastread` ADD UNIQUE KEY `chat_lastread_one_per_conversation` "
+    "(`user_id`, (COALESCE(`group_id`, 0)), (COALESCE(`thread_id`, 0)))"
+)
+DROP_MYSQL_KEY = "ALTER TABLE `chat_lastread` DROP KEY `chat_lastread_one_per_conversation`"
+
+
+def add_mysql_key(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(ADD_MYSQL_KEY)
+
+
+def drop_mysql_key(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(DROP_MYSQL_KEY)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0015_message_edited_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_reads, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='lastread',
+            constraint=models.UniqueConstraint(condition=models.Q(('thread__isnull', True)), fields=('user', 'group'), name='chat_lastread_one_per_group'),
+        ),
+        migrations.AddConstraint(
+            model_name='lastread',
+            constraint=models.UniqueConstraint(condition=models.Q(('group__isnull', True)), fields=('user', 'thread'), name='chat_lastread_one_per_thread'),
+        ),
+        migrations.RunPython(add_mysql_key, drop_mysql_key),
+    ]
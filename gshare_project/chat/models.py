@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 import uuid
 
@@ -19,7 +19,15 @@ class ChatGroup(models.Model):
 
 class DirectMessageThread(models.Model):
     participants = models.ManyToManyField(User, related_name='direct_message')
+    # canonical pair (lower id, higher id): one indexed probe per lookup, one thread per pair
+    user_low = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name='+')
+    user_high = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name='+')
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='chat_dm_unique_pair'),
+        ]
     
     def __str__(self):
         usernames = ", ".join(self.participants.values_list("username", flat=True))
@@ -28,13 +36,13 @@ class DirectMessageThread(models.Model):
     @classmethod
     def get_or_create_thread(cls, user1, user2):
         users = sorted([user1, user2], key=lambda u: u.id)
-        thread = cls.objects.filter(participants=users[0]).filter(participants=users[1]).first()
-        if thread:
-            return thread, False
-        if not thread:
-            thread = DirectMessageThread.objects.create()
-            thread.participants.add(users[0], users[1])
-        return thread, True
+        # get_or_create retries the lookup if a concurrent request wins the unique index;
+        # the atomic block commits the participants together with the thread
+        with transaction.atomic():
+            thread, created = cls.objects.get_or_create(user_low=users[0], user_high=users[1])
+            if created:
+                thread.participants.add(users[0], users[1])
+        return thread, created
     
 
 class Message(models.Model):
@@ -43,10 +51,19 @@ class Message(models.Model):
     thread = models.ForeignKey(DirectMessageThread, on_delete=models.CASCADE, null=True, blank=True, related_name='messages')
     content = models.TextField()
     image = models.CharField(max_length=500, null=True, blank=True)
+    # small JPEG derivative of `image`, filled in by chat.media after the message is saved
+    thumbnail = models.CharField(max_length=500, null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # last edit or delete; reconnecting sockets replay changes made after this point
+    edited_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # keyset pagination of a room's history (chat.history)
+            models.Index(fields=['group', 'timestamp', 'id'], name='chat_msg_group_ts_idx'),
+            models.Index(fields=['thread', 'timestamp', 'id'], name='chat_msg_thread_ts_idx'),
+        ]
     
     def __str__(self):
         return f'{self.sender.username}: {self.content[:20]}'
@@ -89,8 +106,23 @@ class LastRead(models.Model):
     group = models.ForeignKey(ChatGroup, null=True, blank=True, on_delete=models.CASCADE)
     thread = models.ForeignKey(DirectMessageThread, null=True, blank=True, on_delete=models.CASCADE)
     last_read_at = models.DateTimeField(auto_now=True)
+    # messages from others since the user last opened the conversation (chat.unread)
+    unread_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ('user', 'group', 'thread')
+        # one of group/thread is always NULL, and NULLs never collide in the key
+        # above; these keep one row per user and conversation (on MySQL, which
+        # has no partial indexes, migration 0016 adds a functional key instead)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'group'], condition=models.Q(thread__isnull=True),
+                name='chat_lastread_one_per_group',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'thread'], condition=models.Q(group__isnull=True),
+                name='chat_lastread_one_per_thread',
+            ),
+        ]
 
 
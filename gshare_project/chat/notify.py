@@ -0,0 +1,66 @@
+# chat/notify.py
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .models import Notification
+from .wire import frame
+
+# user_<name> sends issued concurrently per batch
+FAN_OUT_CHUNK = 64
+BULK_BATCH = 500
+
+# strong refs so background stages aren't garbage collected mid-flight
+_background = set()
+
+
+def create_notifications(recipients, text, message=None) -> list:
+    """
+    Insert one Notification per recipient in bulk.
+    recipients: iterable of (user_id, username). Returns the usernames notified.
+    """
+    recipients = list(recipients)
+    Notification.objects.bulk_create(
+        [Notification(user_id=uid, message=text, message_obj=message) for uid, _ in recipients],
+        batch_size=BULK_BATCH,
+    )
+    return [username for _, username in recipients]
+
+
+async def fan_out(channel_layer, usernames, event) -> None:
+    """Send the same event to every user_<name> group, FAN_OUT_CHUNK sends at a time."""
+    usernames = list(usernames)
+    for i in range(0, len(usernames), FAN_OUT_CHUNK):
+        await asyncio.gather(*(
+            channel_layer.group_send(f"user_{u}", event)
+            for u in usernames[i:i + FAN_OUT_CHUNK]
+        ))
+
+
+def announce_membership_change(group) -> None:
+    """Tell open ChatConsumers of this group to reload their cached member list."""
+    async_to_sync(get_channel_layer().group_send)(f"chat_{group.slug}", {"type": "membership_changed"})
+
+
+def announce_edit(message) -> None:
+    """Push an edited or deleted message to every socket open on its conversation."""
+    from .history import edit_payload
+
+    room = f"chat_{message.group.slug}" if message.group_id else f"dm_{message.thread_id}"
+    event = frame("message_edited", {"type": "edit", **edit_payload(message)})
+    async_to_sync(get_channel_layer().group_send)(room, event)
+
+
+def _stage_done(task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Notification stage failed: {task.exception()}")
+
+
+def run_in_background(coro):
+    """Schedule a notification stage so the caller can return to its socket right away."""
+    task = asyncio.ensure_future(coro)
+    _background.add(task)
+    task.add_done_callback(_stage_done)
+    return task
@@ -0,0 +1,178 @@
+# chat/presence.py
+"""
+Presence store for live driver/buyer locations pushed through LocationHub.
+
+Each user has one entry (their last ping) that expires after TTL seconds, and
+is also filed under the spatial_index grid cell it falls in, so "who is in
+this viewport" is a lookup over a few cells instead of a scan over every
+loc:* key.
+
+Two backends with the same API:
+  * RedisPresence - used when settings.REDIS_CACHE_URL is set. A user's entry and
+    cell membership are updated in one Lua script, so moving between cells is
+    atomic across Daphne processes.
+  * LocalPresence - in-process dict guarded by a lock, for single-process dev.
+"""
+import abc
+import json
+import threading
+import time
+
+from django.conf import settings
+
+from core.utils.spatial_index import cell_of, cells_for_viewport, _in_viewport
+
+TTL = 120
+
+
+def _as_row(entry):
+    return {**entry, "latitude": entry["lat"], "longitude": entry["lng"]}
+
+
+class _PresenceBase(abc.ABC):
+    @abc.abstractmethod
+    def update(self, uid: int, payload: dict) -> None:
+        """Store a user's latest ping and file it under its grid cell."""
+
+    @abc.abstractmethod
+    def get(self, uid: int):
+        """A user's live entry, or None once it has expired."""
+
+    @abc.abstractmethod
+    def _entries_in_cells(self, cells) -> list:
+        """Live entries filed under any of the given cells."""
+
+    def in_viewport(self, min_lat, min_lng, max_lat, max_lng, role=None, limit=500):
+        """Live entries inside the viewport (optionally only one role), or None if it is too large to index."""
+        cells = cells_for_viewport(min_lat, min_lng, max_lat, max_lng)
+        if cells is None:
+            return None
+        out = []
+        for e in self._entries_in_cells(cells):
+            if role and e.get("role") != role:
+                continue
+            if not _in_viewport(_as_row(e), min_lat, min_lng, max_lat, max_lng):
+                continue
+            out.append(e)
+            if len(out) >= limit:
+                break
+        return out
+
+
+class LocalPresence(_PresenceBase):
+    def __init__(self, ttl=TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}   # uid -> (expires_at, cell, payload)
+        self._cells = {}     # cell -> set(uid)
+
+    def update(self, uid, payload):
+        cell = cell_of(payload["lat"], payload["lng"])
+        with self._lock:
+            prev = self._entries.get(uid)
+            if prev and prev[1] != cell:
+                self._cells.get(prev[1], set()).discard(uid)
+            self._entries[uid] = (time.monotonic() + self.ttl, cell, payload)
+            self._cells.setdefault(cell, set()).add(uid)
+
+    def _live(self, uid, now):
+        entry = self._entries.get(uid)
+        if entry is None:
+            return None
+        if entry[0] < now:
+            del self._entries[uid]
+            self._cells.get(entry[1], set()).discard(uid)
+            return None
+        return entry[2]
+
+    def get(self, uid):
+        with self._lock:
+            return self._live(uid, time.monotonic())
+
+    def _entries_in_cells(self, cells):
+        now = time.monotonic()
+        out = []
+        with self._lock:
+            for cell in cells:
+                for uid in list(self._cells.get(cell, ())):
+                    payload = self._live(uid, now)
+                    if payload is not None:
+                        out.append(payload)
+        return out
+
+
+# KEYS[1] user hash, KEYS[2] new cell zset; ARGV: payload, ttl, expires_at, uid, now
+_UPDATE_LUA = """
+local prev = redis.call('HGET', KEYS[1], 'cell')
+if prev and prev ~= KEYS[2] then
+    redis.call('ZREM', prev, ARGV[4])
+end
+redis.call('HSET', KEYS[1], 'payload', ARGV[1], 'cell', KEYS[2])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+
+class RedisPresence(_PresenceBase):
+    """
+    presence:u:<uid>      hash {payload, cell}, expires after TTL
+    presence:c:<row>:<col> zset uid -> expiry timestamp
+    """
+
+    def __init__(self, url, ttl=TTL):
+        import redis
+
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _user_key(uid):
+        return f"presence:u:{uid}"
+
+    @staticmethod
+    def _cell_key(cell):
+        return f"presence:c:{cell[0]}:{cell[1]}"
+
+    def update(self, uid, payload):
+        now = time.time()
+        self.client.eval(
+            _UPDATE_LUA, 2,
+            self._user_key(uid), self._cell_key(cell_of(payload["lat"], payload["lng"])),
+            json.dumps(payload), self.ttl, now + self.ttl, uid, now,
+        )
+
+    def get(self, uid):
+        raw = self.client.hget(self._user_key(uid), "payload")
+        return json.loads(raw) if raw else None
+
+    def _entries_in_cells(self, cells):
+        now = time.time()
+        pipe = self.client.pipeline(transaction=False)
+        for cell in cells:
+            pipe.zrangebyscore(self._cell_key(cell), now, "+inf")
+        uids = [uid.decode() for members in pipe.execute() for uid in members]
+        if not uids:
+            return []
+
+        pipe = self.client.pipeline(transaction=False)
+        for uid in uids:
+            pipe.hget(self._user_key(uid), "payload")
+        return [json.loads(raw) for raw in pipe.execute() if raw]
+
+
+_presence = None
+_presence_lock = threading.Lock()
+
+
+def get_presence():
+    """The process-wide presence store for the configured backend."""
+    global _presence
+    if _presence is None:
+        with _presence_lock:
+            if _presence is None:
+                url = getattr(settings, "REDIS_CACHE_URL", "")
+                _presence = RedisPresence(url) if url else LocalPresence()
+    return _presence
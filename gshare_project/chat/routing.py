@@ -1,6 +1,7 @@
 from django.urls import re_path
 from django.urls import path
 from . import consumers
+from .livetrack import Tracking
 from .locationhub import LocationHub
 
 websocket_urlpatterns = [
@@ -9,4 +10,5 @@ websocket_urlpatterns = [
 
     # re_path(r'ws/chat/(?P<room_name>\w+)/$', consumers.ChatConsumer.as_asgi()),
     re_path(r"ws/location/$", LocationHub.as_asgi()),
+    re_path(r"ws/livetrack/(?P<slug>[-\w]+)/$", Tracking.as_asgi()),
 ]
\ No newline at end of file
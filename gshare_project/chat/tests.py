@@ -1,3 +1,535 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from io import BytesIO
+from unittest import mock
+from pathlib import Path
+from types import SimpleNamespace
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from chat import history, livetrack, media, presence, unread, wire
+from core.utils import aws_s3
+from chat.consumers import ChatConsumer
+from chat.locationhub import LocationHub
+from chat.usernames import UsernameIndex
+from chat.models import ChatGroup, DirectMessageThread, LastRead, Message, Notification
+
+try:
+    from fakeredis import TcpFakeServer
+except ImportError:  # pragma: no cover - optional test dependency
+    TcpFakeServer = None
+
+try:
+    from moto import mock_aws
+except ImportError:  # pragma: no cover - optional test dependency
+    mock_aws = None
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# One ASGI worker: a LocationHub instance in its own process, wired to whatever
+# channel layer / cache the settings build from REDIS_URL(S).
+WORKER = r"""
+import asyncio, json, sys
+from types import SimpleNamespace
+
+import django
+django.setup()
+
+from channels.testing import WebsocketCommunicator
+from chat.locationhub import LocationHub
+from chat.presence import get_presence
+
+
+async def main(role, uid):
+    comm = WebsocketCommunicator(LocationHub.as_asgi(), "/ws/location/")
+    comm.scope["user"] = SimpleNamespace(is_authenticated=True, id=uid, username=f"user{uid}")
+    connected, _ = await comm.connect()
+    assert connected
+    await comm.receive_json_from()  # hello
+
+    if role == "listen":
+        await comm.send_json_to({"type": "subscribe", "bbox": [40.6, -112.0, 40.8, -111.8]})
+        await comm.receive_json_from()  # subscribed
+        print("ready", flush=True)
+        msg = await comm.receive_json_from(timeout=10)
+        print(json.dumps({"msg": msg, "presence": get_presence().get(msg["uid"])}), flush=True)
+    else:
+        await comm.send_json_to({"type": "ping", "lat": 40.7, "lng": -111.9, "role": "driver"})
+        await comm.receive_json_from(timeout=10)  # our own broadcast
+    await comm.disconnect()
+
+asyncio.run(main(sys.argv[1], int(sys.argv[2])))
+"""
+
+
+def _start_fake_redis():
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"redis://127.0.0.1:{server.server_address[1]}"
+
+
+@unittest.skipIf(TcpFakeServer is None, "fakeredis is not installed")
+class CrossProcessDeliveryTests(SimpleTestCase):
+    """Two worker processes share nothing but the Redis backend."""
+
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for s in self.servers:
+            s.shutdown()
+            s.server_close()
+
+    def _redis_urls(self, n):
+        urls = []
+        for _ in range(n):
+            server, url = _start_fake_redis()
+            self.servers.append(server)
+            urls.append(url)
+        return urls
+
+    def _worker(self, role, uid, urls):
+        env = dict(os.environ, REDIS_URLS=",".join(urls))
+        return subprocess.Popen(
+            [sys.executable, "-c", WORKER, role, str(uid)],
+            cwd=PROJECT_DIR, env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+
+    def _assert_delivered(self, urls):
+        listener = self._worker("listen", 1, urls)
+        try:
+            # wait until the listener has joined the group before anyone sends
+            for line in listener.stdout:
+                if line.strip() == "ready":
+                    break
+            else:
+                self.fail(f"listener exited early: {listener.stderr.read()}")
+
+            sender = self._worker("send", 2, urls)
+            _, err = sender.communicate(timeout=60)
+            self.assertEqual(sender.returncode, 0, err)
+
+            out, err = listener.communicate(timeout=60)
+            self.assertEqual(listener.returncode, 0, err)
+        finally:
+            listener.kill()
+
+        result = json.loads(out.strip().splitlines()[-1])
+        self.assertEqual(result["msg"]["uid"], 2)
+        self.assertEqual(result["msg"]["type"], "loc")
+        # the sender's presence entry is visible to the other process too
+        self.assertEqual(result["presence"]["uid"], 2)
+
+    def test_broadcast_reaches_other_process(self):
+        self._assert_delivered(self._redis_urls(1))
+
+    def test_broadcast_reaches_other_process_sharded(self):
+        self._assert_delivered(self._redis_urls(2))
+
+
+class HistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="pager")
+        self.room = ChatGroup.objects.create(name="Pager", slug="pager")
+        # several messages share a timestamp, so the id tiebreak matters
+        base = timezone.now()
+        self.ids = []
+        for i in range(7):
+            m = Message.objects.create(group=self.room, sender=self.user, content=str(i))
+            Message.objects.filter(pk=m.pk).update(timestamp=base + timezone.timedelta(seconds=i // 3))
+            self.ids.append(m.pk)
+
+    def test_walks_backwards_without_gaps_or_repeats(self):
+        qs = self.room.messages.all()
+        rows, has_more = history.page(qs, limit=3)
+        seen = [m.pk for m in rows]
+        self.assertTrue(has_more)
+        while has_more:
+            rows, has_more = history.page(qs, before=history.decode_cursor(history.encode_cursor(rows[0])), limit=3)
+            seen = [m.pk for m in rows] + seen
+        self.assertEqual(seen, self.ids)
+
+    def test_after_returns_only_newer(self):
+        qs = self.room.messages.all()
+        first = Message.objects.get(pk=self.ids[2])
+        rows, has_more = history.page(qs, after=history.decode_cursor(history.encode_cursor(first)), limit=10)
+        self.assertEqual([m.pk for m in rows], self.ids[3:])
+        self.assertFalse(has_more)
+
+    def test_bad_cursor(self):
+        self.assertIsNone(history.decode_cursor("nope"))
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob")
+        self.room = ChatGroup.objects.create(name="Counters", slug="counters")
+        self.room.members.add(self.alice, self.bob)
+        self.thread, _ = DirectMessageThread.get_or_create_thread(self.alice, self.bob)
+
+    def _send(self, sender, **conv):
+        unread.bump(Message.objects.create(sender=sender, content="hi", **conv))
+
+    def test_counts_messages_from_others_until_read(self):
+        self._send(self.alice, group=self.room)
+        self._send(self.alice, group=self.room)
+        self._send(self.bob, group=self.room)
+        self._send(self.alice, thread=self.thread)
+
+        self.assertEqual(unread.counts_for(self.bob), {
+            "groups": [{"group_id": self.room.id, "unread_count": 2}],
+            "threads": [{"thread_id": self.thread.id, "unread_count": 1}],
+        })
+        self.assertEqual(unread.counts_for(self.alice)["groups"][0]["unread_count"], 1)
+
+        unread.mark_read(self.bob, group=self.room)
+        self.assertEqual(unread.counts_for(self.bob)["groups"][0]["unread_count"], 0)
+
+    def test_one_row_per_user_and_conversation(self):
+        self._send(self.alice, group=self.room)
+        self._send(self.alice, thread=self.thread)
+        for conv in ({"group": self.room}, {"thread": self.thread}):
+            with self.subTest(**conv), self.assertRaises(IntegrityError), transaction.atomic():
+                LastRead.objects.create(user=self.bob, **conv)
+
+    def test_counts_are_one_query(self):
+        self._send(self.alice, group=self.room)
+        self._send(self.alice, thread=self.thread)
+        with self.assertNumQueries(1):
+            unread.counts_for(self.bob)
+
+
+def _sync(cls, name):
+    """The plain function behind a @database_sync_to_async method."""
+    return cls.__dict__[name].func
+
+
+class ConsumerContextTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob")
+        self.room = ChatGroup.objects.create(name="Context", slug="context")
+        self.room.members.add(self.alice, self.bob)
+
+        self.consumer = ChatConsumer()
+        self.consumer.scope = {"user": self.alice}
+        self.consumer.room_name = self.room.slug
+        self.consumer.room_group_name = f"chat_{self.room.slug}"
+        # call the sync bodies directly: database_sync_to_async would close the test connection
+        self.assertTrue(_sync(ChatConsumer, "load_context")(self.consumer))
+
+    def test_message_is_one_insert(self):
+        with self.assertNumQueries(1):
+            msg = _sync(ChatConsumer, "save_message")(self.consumer, "alice", "hi")
+        self.assertEqual(msg.group_id, self.room.id)
+        self.assertEqual(msg.sender_id, self.alice.id)
+
+    def test_membership_change_refreshes_members(self):
+        carol = User.objects.create(username="carol")
+        self.room.members.add(carol)
+        _sync(ChatConsumer, "load_context")(self.consumer)  # what membership_changed runs
+        self.assertEqual(
+            [name for _, name in self.consumer._recipients("alice")], ["bob", "carol"]
+        )
+
+    def test_resume_replays_what_the_socket_missed(self):
+        seen = Message.objects.create(group=self.room, sender=self.bob, content="seen")
+        edited = Message.objects.create(group=self.room, sender=self.bob, content="old")
+        Message.objects.filter(pk=edited.pk).update(timestamp=seen.timestamp)
+        missed = Message.objects.create(group=self.room, sender=self.bob, content="missed")
+        Message.objects.filter(pk=edited.pk).update(
+            content=history.DELETED, edited_at=timezone.now() + timezone.timedelta(seconds=1)
+        )
+        Notification.objects.create(user=self.alice, message="bob: missed", message_obj=missed)
+
+        frame = _sync(ChatConsumer, "build_resume")(self.consumer, edited.id)
+        self.assertEqual([m["id"] for m in frame["messages"]], [missed.id])
+        self.assertEqual(frame["edits"], [{"id": edited.id, "deleted": True}])
+        self.assertEqual([n["message"] for n in frame["notifications"]], ["bob: missed"])
+        self.assertFalse(frame["truncated"])
+
+        self.assertTrue(_sync(ChatConsumer, "build_resume")(self.consumer, 10**9)["truncated"])
+
+    def test_image_keys_must_belong_to_the_socket_user(self):
+        msg = Message.objects.create(group=self.room, sender=self.alice, content="look")
+        self.consumer.save_message = mock.AsyncMock(return_value=msg)
+        self.consumer.get_presigned_url = mock.AsyncMock(return_value="https://signed")
+        self.consumer.channel_layer = mock.Mock(group_send=mock.AsyncMock())
+        self.enterContext(mock.patch.object(media, "schedule_thumbnail"))
+        self.enterContext(mock.patch("chat.consumers.run_in_background", side_effect=lambda coro: coro.close()))
+
+        def send(username, key):
+            frame = {"type": "message", "username": username, "message": "look", "image_key": key}
+            async_to_sync(self.consumer.receive)(json.dumps(frame))
+            return self.consumer.save_message.call_args.args[2]
+
+        # alice's socket claiming to be bob cannot attach bob's upload
+        self.assertIsNone(send("bob", "chat/bob/cat.png"))
+        self.assertEqual(send("alice", "chat/alice/cat.png"), "chat/alice/cat.png")
+
+
+@unittest.skipIf(mock_aws is None, "moto is not installed")
+@override_settings(
+    AWS_ACCESS_KEY_ID="test", AWS_SECRET_ACCESS_KEY="test",
+    AWS_S3_REGION_NAME="us-east-2", AWS_STORAGE_BUCKET_NAME="chat-media-test",
+)
+class ChatMediaTests(TestCase):
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        aws_s3.reset_s3_client()
+        self.s3 = aws_s3.get_s3_client()
+        self.s3.create_bucket(
+            Bucket="chat-media-test", CreateBucketConfiguration={"LocationConstraint": "us-east-2"}
+        )
+        self.alice = User.objects.create(username="alice")
+        self.room = ChatGroup.objects.create(name="Media", slug="media")
+
+    def tearDown(self):
+        aws_s3.reset_s3_client()
+        self.mock.stop()
+
+    def test_upload_is_scoped_to_the_sender(self):
+        upload = media.create_upload("alice", "cat.png", "image/png")
+        self.assertTrue(media.is_own_upload(upload["key"], "alice"))
+        self.assertFalse(media.is_own_upload(upload["key"], "bob"))
+        self.assertEqual(upload["fields"]["key"], upload["key"])
+        self.assertFalse(media.is_own_upload("chat/alice/../bob/x.png", "alice"))
+
+    def test_thumbnail_is_stored_and_recorded(self):
+        from PIL import Image
+
+        buf = BytesIO()
+        Image.new("RGB", (2000, 1000), "red").save(buf, "PNG")
+        key = "chat/alice/big.png"
+        self.s3.put_object(Bucket="chat-media-test", Key=key, Body=buf.getvalue())
+        msg = Message.objects.create(group=self.room, sender=self.alice, content="", image=key)
+
+        media.make_thumbnail(msg.id)
+
+        msg.refresh_from_db()
+        self.assertEqual(msg.thumbnail, media.thumbnail_key(key))
+        body = self.s3.get_object(Bucket="chat-media-test", Key=msg.thumbnail)["Body"].read()
+        with Image.open(BytesIO(body)) as thumb:
+            self.assertEqual(thumb.size, (320, 160))
+
+
+class PreEncodedFrameTests(SimpleTestCase):
+    def _consumer(self, username):
+        consumer = ChatConsumer()
+        consumer.scope = {"user": SimpleNamespace(username=username)}
+        consumer.sent = []
+
+        async def send(text_data=None, **kwargs):
+            consumer.sent.append(text_data)
+        consumer.send = send
+        return consumer
+
+    def test_receivers_forward_the_same_frame(self):
+        event = wire.frame("chat_message", {"type": "message", "id": 1, "message": "hé"})
+        receivers = [self._consumer(f"u{i}") for i in range(3)]
+        for c in receivers:
+            async_to_sync(c.chat_message)(event)
+        self.assertEqual({c.sent[0] for c in receivers}, {event["text"]})
+        self.assertEqual(json.loads(event["text"])["message"], "hé")
+
+    def test_notification_skips_its_sender(self):
+        event = wire.frame("chat_notification", {"type": "notification"}, username="alice")
+        alice, bob = self._consumer("alice"), self._consumer("bob")
+        async_to_sync(alice.chat_notification)(event)
+        async_to_sync(bob.chat_notification)(event)
+        self.assertEqual((alice.sent, bob.sent), ([], [event["text"]]))
+
+
+class LocationHubInputTests(SimpleTestCase):
+    def test_non_finite_coordinates_are_ignored(self):
+        hub = LocationHub()
+        hub.scope = {"user": SimpleNamespace(id=1, username="u1")}
+        hub.groups_joined, hub.pending, hub.flush_task = set(), None, None
+        hub.sent = []
+
+        async def send_json(content, close=False):
+            hub.sent.append(content)
+        hub.send_json = send_json
+
+        # json.loads turns NaN / Infinity into floats
+        async_to_sync(hub.receive_json)(json.loads('{"type": "subscribe", "bbox": [NaN, 0, 1, 1]}'))
+        async_to_sync(hub.receive_json)(json.loads('{"type": "ping", "lat": Infinity, "lng": 0}'))
+        self.assertEqual((hub.sent, hub.groups_joined, hub.pending), ([], set(), None))
+
+
+class RoomAggregatorTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.object(livetrack, "TICK", 0.01))
+        self.sent = []
+
+        async def group_send(room, event):
+            self.sent.append(event)
+            self.agg.members = 0  # one tick is enough; let the ticker exit
+        self.agg = livetrack.RoomAggregator("room", SimpleNamespace(group_send=group_send))
+        self.agg.members = 1
+
+    def _ping(self, name, lat, lng, role="driver"):
+        return self.agg.add({"type": "update", "username": name, "lat": lat, "lng": lng, "role": role})
+
+    def _run(self, scenario):
+        async def run():
+            await scenario()
+            if self.agg.task is not None:
+                await self.agg.task
+        async_to_sync(run)()
+
+    def test_pings_in_one_tick_go_out_as_one_frame(self):
+        async def scenario():
+            self._ping("alice", 40.70, -111.90)
+            self._ping("bob", 40.80, -111.80)
+            self._ping("alice", 40.71, -111.91)  # replaces alice's pending ping
+        self._run(scenario)
+
+        self.assertEqual(len(self.sent), 1)
+        positions = self.sent[0]["positions"]
+        self.assertEqual([(p["username"], p["lat"]) for p in positions], [("alice", 40.71), ("bob", 40.80)])
+        self.assertEqual(json.loads(self.sent[0]["text"])["positions"], positions)
+        self.assertEqual(self.agg.snapshot(), positions)
+
+    def test_sub_threshold_moves_are_dropped(self):
+        async def scenario():
+            self._ping("alice", 40.70, -111.90)
+        self._run(scenario)
+        self.agg.members = 1
+
+        async def scenario():
+            self.assertFalse(self._ping("alice", 40.70001, -111.90))  # ~1 m
+            self.assertTrue(self._ping("alice", 40.70001, -111.90, role="buyer"))  # role changed
+            self.assertTrue(self._ping("alice", 40.701, -111.90))  # ~110 m
+        self._run(scenario)
+        self.assertEqual(len(self.sent), 2)
+
+    def test_each_batch_is_applied_once_and_the_buffer_is_bounded(self):
+        p = {"username": "alice", "lat": 1.0, "lng": 1.0, "role": "driver"}
+        self.agg.seen([p], "other:0")
+        self.agg.seen([dict(p, lat=2.0)], "other:0")  # same batch via a second consumer
+        self.assertEqual(self.agg.snapshot(), [p])
+
+        self.agg.emitted["alice"] = (1.0, 1.0)
+        self.agg.seen([dict(p, username=f"u{i}") for i in range(livetrack.MAX_TRACKED)])
+        self.assertEqual(len(self.agg.snapshot()), livetrack.MAX_TRACKED)
+        self.assertNotIn("alice", self.agg.latest)
+        self.assertNotIn("alice", self.agg.emitted)
+
+
+class PresenceContract:
+    """Shared checks for both presence backends; subclasses provide make() and expire()."""
+
+    def _ping(self, store, uid, lat, lng, role="driver"):
+        store.update(uid, {"uid": uid, "lat": lat, "lng": lng, "role": role})
+
+    def test_get_returns_the_latest_ping(self):
+        store = self.make()
+        self.assertIsNone(store.get(1))
+        self._ping(store, 1, 40.70, -111.90)
+        self._ping(store, 1, 40.71, -111.91)
+        self.assertEqual(store.get(1)["lat"], 40.71)
+
+    def test_move_between_cells(self):
+        store = self.make()
+        self._ping(store, 1, 40.70, -111.90)
+        self._ping(store, 2, 40.70, -111.90, role="buyer")
+        here, there = (40.69, -111.91, 40.71, -111.89), (41.09, -112.01, 41.11, -111.99)
+        self.assertEqual([e["uid"] for e in store.in_viewport(*here, role="driver")], [1])
+
+        self._ping(store, 1, 41.10, -112.00)
+        self.assertEqual(store.in_viewport(*here, role="driver"), [])
+        self.assertEqual([e["uid"] for e in store.in_viewport(*there)], [1])
+
+    def test_entries_expire(self):
+        store = self.make(ttl=1)
+        self._ping(store, 1, 40.70, -111.90)
+        self.expire(store)
+        self.assertIsNone(store.get(1))
+        self.assertEqual(store.in_viewport(40.69, -111.91, 40.71, -111.89), [])
+
+
+class LocalPresenceTests(PresenceContract, SimpleTestCase):
+    def make(self, ttl=presence.TTL):
+        return presence.LocalPresence(ttl=ttl)
+
+    def expire(self, store):
+        later = time.monotonic() + store.ttl + 1
+        self.enterContext(mock.patch.object(presence.time, "monotonic", return_value=later))
+
+
+@unittest.skipIf(TcpFakeServer is None, "fakeredis is not installed")
+class RedisPresenceTests(PresenceContract, SimpleTestCase):
+    def setUp(self):
+        server, self.url = _start_fake_redis()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+    def make(self, ttl=presence.TTL):
+        return presence.RedisPresence(self.url, ttl=ttl)
+
+    def expire(self, store):
+        time.sleep(store.ttl + 0.1)
+
+
+class UsernameIndexTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.index = UsernameIndex()
+        self.index.load(["Bobby", "bob", "alice", "jimbob", "robert", "bobcat"])
+
+    def test_prefix_matches_first_then_infix(self):
+        self.assertEqual(self.index.search("bob"), ["bob", "Bobby", "bobcat", "jimbob"])
+        self.assertEqual(self.index.search("BERT"), ["robert"])
+        self.assertEqual(self.index.search("bob", limit=2), ["bob", "Bobby"])
+        self.assertEqual(self.index.search("zzz"), [])
+
+    def test_signup_reaches_other_workers(self):
+        other = UsernameIndex()
+        other.load(["bob"])
+        self.index.add("bobette")
+        self.assertIn("bobette", self.index.search("bobe"))
+
+        other._checked = 0  # skip the refresh interval
+        self.assertEqual(other.search("bobe"), ["bobette"])
+
+    def test_unbuilt_index_defers_to_the_database(self):
+        fresh = UsernameIndex()
+        fresh.start_rebuild = lambda: None
+        self.assertIsNone(fresh.search("bob"))
+
+
+class DirectMessagePairTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob")
+
+    def test_same_thread_either_way_round(self):
+        first, created = DirectMessageThread.get_or_create_thread(self.bob, self.alice)
+        self.assertTrue(created)
+        self.assertEqual((first.user_low, first.user_high), (self.alice, self.bob))
+        self.assertEqual(set(first.participants.all()), {self.alice, self.bob})
+
+        again, created = DirectMessageThread.get_or_create_thread(self.alice, self.bob)
+        self.assertFalse(created)
+        self.assertEqual(again.pk, first.pk)
+
+    def test_pair_is_unique(self):
+        DirectMessageThread.get_or_create_thread(self.alice, self.bob)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DirectMessageThread.objects.create(user_low=self.alice, user_high=self.bob)
@@ -0,0 +1,64 @@
+# chat/unread.py
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.utils import timezone
+
+from .models import LastRead
+
+
+def _conversation(group_id=None, thread_id=None) -> dict:
+    return {"group_id": group_id, "thread_id": None} if group_id else {"group_id": None, "thread_id": thread_id}
+
+
+def bump(message, recipient_ids=None) -> None:
+    """
+    Count a new message as unread for every other member of its conversation.
+    Three queries whatever the group size: members, existing rows, one UPDATE
+    (plus one bulk INSERT for members who have never had a row). Callers that
+    already know the recipients (ChatConsumer) pass recipient_ids to skip the first.
+
+    Missing rows are inserted at zero before the UPDATE, ignoring rows another
+    worker inserted meanwhile, so concurrent messages both count exactly once.
+    """
+    conv = _conversation(message.group_id, message.thread_id)
+    if recipient_ids is not None:
+        recipients = set(recipient_ids)
+    else:
+        if message.group_id:
+            members = User.objects.filter(chat_groups=message.group_id)
+        else:
+            members = User.objects.filter(direct_message=message.thread_id)
+        recipients = set(members.exclude(id=message.sender_id).values_list("id", flat=True))
+    if not recipients:
+        return
+
+    rows = LastRead.objects.filter(user_id__in=recipients, **conv)
+    have = set(rows.values_list("user_id", flat=True))
+    if recipients - have:
+        LastRead.objects.bulk_create(
+            [LastRead(user_id=uid, unread_count=0, **conv) for uid in recipients - have],
+            ignore_conflicts=True,
+        )
+    rows.update(unread_count=F("unread_count") + 1)
+
+
+def mark_read(user, group=None, thread=None) -> None:
+    """The user has opened the conversation: zero its counter."""
+    LastRead.objects.update_or_create(
+        user=user,
+        **_conversation(group.id if group else None, thread.id if thread else None),
+        defaults={"last_read_at": timezone.now(), "unread_count": 0},
+    )
+
+
+def counts_for(user) -> dict:
+    """{"groups": [...], "threads": [...]} unread counts, read in one query."""
+    groups, threads = [], []
+    for group_id, thread_id, count in LastRead.objects.filter(user=user).values_list(
+        "group_id", "thread_id", "unread_count"
+    ):
+        if group_id:
+            groups.append({"group_id": group_id, "unread_count": count})
+        elif thread_id:
+            threads.append({"thread_id": thread_id, "unread_count": count})
+    return {"groups": groups, "threads": threads}
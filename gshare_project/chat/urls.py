@@ -11,6 +11,7 @@ urlpatterns = [
     # path('history/<slug:room_slug>/', views.load_chat_history, name='chat_history'),
     # path('history/dm/<str:thread_id>/', views.load_chat_history, name='dm_chat_history'),
     path('send_message/', views.send_message, name='send_message'),
+    path('upload_url/', views.upload_url, name='chat_upload_url'),
     path('list_messages/', views.list_messages, name='list_messages'),
     path("json/notifications/", views.json_notifications, name="json_notifications"),
     path("edit_message/<int:message_id>/", views.edit_message, name="edit_message"),
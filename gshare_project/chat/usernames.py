@@ -0,0 +1,190 @@
+# chat/usernames.py
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+# Workers check the shared version at most this often (seconds), so a lookup
+# is normally pure in-process work.
+REFRESH_INTERVAL = 1.0
+# Signups kept in the cache for other workers to replay; a worker that falls
+# further behind than this rebuilds from the database.
+LOG_TTL = 24 * 3600
+MAX_REPLAY = 1000
+# Infix matches verify at most this many candidates from the rarest trigram.
+MAX_INFIX_SCAN = 20000
+
+VERSION_KEY = "usernames:version"
+
+
+def _log_key(version) -> str:
+    return f"usernames:add:{version}"
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class UsernameIndex:
+    """
+    In-process autocomplete index over auth_user.username.
+
+    Prefix matches come from a sorted list of lowercased names (bisect);
+    infix matches from trigram posting lists. The index is loaded once per
+    worker; signups are appended locally and published through the cache
+    (a version counter plus one entry per new name) so every worker picks
+    them up within REFRESH_INTERVAL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = []    # doc id -> username
+        self._sorted = []   # (lowercased username, doc id), sorted
+        self._grams = {}    # trigram -> array of doc ids, ascending
+        self._version = None
+        self._checked = 0.0
+        self._building = False
+
+    # building
+
+    def _insert(self, name) -> bool:
+        lower = name.lower()
+        i = bisect_left(self._sorted, (lower,))
+        while i < len(self._sorted) and self._sorted[i][0] == lower:
+            if self._names[self._sorted[i][1]] == name:
+                return False  # already indexed
+            i += 1
+        doc = len(self._names)
+        self._names.append(name)
+        insort(self._sorted, (lower, doc))
+        for g in _trigrams(lower):
+            self._grams.setdefault(g, array("I")).append(doc)
+        return True
+
+    def load(self, names, version=0) -> int:
+        """Replace the index with these usernames. Returns how many were indexed."""
+        all_names = list(names)
+        lowered = [n.lower() for n in all_names]
+        grams = {}
+        for doc, lower in enumerate(lowered):
+            for g in _trigrams(lower):
+                posting = grams.get(g)
+                if posting is None:
+                    posting = grams[g] = array("I")
+                posting.append(doc)
+        ordered = sorted(zip(lowered, range(len(all_names))))
+        with self._lock:
+            self._names, self._sorted, self._grams = all_names, ordered, grams
+            self._version = version
+            self._checked = time.monotonic()
+        return len(all_names)
+
+    def rebuild(self) -> int:
+        # read the version first: names added while loading are replayed, and deduplicated
+        version = cache.get(VERSION_KEY) or 0
+        names = User.objects.values_list("username", flat=True).order_by().iterator(chunk_size=10000)
+        return self.load(names, version)
+
+    def start_rebuild(self) -> None:
+        """Rebuild on a background thread; queries keep using the current index meanwhile."""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._rebuild_job, name="username-index", daemon=True).start()
+
+    def _rebuild_job(self):
+        from django.db import close_old_connections
+        try:
+            self.rebuild()
+        except Exception as e:
+            print(f"Username index rebuild failed: {e}")
+        finally:
+            self._building = False
+            close_old_connections()
+
+    def _sync(self) -> bool:
+        """Catch up with other workers' signups. False while the index has never been built."""
+        if self._version is None:
+            self.start_rebuild()
+            return False
+        now = time.monotonic()
+        if now - self._checked < REFRESH_INTERVAL:
+            return True
+        self._checked = now
+
+        latest = cache.get(VERSION_KEY) or 0
+        if latest <= self._version:
+            return True
+        wanted = [_log_key(v) for v in range(self._version + 1, latest + 1)]
+        added = cache.get_many(wanted) if len(wanted) <= MAX_REPLAY else {}
+        if len(added) < len(wanted):
+            self.start_rebuild()  # too far behind, or part of the log expired
+            return True
+        with self._lock:
+            for key in wanted:
+                self._insert(added[key])
+            self._version = max(self._version, latest)
+        return True
+
+    def add(self, username) -> None:
+        """Index a new signup here and publish it to the other workers."""
+        cache.add(VERSION_KEY, 0, None)
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:  # evicted between add and incr
+            cache.set(VERSION_KEY, 1, None)
+            version = 1
+        cache.set(_log_key(version), username, LOG_TTL)
+        if self._version is not None:
+            with self._lock:
+                self._insert(username)
+
+    # querying
+
+    def search(self, query, limit=10):
+        """
+        Usernames containing query (case-insensitive): prefix matches first, then
+        infix. None while the index is still being built (callers query the DB).
+        """
+        q = (query or "").strip().lower()
+        if not q:
+            return []
+        if not self._sync():
+            return None
+
+        with self._lock:
+            out, seen = [], set()
+            i = bisect_left(self._sorted, (q,))
+            while i < len(self._sorted) and len(out) < limit:
+                lower, doc = self._sorted[i]
+                if not lower.startswith(q):
+                    break
+                out.append(self._names[doc])
+                seen.add(doc)
+                i += 1
+
+            if len(out) < limit and len(q) >= 3:
+                postings = [self._grams.get(g) for g in _trigrams(q)]
+                if all(postings):
+                    rarest = min(postings, key=len)
+                    for doc in rarest[:MAX_INFIX_SCAN]:
+                        if doc not in seen and q in self._names[doc].lower():
+                            out.append(self._names[doc])
+                            if len(out) >= limit:
+                                break
+        return out
+
+    def __len__(self):
+        return len(self._names)
+
+
+username_index = UsernameIndex()
+
+
+def warm_in_background() -> None:
+    """Build the index off the startup path so the first keystrokes don't wait for it."""
+    username_index.start_rebuild()
@@ -9,13 +9,17 @@ from django.contrib.auth.models import User
 from django.views.decorators.http import require_GET
 
 from django.http import JsonResponse
-from .models import Message, ChatGroup, TypingState, DirectMessageThread, LastRead
+from .models import Message, ChatGroup, TypingState, DirectMessageThread
 from core.utils.aws_s3 import presigned_url, upload_image_to_aws
+from . import history, media, unread
+from .notify import announce_edit, announce_membership_change
+from .usernames import username_index
 
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 
 from django.http import StreamingHttpResponse
+from django.db import transaction
 from django.db.models import Q
 import json, time
 from django.utils import timezone
@@ -56,19 +60,11 @@ def groups_page(request):
 def chat_room(request, room_name):
     try:
         room = ChatGroup.objects.get(slug=room_name)
-        chat_messages = room.messages.all().order_by('timestamp')
+        chat_messages, has_older = history.page(room.messages.all(), limit=history.INITIAL_WINDOW)
         
         # Update LastRead for this user
-        LastRead.objects.update_or_create(
-            user=request.user,
-            group=room,
-            defaults={'last_read_at': timezone.now()}
-        )
+        unread.mark_read(request.user, group=room)
         
-        # Add presigned URLs
-        for msg in chat_messages:
-            msg.image_url = presigned_url(msg.image) if msg.image else None
-
         user_groups = ChatGroup.objects.filter(members=request.user)
         members = room.members.all()
         unread_notifications = request.user.notifications.filter(is_read=False)
@@ -87,6 +83,7 @@ def chat_room(request, room_name):
             'room_name': room_name,
             'room_code': room.group_code,
             'messages': chat_messages,
+            'history': {'messages': history.serialize(chat_messages), 'has_more': has_older},
             'groups': user_groups,
             'members': members,
             'dm_list': dm_list,
@@ -125,6 +122,7 @@ def join_group(request):
         try:
             group = ChatGroup.objects.get(group_code=group_code)
             group.members.add(request.user)
+            announce_membership_change(group)
             messages.success(request, f"you have successfully joined the group '{group.name}'.")
             return redirect('chat_room', room_name=group.slug)
         except ChatGroup.DoesNotExist:
@@ -138,20 +136,13 @@ def direct_message(request, thread_id):
     print("Direct message view called with thread_id:", thread_id)
     thread = DirectMessageThread.objects.filter(id=thread_id, participants=request.user).first()
     
-        # Update LastRead for this user
-    LastRead.objects.update_or_create(
-        user=request.user,
-        thread=thread,
-        defaults={'last_read_at': timezone.now()}
-    )
-    
     if not thread:
         messages.error(request, "Direct message thread does not exist or you do not have access.")
         return redirect('groups_page')
     else:
-        messages_qs = Message.objects.filter(thread=thread).order_by('timestamp')
-        for msg in messages_qs:
-            msg.image_url = presigned_url(msg.image) if msg.image else None        
+        # Update LastRead for this user
+        unread.mark_read(request.user, thread=thread)
+        messages_qs, has_older = history.page(Message.objects.filter(thread=thread), limit=history.INITIAL_WINDOW)
         other_user = thread.participants.exclude(id=request.user.id).first()
         user_groups = ChatGroup.objects.filter(members=request.user)
         DMs = DirectMessageThread.objects.filter(participants=request.user)
@@ -167,7 +158,7 @@ def direct_message(request, thread_id):
             }
             for dm in DMs
         ]
-        return render(request, 'chat/chat_room.html', {'thread': thread, 'messages': messages_qs, 'other_user': other_user, 'groups': user_groups, 'dm_list': dm_list, 'user': request.user, 'notifications': unread_notifications})
+        return render(request, 'chat/chat_room.html', {'thread': thread, 'messages': messages_qs, 'history': {'messages': history.serialize(messages_qs), 'has_more': has_older}, 'other_user': other_user, 'groups': user_groups, 'dm_list': dm_list, 'user': request.user, 'notifications': unread_notifications})
         
 @require_GET
 def autocomplete_usernames(request):
@@ -175,8 +166,11 @@ def autocomplete_usernames(request):
     results = []
     if query:
         # take only the top 10 results
-        users = User.objects.filter(username__icontains=query)[:10]
-        results = list(users.values_list("username", flat=True))
+        results = username_index.search(query, limit=10)
+        if results is None:
+            # index still loading in this worker
+            users = User.objects.filter(username__icontains=query)[:10]
+            results = list(users.values_list("username", flat=True))
     return JsonResponse(results, safe=False)
 
 # # views.py
@@ -351,11 +345,14 @@ def send_message(request):
 
     content = request.POST.get("content", "").strip()
     image_file = request.FILES.get("image_file")
+    uploaded_key = request.POST.get("image_key")  # already uploaded through chat_upload_url
     group_id = request.POST.get("group_id")
     thread_id = request.POST.get("thread_id")
 
-    if not content and not image_file:
+    if not content and not image_file and not uploaded_key:
         return JsonResponse({"error": "No content"}, status=400)
+    if uploaded_key and not media.is_own_upload(uploaded_key, request.user.username):
+        return JsonResponse({"error": "Invalid image key"}, status=400)
 
     # Determine target type (DM or Group)
     group = None
@@ -376,8 +373,8 @@ def send_message(request):
     else:
         return JsonResponse({"error": "Must include group_id or thread_id"}, status=400)
     
-    image_key = None
-    if image_file:
+    image_key = uploaded_key
+    if image_file and not image_key:
         image_key = upload_image_to_aws(image_file, folder='chat')
     
     if not content and not image_key:
@@ -391,6 +388,8 @@ def send_message(request):
         group=group,
         thread=thread
     )
+    unread.bump(msg)
+    transaction.on_commit(lambda: media.schedule_thumbnail(msg))
 
     return JsonResponse({
         "status": "ok",
@@ -399,17 +398,42 @@ def send_message(request):
             "username": msg.sender.username,
             "content": msg.content,
             "image_url": presigned_url(msg.image) if msg.image else None,
+            "thumb_url": None,  # the thumbnail is still being made
             "timestamp": msg.timestamp.strftime("%Y-%m-%d %H:%M:%S")
         }
     })
 
 
+@login_required
+@require_POST
+def upload_url(request):
+    """
+    Presigned POST so the browser uploads a chat image straight to S3, then
+    sends only the returned key with its message.
+    """
+    content_type = request.POST.get("content_type", "")
+    if not content_type.startswith("image/"):
+        return JsonResponse({"error": "Only images can be attached"}, status=400)
+    try:
+        upload = media.create_upload(request.user.username, request.POST.get("filename", ""), content_type)
+    except Exception as e:
+        return JsonResponse({"error": f"Presign failed: {e}"}, status=500)
+    return JsonResponse(upload)
+
+
 
 @login_required
 def list_messages(request):
+    """
+    One page of a group's or DM's history, oldest first.
+      ?before=<cursor>  older messages (scrolling up)
+      ?after=<cursor>   newer messages (polling)
+      &limit=<n>        page size, capped at history.MAX_PAGE
+    Each message carries its own cursor; has_more says whether another page
+    exists in the requested direction.
+    """
     group_id = request.GET.get("group_id") or None
     thread_id = request.GET.get("thread_id") or None
-    print("list_messages called with group_id:", group_id, "thread_id:", thread_id)
 
     # Convert thread_id to integer if present
     if thread_id is not None:
@@ -422,66 +446,32 @@ def list_messages(request):
         # safe to fetch DM
         thread = DirectMessageThread.objects.get(id=thread_id)
         messages = thread.messages.all()
-        print("Fetched messages for thread:", thread.id)
     elif group_id:
         group = ChatGroup.objects.get(slug=group_id)
         messages = group.messages.all()
-        print("Fetched messages for group:", group.name)
     else:
         return JsonResponse({"error": "Missing group_id or thread_id"}, status=400)
 
-    return JsonResponse({
-        "messages": [
-            {
-                "id": m.id,
-                "username": m.sender.username,
-                "content": m.content,
-                "image_url": presigned_url(m.image) if m.image else None,
-                "timestamp": m.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            for m in messages
-        ]
-    })
+    before = request.GET.get("before")
+    after = request.GET.get("after")
+    cursors = {}
+    for name, value in (("before", before), ("after", after)):
+        if value:
+            cursors[name] = history.decode_cursor(value)
+            if cursors[name] is None:
+                return JsonResponse({"error": f"Invalid {name} cursor"}, status=400)
+    try:
+        limit = int(request.GET.get("limit") or history.PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit"}, status=400)
+
+    page, has_more = history.page(messages, limit=limit, **cursors)
+    return JsonResponse({"messages": history.serialize(page), "has_more": has_more})
     
 @login_required
 def json_notifications(request):
-    user = request.user
-
-    group_unreads = []
-    dm_unreads = []
-
-    # GROUPS
-    for group in user.chat_groups.all():
-        last_read = LastRead.objects.filter(user=user, group=group).first()
-        if last_read:
-            unread = group.messages.filter(
-                timestamp__gt=last_read.last_read_at
-            ).exclude(sender=user).count()
-        else:
-            unread = group.messages.exclude(sender=user).count()
-
-        group_unreads.append({
-            "group_id": group.id,
-            "unread_count": unread
-        })
-
-    # DIRECT MESSAGES
-    for thread in user.direct_message.all():
-        last_read = LastRead.objects.filter(user=user, thread=thread).first()
-        if last_read:
-            unread = thread.messages.filter(
-                timestamp__gt=last_read.last_read_at
-            ).exclude(sender=user).count()
-        else:
-            unread = thread.messages.exclude(sender=user).count()  # FIXED
-
-        dm_unreads.append({
-            "thread_id": thread.id,
-            "unread_count": unread
-        })
-
-
-    return JsonResponse({"groups": group_unreads, "threads": dm_unreads})
+    # counters are kept up to date as messages are saved (chat.unread)
+    return JsonResponse(unread.counts_for(request.user))
 
     
 
@@ -512,7 +502,9 @@ def edit_message(request, message_id):
         return JsonResponse({"error": "Message cannot be empty"}, status=400)
 
     msg.content = new_content
+    msg.edited_at = timezone.now()
     msg.save()
+    announce_edit(msg)
 
     return JsonResponse({
         "success": True,
@@ -535,9 +527,12 @@ def delete_message(request, message_id):
     if msg.sender != request.user:
         return HttpResponseForbidden("You cannot delete this message")
 
-    msg.content = "(deleted)"
+    msg.content = history.DELETED
     msg.image = None
+    msg.thumbnail = None
+    msg.edited_at = timezone.now()
     msg.save()
+    announce_edit(msg)
 
     return JsonResponse({"success": True, "message_id": msg.id})
 
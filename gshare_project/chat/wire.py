@@ -0,0 +1,24 @@
+# chat/wire.py
+import json
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is a few times slower
+    orjson = None
+
+
+def encode(payload) -> str:
+    """Compact JSON text for one websocket frame."""
+    if orjson is not None:
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def frame(handler, payload, **extra) -> dict:
+    """
+    group_send event whose frame is encoded once, by the sender. Receiving
+    consumers forward event["text"] as is, so serialization no longer grows
+    with the number of subscribers. extra carries fields a handler still
+    needs to inspect (it is not sent to the client).
+    """
+    return {"type": handler, "text": encode(payload), **extra}
@@ -17,8 +17,12 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'configurations.settings')
 django.setup()
 
 from chat.routing import websocket_urlpatterns 
+from chat.usernames import warm_in_background
 django_asgi_app = get_asgi_application()
 
+# chat username autocomplete index; built off the startup path
+warm_in_background()
+
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(
@@ -115,11 +115,35 @@ WSGI_APPLICATION = 'configurations.wsgi.application'
 ASGI_APPLICATION = 'configurations.asgi.application'
 
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
+# Shared backend for the channel layer and cache. Set REDIS_URL when running more
+# than one Daphne process; REDIS_URLS (comma separated) shards channel-layer groups
+# across several servers. Without either, everything stays in-process.
+REDIS_URLS = [
+    u.strip()
+    for u in config("REDIS_URLS", default=config("REDIS_URL", default="")).split(",")
+    if u.strip()
+]
+# Django treats extra cache LOCATIONs as read replicas, not shards, so the cache
+# (and chat.presence) get their own URL, defaulting to the first server above.
+REDIS_CACHE_URL = config("REDIS_CACHE_URL", default=REDIS_URLS[0] if REDIS_URLS else "")
+
+if REDIS_URLS:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': REDIS_URLS,
+                'capacity': config("CHANNEL_CAPACITY", default=1500, cast=int),
+                'expiry': 10,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -181,6 +205,10 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Memory-mapped item catalog shared by the workers (core.utils.catalog_snapshot);
+# must be on a filesystem every worker process on the host can see.
+CATALOG_SNAPSHOT_PATH = config("CATALOG_SNAPSHOT_PATH", default=os.path.join(BASE_DIR, 'var', 'catalog.snapshot'))
+
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static')
 ]
@@ -234,12 +262,23 @@ LOGGING = {
     }
 }
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "gshare-live-tracking",
+if REDIS_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+            "KEY_PREFIX": "gshare",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "gshare-live-tracking",
+            # map grid cells (core.utils.spatial_index) and map tiles live here
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        }
     }
-}
 
 
 INSTALLED_APPS += ["storages"]
@@ -249,6 +288,10 @@ AWS_SECRET_ACCESS_KEY = config("AWS_SECRET_ACCESS_KEY", default=None)
 AWS_S3_REGION_NAME = config("AWS_S3_REGION_NAME", default="us-east-2")
 AWS_STORAGE_BUCKET_NAME = config("AWS_STORAGE_BUCKET_NAME", default="gshare-media-prod")
 AWS_S3_SIGNATURE_VERSION = "s3v4"
+# Override for S3-compatible stand-ins (moto, minio); default is the regional endpoint
+AWS_S3_ENDPOINT_URL = config("AWS_S3_ENDPOINT_URL", default=None)
+# Sockets kept open by the shared client (core.utils.aws_s3.get_s3_client)
+AWS_S3_MAX_POOL_CONNECTIONS = config("AWS_S3_MAX_POOL_CONNECTIONS", default=50, cast=int)
 
 # Files are private; URLs are time-limited (presigned)
 AWS_QUERYSTRING_AUTH = True
@@ -63,6 +63,7 @@ urlpatterns = [
     
     path("maps/maps-data/<str:min_lat>/<str:min_lng>/<str:max_lat>/<str:max_lng>/", views.maps_data, name="maps_data"),
     path('maps/people-data/<str:min_lat>/<str:min_lng>/<str:max_lat>/<str:max_lng>/', views.people_data, name='people_data'),
+    path('maps/live-data/<str:min_lat>/<str:min_lng>/<str:max_lat>/<str:max_lng>/', views.live_data, name='live_data'),
 
 
     path('myorders/', views.myorders, name='order_history'),
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class coreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the Items receivers)
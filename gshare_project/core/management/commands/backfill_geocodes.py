@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.models import Stores, Users
+from core.utils import map_tiles
+from core.utils.geo import geocode_many
+from core.utils.spatial_index import user_index
+
+
+def _store_address(s):
+    if s.location:
+        return s.location
+    parts = [p for p in [s.street, s.city, s.state, s.postal_code, s.country] if p]
+    return ", ".join(parts)
+
+
+class Command(BaseCommand):
+    help = "Fill in latitude/longitude for Users and Stores in batches through the geocoding cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--all", action="store_true", help="Re-geocode every row, not only rows missing coordinates.")
+        parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument("--only", choices=["users", "stores"])
+
+    def handle(self, *args, **opts):
+        if opts["only"] in (None, "users"):
+            self._backfill(
+                Users.objects.using("gsharedb").exclude(address__isnull=True).exclude(address=""),
+                lambda u: u.address,
+                opts,
+                "users",
+            )
+        if opts["only"] in (None, "stores"):
+            self._backfill(Stores.objects.using("gsharedb"), _store_address, opts, "stores")
+
+    def _backfill(self, qs, address_of, opts, label):
+        if not opts["all"]:
+            qs = qs.filter(
+                Q(latitude__isnull=True) | Q(longitude__isnull=True) | Q(latitude=0, longitude=0)
+            )
+
+        updated = failed = 0
+        last_id = 0
+        batch_size = opts["batch_size"]
+        while True:
+            batch = list(qs.filter(id__gt=last_id).order_by("id")[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            coords = geocode_many([address_of(r) for r in batch])
+            changed = []
+            moved = []
+            for r in batch:
+                lat, lng = coords.get(address_of(r), (0.0, 0.0))
+                if (lat, lng) == (0.0, 0.0):
+                    failed += 1
+                    continue
+                moved.append((r.latitude, r.longitude))
+                moved.append((lat, lng))
+                r.latitude, r.longitude = lat, lng
+                changed.append(r)
+
+            if changed and not opts["dry_run"]:
+                qs.model.objects.using("gsharedb").bulk_update(changed, ["latitude", "longitude"])
+                if qs.model is Users:
+                    user_index.invalidate(*moved)
+                    map_tiles.bump_tiles_for_points(moved)
+            updated += len(changed)
+            self.stdout.write(f"{label}: {updated} updated, {failed} unresolved (through id {last_id})")
+
+        verb = "would update" if opts["dry_run"] else "updated"
+        self.stdout.write(self.style.SUCCESS(f"{label}: {verb} {updated}, {failed} unresolved"))
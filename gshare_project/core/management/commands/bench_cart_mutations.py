@@ -0,0 +1,164 @@
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import Items, Orders, Stores, Users
+from core.utils import cart_engine, catalog_search, order_lines
+
+DB = "gsharedb"
+
+
+def _legacy_add(email, item_id, store_id, quantity=1):
+    # what views.add_to_cart did before core.utils.cart_engine
+    profile = Users.objects.using(DB).get(email=email)
+    item = Items.objects.using(DB).get(id=item_id)
+    active_store = Stores.objects.using(DB).filter(id=store_id).first()
+    order = Orders.objects.using(DB).filter(user=profile, status='cart').first()
+    if not order:
+        order = Orders.objects.using(DB).create(
+            user=profile, status='cart', order_date=timezone.now(), store=active_store,
+            total_amount=0, delivery_address=profile.address,
+        )
+    elif order.store_id != active_store.id:
+        order.store = active_store
+        order.save(using=DB, update_fields=['store'])
+    with transaction.atomic(using=DB):
+        order_lines.add_lines(order.id, [(item.id, quantity, item.price)])
+        total = order_lines.order_total(order.id)
+    order.total_amount = total
+    order.order_date = timezone.now()
+    order.save(using=DB)
+
+
+def _engine_add(email, item_id, store_id, quantity=1):
+    cart_engine.add(cart_engine.shopper_for(email), cart_engine.item_info(item_id), quantity, store_id=store_id)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark add_to_cart under concurrent users against the gsharedb MySQL schema: the old "
+        "read-then-write sequence vs. core.utils.cart_engine. Creates and removes its own rows; "
+        "needs core migration 0005 (orders.cart_user_id)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=8)
+        parser.add_argument("--threads-per-user", type=int, default=4, help="Concurrent tabs clicking for the same user.")
+        parser.add_argument("--clicks", type=int, default=25, help="Adds per thread.")
+        parser.add_argument("--items", type=int, default=10)
+
+    def handle(self, *args, **opts):
+        conn = connections[DB]
+        if conn.vendor != "mysql":
+            raise CommandError("bench_cart_mutations needs the MySQL gsharedb database.")
+        with conn.cursor() as cur:
+            cur.execute("SHOW COLUMNS FROM orders LIKE 'cart_user_id'")
+            if cur.fetchone() is None:
+                raise CommandError("orders.cart_user_id is missing; run `manage.py migrate core` first.")
+
+        tag = f"bench_cart_{uuid.uuid4().hex[:8]}"
+        store = Stores.objects.using(DB).create(name=tag)
+        users = [
+            Users.objects.using(DB).create(name=tag, email=f"{tag}_{i}@bench.invalid", address="1 Bench St",
+                                           username=f"{tag}_{i}")
+            for i in range(opts["users"])
+        ]
+        items = [
+            Items.objects.using(DB).create(store=store, name=f"{tag}_{i}", price=Decimal("1.25") + i, stock=0)
+            for i in range(opts["items"])
+        ]
+        try:
+            self._statements(users[0], items[0], store)
+            self._reset(users)
+
+            self.stdout.write(
+                f"{opts['users']} users x {opts['threads_per_user']} threads x {opts['clicks']} adds"
+            )
+            self.stdout.write(f"{'path':<10} {'adds/s':>9} {'errors':>7} {'extra carts':>12} {'bad totals':>11}")
+            for label, add in (("legacy", _legacy_add), ("engine", _engine_add)):
+                for u in users:
+                    cart_engine.shopper_for(u.email)
+                for it in items:
+                    cart_engine.item_info(it.id)
+                rate, errors = self._run(add, users, items, store, opts)
+                extra, bad = self._check(users)
+                self.stdout.write(f"{label:<10} {rate:>9.0f} {errors:>7} {extra:>12} {bad:>11}")
+                self._reset(users)
+        finally:
+            self._reset(users)
+            for u in users:
+                cart_engine.forget_shopper(u.email)
+            for it in items:
+                cart_engine.forget_item(it.id)
+            catalog_search.unindex_items([it.id for it in items])
+            # raw deletes: the ORM collector would walk order_items, which has no id column
+            with connections[DB].cursor() as cur:
+                cur.execute("DELETE FROM items WHERE store_id = %s", [store.id])
+                cur.executemany("DELETE FROM users WHERE id = %s", [(u.id,) for u in users])
+                cur.execute("DELETE FROM stores WHERE id = %s", [store.id])
+
+    def _statements(self, user, item, store):
+        """Statements per add to an existing cart line, caches warm."""
+        _engine_add(user.email, item.id, store.id)
+        counts = []
+        for add in (_legacy_add, _engine_add):
+            with CaptureQueriesContext(connections[DB]) as ctx:
+                add(user.email, item.id, store.id)
+            counts.append(len(ctx.captured_queries))
+        self.stdout.write(f"statements per add: legacy {counts[0]}, engine {counts[1]}")
+
+    def _run(self, add, users, items, store, opts):
+        threads_total = len(users) * opts["threads_per_user"]
+        barrier = threading.Barrier(threads_total + 1)
+        errors = []
+
+        def worker(user, offset):
+            try:
+                barrier.wait()
+                for n in range(opts["clicks"]):
+                    try:
+                        add(user.email, items[(offset + n) % len(items)].id, store.id)
+                    except Exception as e:
+                        errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=worker, args=(u, t))
+            for u in users
+            for t in range(opts["threads_per_user"])
+        ]
+        for t in threads:
+            t.start()
+        barrier.wait()
+        t0 = time.perf_counter()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        return (threads_total * opts["clicks"] - len(errors)) / elapsed, len(errors)
+
+    def _check(self, users):
+        """(carts beyond one per user, carts whose total_amount disagrees with their lines)."""
+        carts = list(
+            Orders.objects.using(DB).filter(user_id__in=[u.id for u in users], status='cart')
+            .values_list("id", "user_id", "total_amount")
+        )
+        extra = len(carts) - len({user_id for _, user_id, _ in carts})
+        bad = sum(1 for oid, _, total in carts if (total or 0) != order_lines.order_total(oid))
+        return extra, bad
+
+    def _reset(self, users):
+        ids = [u.id for u in users]
+        placeholders = ", ".join(["%s"] * len(ids))
+        with connections[DB].cursor() as cur:
+            cur.execute(
+                f"DELETE oi FROM order_items oi JOIN orders o ON o.id = oi.order_id WHERE o.user_id IN ({placeholders})",
+                ids,
+            )
+            cur.execute(f"DELETE FROM orders WHERE user_id IN ({placeholders})", ids)
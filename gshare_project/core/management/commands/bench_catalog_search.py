@@ -0,0 +1,115 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connections
+
+from core.models import CatalogTerm, Items, Stores
+from core.utils import catalog_search
+
+DB = "gsharedb"
+
+_WORDS = (
+    "organic whole milk skim almond oat soy butter cheddar mozzarella greek yogurt vanilla strawberry "
+    "chocolate banana apple honeycrisp gala orange lemon lime grape seedless red green yellow sweet "
+    "potato russet onion garlic tomato roma cherry basil spinach kale romaine lettuce carrot baby celery "
+    "broccoli crown cauliflower pepper bell jalapeno chicken breast thigh boneless skinless ground beef "
+    "turkey pork chop bacon smoked ham salmon fillet tuna shrimp frozen pizza pepperoni cheese bread "
+    "wheat sourdough bagel tortilla flour corn rice brown jasmine pasta penne spaghetti sauce marinara "
+    "olive oil canola vinegar balsamic salt sea black coffee ground dark roast tea green herbal juice "
+    "sparkling water soda cola diet lemonade cereal granola oats bar protein peanut crunchy creamy jam "
+    "grape honey maple syrup pancake mix eggs large dozen cage free family size value pack light "
+    "reduced fat sugar free gluten low sodium unsalted salted roasted raw fresh premium classic"
+).split()
+_QUERIES = ("milk", "organic chicken", "choc", "gluten free pasta sauce")
+
+
+def fill_items(store, n, rnd, batch_size=10_000):
+    """Bulk-insert n synthetic grocery items into store."""
+    for start in range(0, n, batch_size):
+        Items.objects.using(DB).bulk_create([
+            Items(
+                store=store,
+                name=" ".join(rnd.sample(_WORDS, rnd.randint(2, 4))).title(),
+                description=" ".join(rnd.sample(_WORDS, rnd.randint(4, 8))),
+                price=rnd.randint(99, 4999) / 100,
+                stock=0,
+            )
+            for _ in range(min(batch_size, n - start))
+        ])
+
+
+def _median_ms(fn, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def _legacy_page(query, page):
+    # what views.cart did before core.utils.catalog_search: icontains + COUNT(*) + OFFSET
+    items = Items.objects.using(DB).filter(name__icontains=query).order_by("id")
+    page_obj = Paginator(items, catalog_search.PAGE_SIZE).get_page(page)
+    return [i.store.name for i in page_obj]
+
+
+def _search_page(query, cursor):
+    return [i.store.name for i in catalog_search.search(query, cursor=cursor).items]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the cart browse search on a synthetic catalog: icontains + Paginator vs. the "
+        "core_catalogterm index with keyset pages. Creates and removes its own store, items and postings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=1_000_000)
+        parser.add_argument("--pages", type=int, nargs="+", default=[1, 50, 500])
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts["seed"])
+        store = Stores.objects.using(DB).create(name=f"bench_catalog_{uuid.uuid4().hex[:8]}")
+        try:
+            t0 = time.perf_counter()
+            fill_items(store, opts["items"], rnd)
+            loaded = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            catalog_search.rebuild(items=Items.objects.using(DB).filter(store=store))
+            indexed = time.perf_counter() - t0
+            postings = CatalogTerm.objects.using(DB).filter(item__store=store).count()
+            self.stdout.write(
+                f"{opts['items']} items loaded in {loaded:.1f}s, {postings} postings indexed in {indexed:.1f}s"
+            )
+
+            self.stdout.write(f"medians of {opts['runs']} runs")
+            self.stdout.write(f"{'query':<24} {'page':>5} {'icontains+offset':>17} {'index+keyset':>13} {'count':>7}")
+            for query in _QUERIES:
+                ranked = catalog_search._ranked(catalog_search.tokenize(query), None, None, None)
+                for page in opts["pages"]:
+                    # the cursor a reader would be holding after paging this far
+                    cursor = None
+                    if page > 1:
+                        row = ranked[(page - 1) * catalog_search.PAGE_SIZE - 1:][:1]
+                        row = list(row)
+                        if not row:
+                            continue
+                        cursor = catalog_search.encode_cursor(row[0]["score"], row[0]["item_id"], catalog_search.COUNT_CAP + 1)
+
+                    legacy = _median_ms(lambda: _legacy_page(query, page), opts["runs"])
+                    fast = _median_ms(lambda: _search_page(query, cursor), opts["runs"])
+                    result = catalog_search.search(query, cursor=cursor)
+                    count = f"{result.count}{'+' if result.more else ''}"
+                    self.stdout.write(f"{query:<24} {page:>5} {legacy:>15.1f}ms {fast:>11.1f}ms {count:>7}")
+        finally:
+            catalog_search.unindex_items(Items.objects.using(DB).filter(store=store).values_list("id", flat=True))
+            with connections[DB].cursor() as cur:
+                cur.execute("DELETE FROM items WHERE store_id = %s", [store.id])
+                cur.execute("DELETE FROM stores WHERE id = %s", [store.id])
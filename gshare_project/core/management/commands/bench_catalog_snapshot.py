@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import override_settings
+
+from core.management.commands.bench_catalog_search import fill_items
+from core.models import Items, Stores
+from core.utils import catalog_search, catalog_snapshot
+
+DB = "gsharedb"
+
+
+def _median_ms(fn, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def _memory_kb():
+    """(rss, pss) of this process in kB; pss splits shared pages between the processes mapping them."""
+    found = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                found[key] = int(rest.split()[0])
+    return found["Rss"], found["Pss"]
+
+
+def _legacy_catalog():
+    # what views.getAllItemsFromDatabase did per request before the snapshot
+    return list(Items.objects.using(DB).values_list("name", "id", "store__name", "price"))
+
+
+def _worker(mode, path, barrier, results):
+    # baseline once every sibling is forked, since pages inherited from the parent are shared by all of them
+    barrier.wait()
+    rss0, pss0 = _memory_kb()
+    if mode == "legacy":
+        held = _legacy_catalog()
+    else:
+        held = catalog_snapshot.CatalogSnapshot(path)
+        for _ in held:
+            pass
+    barrier.wait()
+    # measured while every worker still holds its copy, so pss reflects the sharing
+    rss, pss = _memory_kb()
+    results.put((rss - rss0, pss - pss0))
+    barrier.wait()
+    del held
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the memory-mapped catalog snapshot against each worker loading the catalog from the "
+        "database: per-worker RSS/PSS and read latency. Creates and removes its own store and items."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=500_000)
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def _workers(self, mode, path, n):
+        ctx = multiprocessing.get_context("fork")
+        barrier, results = ctx.Barrier(n), ctx.Queue()
+        # forked children must open their own database connections
+        connections.close_all()
+        procs = [ctx.Process(target=_worker, args=(mode, path, barrier, results)) for _ in range(n)]
+        for p in procs:
+            p.start()
+        deltas = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+        rss = statistics.mean(d[0] for d in deltas) / 1024
+        pss = statistics.mean(d[1] for d in deltas) / 1024
+        return rss, pss
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts["seed"])
+        store = Stores.objects.using(DB).create(name=f"bench_snapshot_{uuid.uuid4().hex[:8]}")
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, "catalog.snapshot")
+        try:
+            with override_settings(CATALOG_SNAPSHOT_PATH=path):
+                t0 = time.perf_counter()
+                fill_items(store, opts["items"], rnd)
+                loaded = time.perf_counter() - t0
+                t0 = time.perf_counter()
+                catalog_snapshot.build()
+                built = time.perf_counter() - t0
+                self.stdout.write(
+                    f"{opts['items']} items loaded in {loaded:.1f}s; snapshot built in {built:.1f}s, "
+                    f"{os.path.getsize(path) / 2**20:.1f} MiB"
+                )
+
+                self.stdout.write(f"per-worker memory, {opts['workers']} workers holding the catalog")
+                self.stdout.write(f"{'':<22} {'rss':>9} {'pss':>9}")
+                for mode in ("legacy", "snapshot"):
+                    rss, pss = self._workers(mode, path, opts["workers"])
+                    self.stdout.write(f"{mode:<22} {rss:>6.1f}MiB {pss:>6.1f}MiB")
+
+                runs = opts["runs"]
+                ids = list(Items.objects.using(DB).filter(store=store).values_list("id", flat=True))
+                page = rnd.sample(ids, catalog_search.PAGE_SIZE)
+                catalog_snapshot.current()
+                self.stdout.write(f"medians of {runs} runs")
+                rows = [
+                    ("full catalog (db)", _median_ms(_legacy_catalog, runs)),
+                    ("full catalog (snap)", _median_ms(lambda: list(catalog_snapshot.current()), runs)),
+                    ("cold map + scan (snap)", _median_ms(lambda: list(catalog_snapshot.CatalogSnapshot(path)), runs)),
+                    ("current()", _median_ms(catalog_snapshot.current, runs * 100)),
+                    (f"{len(page)}-item page (db)", _median_ms(
+                        lambda: [i.store.name for i in Items.objects.using(DB).select_related("store").in_bulk(page).values()],
+                        runs * 10)),
+                    (f"{len(page)}-item page (snap)", _median_ms(
+                        lambda: [i.store.name for i in catalog_search._hydrate(page).values()], runs * 10)),
+                ]
+                for label, ms in rows:
+                    self.stdout.write(f"{label:<22} {ms:>9.3f}ms")
+        finally:
+            tmp.cleanup()
+            with connections[DB].cursor() as cur:
+                cur.execute("DELETE FROM items WHERE store_id = %s", [store.id])
+                cur.execute("DELETE FROM stores WHERE id = %s", [store.id])
@@ -0,0 +1,108 @@
+import json
+import random
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from django.core.management.base import BaseCommand
+
+from core.utils import routing
+
+
+def _p95(samples):
+    return statistics.quantiles(samples, n=20)[18]
+
+
+def _matrix_server(latency_s):
+    """Local stand-in for the Distance Matrix API that answers after a fixed delay."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            q = parse_qs(urlparse(self.path).query)
+            origins = q["origins"][0].split("|")
+            destinations = q["destinations"][0].split("|")
+            time.sleep(latency_s)
+            body = json.dumps({
+                "status": "OK",
+                "rows": [
+                    {"elements": [
+                        {
+                            "status": "OK",
+                            "distance": {"text": "3.1 mi", "value": 5000 + 100 * i + j},
+                            "duration": {"text": "9 mins", "value": 540 + 10 * i + j},
+                        }
+                        for j in range(len(destinations))
+                    ]}
+                    for i in range(len(origins))
+                ],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _legacy_drive_time(url, origin, destination):
+    # what views.drive_time used to do: fresh connection, no timeout, no cache
+    data = requests.get(f"{url}?origins={origin}&destinations={destination}&key=x").json()
+    return data["rows"][0]["elements"][0]
+
+
+class Command(BaseCommand):
+    help = "Benchmark pickup_price routing: three serial Distance Matrix calls vs. one cached matrix call."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--latency-ms", type=float, default=120, help="Simulated API round-trip time.")
+        parser.add_argument("--runs", type=int, default=30)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts["seed"])
+        server = _matrix_server(opts["latency_ms"] / 1000)
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        old_url, routing.MATRIX_URL = routing.MATRIX_URL, url
+
+        def point():
+            return round(rnd.uniform(40.5, 40.9), 6), round(rnd.uniform(-112.1, -111.7), 6)
+
+        legacy_ms, cold_ms, warm_ms = [], [], []
+        try:
+            for _ in range(opts["runs"]):
+                driver, dropoff, store = point(), point(), point()
+                as_str = [f"{p[0]},{p[1]}" for p in (driver, dropoff, store)]
+
+                t0 = time.perf_counter()
+                _legacy_drive_time(url, as_str[0], as_str[2])
+                _legacy_drive_time(url, as_str[1], as_str[2])
+                _legacy_drive_time(url, as_str[0], as_str[2])
+                legacy_ms.append((time.perf_counter() - t0) * 1000)
+
+                t0 = time.perf_counter()
+                routing.drive_matrix([driver, dropoff], [store], "x")
+                cold_ms.append((time.perf_counter() - t0) * 1000)
+
+                t0 = time.perf_counter()
+                routing.drive_matrix([driver, dropoff], [store], "x")
+                warm_ms.append((time.perf_counter() - t0) * 1000)
+        finally:
+            routing.MATRIX_URL = old_url
+            server.shutdown()
+
+        self.stdout.write(f"{'path':<24} {'p50':>10} {'p95':>10}")
+        for label, samples in (
+            ("legacy (3 serial)", legacy_ms),
+            ("matrix (cold cache)", cold_ms),
+            ("matrix (warm cache)", warm_ms),
+        ):
+            self.stdout.write(f"{label:<24} {statistics.median(samples):>8.2f}ms {_p95(samples):>8.2f}ms")
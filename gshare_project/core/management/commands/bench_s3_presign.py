@@ -0,0 +1,118 @@
+import logging
+import statistics
+import time
+from uuid import uuid4
+
+import boto3
+from botocore.config import Config
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from core.utils import aws_s3
+
+BUCKET = "bench-gshare-media"
+REGION = "us-east-2"
+
+
+def _p95(samples):
+    return statistics.quantiles(samples, n=20)[18]
+
+
+def _legacy_client(endpoint):
+    # what get_s3_client used to do on every call
+    return boto3.client(
+        "s3",
+        region_name=REGION,
+        aws_access_key_id="bench",
+        aws_secret_access_key="bench",
+        endpoint_url=endpoint,
+        config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark rendering a page of N images against a local moto S3 server: a new client per "
+        "image (old get_s3_client) vs. the shared client and signed-URL cache. Also times "
+        "object fetches (as in _load_image_bytes_from_s3)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=50)
+        parser.add_argument("--runs", type=int, default=20)
+
+    def handle(self, *args, **opts):
+        try:
+            from moto.server import ThreadedMotoServer
+        except ImportError:
+            raise CommandError("moto[server] is required: pip install 'moto[server]'")
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+        server.start()
+        host, port = server.get_host_and_port()
+        endpoint = f"http://{host}:{port}"
+        try:
+            with override_settings(
+                AWS_ACCESS_KEY_ID="bench",
+                AWS_SECRET_ACCESS_KEY="bench",
+                AWS_S3_REGION_NAME=REGION,
+                AWS_STORAGE_BUCKET_NAME=BUCKET,
+                AWS_S3_ENDPOINT_URL=endpoint,
+            ):
+                self._run(endpoint, opts["images"], opts["runs"])
+        finally:
+            aws_s3.reset_s3_client()
+            server.stop()
+
+    def _run(self, endpoint, n, runs):
+        aws_s3.reset_s3_client()
+        s3 = aws_s3.get_s3_client()
+        s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": REGION})
+        keys = [f"bench/{uuid4().hex}.jpg" for _ in range(n)]
+        for k in keys:
+            s3.put_object(Bucket=BUCKET, Key=k, Body=b"\xff\xd8" + b"x" * 2048, ContentType="image/jpeg")
+
+        legacy, cold, warm = [], [], []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            for k in keys:
+                _legacy_client(endpoint).generate_presigned_url(
+                    "get_object", Params={"Bucket": BUCKET, "Key": k}, ExpiresIn=3600
+                )
+            legacy.append((time.perf_counter() - t0) * 1000)
+
+            cache.delete_many([
+                aws_s3._url_cache_key(BUCKET, k, 3600, int(time.time() // aws_s3.URL_SLOT)) for k in keys
+            ])
+            aws_s3._local_urls.clear()
+            t0 = time.perf_counter()
+            aws_s3.presigned_urls(keys)
+            cold.append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            aws_s3.presigned_urls(keys)
+            warm.append((time.perf_counter() - t0) * 1000)
+
+        fetch_legacy, fetch_shared = [], []
+        for k in keys[:min(n, 20)] * 2:
+            t0 = time.perf_counter()
+            _legacy_client(endpoint).get_object(Bucket=BUCKET, Key=k)["Body"].read()
+            fetch_legacy.append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            aws_s3.get_s3_client().get_object(Bucket=BUCKET, Key=k)["Body"].read()
+            fetch_shared.append((time.perf_counter() - t0) * 1000)
+
+        self.stdout.write(f"{n} signed image URLs per page, {runs} runs")
+        self.stdout.write(f"{'':24} {'median':>10} {'p95':>10}")
+        for label, samples in (
+            ("client per image", legacy),
+            ("shared client, cold", cold),
+            ("shared client, cached", warm),
+        ):
+            self.stdout.write(f"{label:24} {statistics.median(samples):>8.2f}ms {_p95(samples):>8.2f}ms")
+        self.stdout.write("get_object per receipt")
+        for label, samples in (("client per fetch", fetch_legacy), ("shared client", fetch_shared)):
+            self.stdout.write(f"{label:24} {statistics.median(samples):>8.2f}ms {_p95(samples):>8.2f}ms")
@@ -0,0 +1,64 @@
+import random
+import statistics
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.utils.spatial_index import SpatialIndex, _in_viewport
+
+
+def _p95(samples):
+    return statistics.quantiles(samples, n=20)[18]
+
+
+class Command(BaseCommand):
+    help = "Benchmark map viewport lookups: spatial grid index vs. the old linear scan + join."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, nargs="+", default=[10_000, 100_000])
+        parser.add_argument("--queries", type=int, default=300)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts["seed"])
+        self.stdout.write(f"{'users':>8} {'grid p50':>10} {'grid p95':>10} {'scan p50':>10} {'scan p95':>10}")
+
+        for n in opts["users"]:
+            # synthetic users spread over the Salt Lake valley
+            users = [
+                {
+                    "id": i,
+                    "name": f"user{i}",
+                    "address": f"{i} Test St",
+                    "latitude": rnd.uniform(40.5, 40.9),
+                    "longitude": rnd.uniform(-112.1, -111.7),
+                }
+                for i in range(n)
+            ]
+            ordering_ids = [u["id"] for u in users if rnd.random() < 0.1]
+
+            index = SpatialIndex(cache=LocMemCache("bench-spatial", {"OPTIONS": {"MAX_ENTRIES": 100_000}}))
+            index.prime(users)
+
+            grid_ms, scan_ms = [], []
+            for _ in range(opts["queries"]):
+                min_lat = rnd.uniform(40.5, 40.8)
+                min_lng = rnd.uniform(-112.1, -111.85)
+                bbox = (min_lat, min_lng, min_lat + 0.08, min_lng + 0.12)
+
+                t0 = time.perf_counter()
+                in_view = index.users_in_viewport(*bbox, limit=500)
+                by_id = {u["id"]: u for u in in_view}
+                [by_id.get(oid) for oid in ordering_ids[:500]]
+                grid_ms.append((time.perf_counter() - t0) * 1000)
+
+                t0 = time.perf_counter()
+                in_view = [u for u in users if _in_viewport(u, *bbox)][:500]
+                [next((u for u in in_view if u["id"] == oid), None) for oid in ordering_ids[:500]]
+                scan_ms.append((time.perf_counter() - t0) * 1000)
+
+            self.stdout.write(
+                f"{n:>8} {statistics.median(grid_ms):>8.2f}ms {_p95(grid_ms):>8.2f}ms "
+                f"{statistics.median(scan_ms):>8.2f}ms {_p95(scan_ms):>8.2f}ms"
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.utils import catalog_search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the catalog search index (core_catalogterm) from every item, in id order."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        done = catalog_search.rebuild(batch_size=opts["batch_size"], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {done} items."))
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS `core_geocodecache` (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `address_key` char(40) NOT NULL,
+  `address` varchar(255) NOT NULL,
+  `latitude` decimal(9,6) DEFAULT NULL,
+  `longitude` decimal(9,6) DEFAULT NULL,
+  `expires_at` datetime(6) NOT NULL,
+  `updated_at` datetime(6) NOT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `core_geocodecache_address_key_uniq` (`address_key`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+DROP_TABLE = "DROP TABLE IF EXISTS `core_geocodecache`;"
+
+class Migration(migrations.Migration):
+    dependencies = [("core", "0003_merge_20251202_0002")]
+    operations = [migrations.RunSQL(CREATE_TABLE, reverse_sql=DROP_TABLE)]
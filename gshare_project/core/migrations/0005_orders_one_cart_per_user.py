@@ -0,0 +1,74 @@
+from django.db import migrations
+
+# Fold each user's extra carts into their newest one so the unique key can be built.
+KEEP_NEWEST_CART = """
+CREATE TEMPORARY TABLE `cart_keep` AS
+SELECT `user_id`, MAX(`id`) AS `keep_id`
+FROM `orders`
+WHERE `status` = 'cart'
+GROUP BY `user_id`
+HAVING COUNT(*) > 1;
+"""
+
+MOVE_LINES = """
+INSERT INTO `order_items` (`order_id`, `item_id`, `quantity`, `price`)
+SELECT k.`keep_id`, oi.`item_id`, oi.`quantity`, oi.`price`
+FROM `order_items` oi
+JOIN `orders` o ON o.`id` = oi.`order_id` AND o.`status` = 'cart'
+JOIN `cart_keep` k ON k.`user_id` = o.`user_id` AND o.`id` <> k.`keep_id`
+ON DUPLICATE KEY UPDATE `quantity` = `order_items`.`quantity` + VALUES(`quantity`);
+"""
+
+RETIRE_EXTRA_CARTS = """
+UPDATE `orders` o
+JOIN `cart_keep` k ON k.`user_id` = o.`user_id` AND o.`id` <> k.`keep_id`
+SET o.`status` = 'merged'
+WHERE o.`status` = 'cart';
+"""
+
+RETOTAL_KEPT_CARTS = """
+UPDATE `orders` o
+JOIN `cart_keep` k ON k.`keep_id` = o.`id`
+SET o.`total_amount` = (
+  SELECT COALESCE(SUM(oi.`quantity` * oi.`price`), 0) FROM `order_items` oi WHERE oi.`order_id` = o.`id`
+);
+"""
+
+DROP_KEEP = "DROP TEMPORARY TABLE IF EXISTS `cart_keep`;"
+
+# cart_user_id is user_id while the order is a cart and NULL otherwise; NULLs
+# don't collide, so the key allows one cart and any number of other orders.
+ADD_KEY = """
+ALTER TABLE `orders`
+  ADD COLUMN `cart_user_id` int GENERATED ALWAYS AS (CASE WHEN `status` = 'cart' THEN `user_id` END) STORED,
+  ADD UNIQUE KEY `orders_one_cart_per_user` (`cart_user_id`);
+"""
+
+DROP_KEY = """
+ALTER TABLE `orders`
+  DROP INDEX `orders_one_cart_per_user`,
+  DROP COLUMN `cart_user_id`;
+"""
+
+
+def _orders_exists(schema_editor):
+    # orders belongs to the MySQL schema (managed = False) and is absent from test databases
+    connection = schema_editor.connection
+    return connection.vendor == "mysql" and "orders" in connection.introspection.table_names()
+
+
+def forwards(apps, schema_editor):
+    if not _orders_exists(schema_editor):
+        return
+    for sql in (KEEP_NEWEST_CART, MOVE_LINES, RETIRE_EXTRA_CARTS, RETOTAL_KEPT_CARTS, DROP_KEEP, ADD_KEY):
+        schema_editor.execute(sql)
+
+
+def backwards(apps, schema_editor):
+    if _orders_exists(schema_editor):
+        schema_editor.execute(DROP_KEY)
+
+
+class Migration(migrations.Migration):
+    dependencies = [("core", "0004_create_core_geocodecache")]
+    operations = [migrations.RunPython(forwards, backwards)]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+# Postings are clustered on (term, item_id), so a term's item ids and weights
+# come back in one range scan without touching another index. Migration 0007
+# backfills it; `manage.py build_catalog_index` rebuilds it by hand.
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS `core_catalogterm` (
+  `term` varchar(64) COLLATE utf8mb4_bin NOT NULL,
+  `item_id` int NOT NULL,
+  `weight` smallint unsigned NOT NULL DEFAULT 1,
+  PRIMARY KEY (`term`, `item_id`),
+  KEY `core_catalogterm_item_id` (`item_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+DROP_TABLE = "DROP TABLE IF EXISTS `core_catalogterm`;"
+
+class Migration(migrations.Migration):
+    dependencies = [("core", "0005_orders_one_cart_per_user")]
+    operations = [migrations.RunSQL(CREATE_TABLE, reverse_sql=DROP_TABLE)]
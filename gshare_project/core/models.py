@@ -282,3 +282,37 @@ class ReceiptChatMessage(models.Model):
 
     def __str__(self):
         return f"{self.role}: {self.content[:40]}"
+
+
+class GeocodeCache(models.Model):
+    # sha1 of the normalized address (see core.utils.geo.normalize_address)
+    address_key = models.CharField(max_length=40, unique=True)
+    address = models.CharField(max_length=255)
+    # both NULL = the geocoder had no result for this address (negative entry)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    expires_at = models.DateTimeField()
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'core_geocodecache'
+        managed = False
+
+    def __str__(self):
+        return f"{self.address} -> ({self.latitude}, {self.longitude})"
+
+
+class CatalogTerm(models.Model):
+    # one posting of the catalog search index (see core.utils.catalog_search);
+    # like order_items the table has no id column, (term, item_id) is the key
+    term = models.CharField(max_length=64)
+    item = models.ForeignKey('Items', on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        db_table = 'core_catalogterm'
+        managed = False
+        unique_together = (('term', 'item'),)
+
+    def __str__(self):
+        return f"{self.term} -> {self.item_id} ({self.weight})"
@@ -0,0 +1,42 @@
+"""
+Keep what is derived from Items in step with it.
+
+Every save or delete that goes through the ORM (the Kroger views, the admin,
+a shell) drops the item's cart_engine cache entry, rewrites its search
+postings and, once the write commits, marks the catalog snapshot stale.
+QuerySet.update(), bulk_create() and raw SQL send no signals; code that
+writes items that way calls catalog_search / cart_engine / catalog_snapshot
+itself.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Items
+from core.utils import cart_engine, catalog_search, catalog_snapshot
+
+# the columns catalog_search.item_terms reads
+INDEXED_FIELDS = frozenset({"name", "description"})
+# the columns catalog_snapshot.build stores
+SNAPSHOT_FIELDS = frozenset({"name", "price", "store", "store_id"})
+
+
+def _snapshot_is_stale(using):
+    # after commit: a rebuild started any earlier could still read the old rows
+    transaction.on_commit(catalog_snapshot.mark_stale, using=using)
+
+
+@receiver(post_save, sender=Items, dispatch_uid="core.item_saved")
+def item_saved(sender, instance, using, update_fields=None, **kwargs):
+    cart_engine.forget_item(instance.id)
+    if update_fields is None or INDEXED_FIELDS & set(update_fields):
+        catalog_search.index_items([instance])
+    if update_fields is None or SNAPSHOT_FIELDS & set(update_fields):
+        _snapshot_is_stale(using)
+
+
+@receiver(post_delete, sender=Items, dispatch_uid="core.item_deleted")
+def item_deleted(sender, instance, using, **kwargs):
+    cart_engine.forget_item(instance.id)
+    catalog_search.unindex_items([instance.id])
+    _snapshot_is_stale(using)
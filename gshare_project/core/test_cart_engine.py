@@ -0,0 +1,124 @@
+import importlib
+import threading
+import unittest
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import CatalogTerm, Items, OrderItems, Orders, Stores, Users
+from core.testing import CoreTablesMixin, CoreTestCase
+from core.utils import cart_engine
+
+
+class CartEngineCacheTests(CoreTestCase):
+    core_models = [Users, Stores, Items, CatalogTerm]
+
+    def setUp(self):
+        cache.clear()
+        db = "gsharedb"
+        self.buyer = Users.objects.using(db).create(name="Buyer", email="buyer@example.com", address="1 Main", username="buyer")
+        self.store = Stores.objects.using(db).create(name="Store")
+        self.milk = Items.objects.using(db).create(store=self.store, name="Milk", price=Decimal("2.50"))
+
+    def test_lookups_are_cached_until_forgotten(self):
+        self.assertEqual(cart_engine.item_info(self.milk.id).price, Decimal("2.50"))
+        self.assertEqual(cart_engine.shopper_for("buyer@example.com").id, self.buyer.id)
+
+        Items.objects.using("gsharedb").filter(id=self.milk.id).update(price=Decimal("3.10"))
+        with self.assertNumQueries(0, using="gsharedb"):
+            self.assertEqual(cart_engine.item_info(self.milk.id).price, Decimal("2.50"))
+            cart_engine.shopper_for("buyer@example.com")
+
+        cart_engine.forget_item(self.milk.id)
+        self.assertEqual(cart_engine.item_info(self.milk.id).price, Decimal("3.10"))
+
+    def test_saving_an_item_forgets_it(self):
+        cart_engine.item_info(self.milk.id)
+        self.milk.price = Decimal("2.75")
+        self.milk.save(using="gsharedb")
+        self.assertEqual(cart_engine.item_info(self.milk.id).price, Decimal("2.75"))
+
+    def test_unknown_rows_are_none(self):
+        self.assertIsNone(cart_engine.shopper_for("ghost@example.com"))
+        self.assertIsNone(cart_engine.item_info(10**6))
+
+
+@unittest.skipUnless(connection.vendor == "mysql", "cart_engine writes MySQL upserts")
+class CartEngineMySQLTests(CoreTablesMixin, TransactionTestCase):
+    """add/remove against the one-cart key; TransactionTestCase so concurrent adds really race."""
+    core_models = [Users, Stores, Items, CatalogTerm, Orders, OrderItems]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with connections["gsharedb"].schema_editor() as editor:
+            editor.execute(importlib.import_module("core.migrations.0005_orders_one_cart_per_user").ADD_KEY)
+
+    def setUp(self):
+        cache.clear()
+        db = "gsharedb"
+        self.buyer = Users.objects.using(db).create(name="Buyer", email="buyer@example.com", address="1 Main", username="buyer")
+        self.store = Stores.objects.using(db).create(name="Store")
+        self.milk = Items.objects.using(db).create(store=self.store, name="Milk", price=Decimal("2.50"))
+        self.shopper = cart_engine.shopper_for("buyer@example.com")
+        self.item = cart_engine.item_info(self.milk.id)
+
+    def tearDown(self):
+        # unmanaged tables are not flushed between transactional tests
+        with connections["gsharedb"].cursor() as cur:
+            for model in reversed(self.core_models):
+                cur.execute(f"DELETE FROM {model._meta.db_table}")
+
+    def _cart(self):
+        return Orders.objects.using("gsharedb").get(user_id=self.buyer.id, status="cart")
+
+    def test_add_and_remove_keep_the_total(self):
+        with CaptureQueriesContext(connections["gsharedb"]) as ctx:
+            order_id = cart_engine.add(self.shopper, self.item, 2)
+        statements = [q["sql"] for q in ctx.captured_queries if not q["sql"].startswith(("SAVEPOINT", "RELEASE"))]
+        self.assertEqual(len(statements), 2)
+
+        cart_engine.add(self.shopper, self.item, 1)
+        cart = self._cart()
+        self.assertEqual((cart.id, cart.total_amount), (order_id, Decimal("7.50")))
+        self.assertEqual(OrderItems.objects.using("gsharedb").get(order_id=order_id).quantity, 3)
+
+        self.assertTrue(cart_engine.remove(self.shopper, self.milk.id, 1))
+        self.assertEqual(self._cart().total_amount, Decimal("5.00"))
+        self.assertTrue(cart_engine.remove(self.shopper, self.milk.id, 5))
+        self.assertEqual(self._cart().total_amount, Decimal("0.00"))
+        self.assertFalse(OrderItems.objects.using("gsharedb").filter(order_id=order_id).exists())
+        self.assertFalse(cart_engine.remove(self.shopper, self.milk.id, 1))
+
+    def test_stale_store_falls_back_to_the_items_store(self):
+        cart_engine.add(self.shopper, self.item, 1, store_id=10**6)
+        self.assertEqual(self._cart().store_id, self.store.id)
+
+    def test_concurrent_adds_share_one_cart(self):
+        n = 8
+        barrier = threading.Barrier(n)
+        errors = []
+
+        def click():
+            try:
+                barrier.wait()
+                cart_engine.add(self.shopper, self.item, 1)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=click) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Orders.objects.using("gsharedb").filter(user_id=self.buyer.id, status="cart").count(), 1)
+        cart = self._cart()
+        self.assertEqual(cart.total_amount, Decimal("2.50") * n)
+        self.assertEqual(OrderItems.objects.using("gsharedb").get(order_id=cart.id).quantity, n)
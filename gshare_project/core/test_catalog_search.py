@@ -0,0 +1,175 @@
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.db.models.signals import post_delete
+from django.test import override_settings
+
+from core.models import CatalogTerm, Items, Stores
+from core.testing import CoreTestCase
+from core.utils import catalog_search, catalog_snapshot
+
+
+class CatalogTestCase(CoreTestCase):
+    core_models = [Stores, Items, CatalogTerm]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.snapshot_path = os.path.join(tmp.name, "catalog.snapshot")
+        settings = override_settings(CATALOG_SNAPSHOT_PATH=self.snapshot_path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # tests build snapshots explicitly; a background thread couldn't see the test transaction
+        patcher = mock.patch.object(catalog_snapshot, "_rebuild_in_background")
+        self.rebuild = patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class CatalogSearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        db = "gsharedb"
+        self.store = Stores.objects.using(db).create(name="Store")
+        self.other = Stores.objects.using(db).create(name="Other")
+
+        def item(name, price, description=None, store=None):
+            return Items.objects.using(db).create(store=store or self.store, name=name, price=Decimal(price),
+                                                  description=description)
+
+        self.milk = item("Whole Milk", "3.50")
+        self.shake = item("Chocolate Milkshake", "4.00")
+        self.bar = item("Chocolate Bar", "1.50", description="made with milk")
+        self.eggs = item("Large Eggs", "5.00", store=self.other)
+        catalog_search.rebuild()
+
+    def _names(self, page):
+        return [i.name for i in page.items]
+
+    def test_tokenize(self):
+        self.assertEqual(catalog_search.tokenize("The Eggs, and 2% MILK!"), ["egg", "2", "milk"])
+
+    def test_ranks_exact_name_matches_first(self):
+        page = catalog_search.search("milk")
+        self.assertEqual(self._names(page), ["Whole Milk", "Chocolate Milkshake", "Chocolate Bar"])
+        self.assertEqual((page.count, page.more, page.next_cursor), (3, False, None))
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self._names(catalog_search.search("chocolate milk")), ["Chocolate Milkshake", "Chocolate Bar"])
+        self.assertEqual(self._names(catalog_search.search("egg")), ["Large Eggs"])
+        self.assertEqual(catalog_search.search("chocolate eggs").items, [])
+
+    def test_filters(self):
+        self.assertEqual(self._names(catalog_search.search("milk", max_price=2)), ["Chocolate Bar"])
+        self.assertEqual(self._names(catalog_search.search("", store="Other")), ["Large Eggs"])
+
+    def test_keyset_pages_cover_every_match_once(self):
+        for query in ("milk", ""):
+            seen, cursor = [], None
+            while True:
+                page = catalog_search.search(query, cursor=cursor, limit=2)
+                seen += self._names(page)
+                cursor = page.next_cursor
+                if not cursor:
+                    break
+            self.assertEqual(len(seen), len(set(seen)))
+            self.assertEqual(len(seen), page.count)
+
+    def test_count_is_capped(self):
+        with mock.patch.object(catalog_search, "COUNT_CAP", 2):
+            page = catalog_search.search("milk")
+        self.assertEqual((page.count, page.more), (2, True))
+
+    def test_pages_never_wait_for_a_snapshot(self):
+        self.assertEqual(self._names(catalog_search.search("milk"))[0], "Whole Milk")
+        self.rebuild.assert_called_with(self.snapshot_path)
+        self.assertFalse(os.path.exists(self.snapshot_path))
+
+        with open(self.snapshot_path, "wb") as f:
+            f.write(b"not a snapshot")
+        self.assertEqual(self._names(catalog_search.search("milk"))[0], "Whole Milk")
+
+    def test_stale_snapshot_is_not_used_for_pages(self):
+        catalog_snapshot.build()
+        Items.objects.using("gsharedb").filter(id=self.bar.id).update(price=Decimal("9.00"))
+        catalog_snapshot.mark_stale()
+        page = catalog_search.search("chocolate", min_price=5)
+        self.assertEqual([(i.name, i.price) for i in page.items], [("Chocolate Bar", Decimal("9.00"))])
+
+    def test_index_follows_item_changes(self):
+        # saves and deletes from anywhere (admin, shell) reach the index through core.signals
+        self.milk.name = "Oat Drink"
+        self.milk.save(using="gsharedb")
+        catalog_snapshot.build()
+        self.assertEqual(self._names(catalog_search.search("oat")), ["Oat Drink"])
+        self.assertNotIn("Oat Drink", self._names(catalog_search.search("milk")))
+
+        with self.assertNumQueries(1, using="gsharedb"):
+            self.milk.save(using="gsharedb", update_fields=["price"])  # no indexed column changed
+
+        # sent directly: a real delete cascades through order and recurring-cart tables not built here
+        post_delete.send(sender=Items, instance=self.milk, using="gsharedb")
+        self.assertEqual(catalog_search.search("oat").items, [])
+
+
+class CatalogSnapshotTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        db = "gsharedb"
+        self.store = Stores.objects.using(db).create(name="Store")
+        self.milk = Items.objects.using(db).create(store=self.store, name="Milk", price=Decimal("3.50"))
+        self.free = Items.objects.using(db).create(store=self.store, name="Milk", price=None)
+
+    def test_columns_round_trip(self):
+        catalog_snapshot.build()
+        snap = catalog_snapshot.current()
+        self.assertEqual(len(snap), 2)
+        self.assertEqual(list(snap), [("Milk", self.milk.id, "Store", Decimal("3.50")), ("Milk", self.free.id, "Store", None)])
+
+        item = snap.get(self.milk.id)
+        self.assertEqual((item.name, item.price, item.store.name), ("Milk", Decimal("3.50"), "Store"))
+        self.assertIsNone(snap.get(10**6))
+        # identical names are interned once
+        self.assertEqual(bytes(snap._names), b"Milk")
+
+    def test_missing_snapshot_is_built_in_the_background(self):
+        self.assertIsNone(catalog_snapshot.current())
+        self.rebuild.assert_called_once_with(self.snapshot_path)
+        self.assertFalse(os.path.exists(self.snapshot_path))
+
+    def test_stale_snapshot_is_served_until_rebuilt(self):
+        catalog_snapshot.build()
+        first = catalog_snapshot.current()
+        self.assertIs(catalog_snapshot.fresh(), first)
+        self.rebuild.assert_not_called()
+
+        Items.objects.using("gsharedb").filter(id=self.milk.id).update(price=Decimal("4.00"))
+        catalog_snapshot.mark_stale()
+        self.assertIs(catalog_snapshot.current(), first)
+        self.assertIsNone(catalog_snapshot.fresh())
+        self.rebuild.assert_called_with(self.snapshot_path)
+
+        catalog_snapshot.build()
+        second = catalog_snapshot.current()
+        self.assertEqual(second.version, first.version + 1)
+        self.assertEqual(second.get(self.milk.id).price, Decimal("4.00"))
+
+    def test_item_writes_mark_the_snapshot_stale(self):
+        catalog_snapshot.build()
+        with self.captureOnCommitCallbacks(using="gsharedb", execute=True):
+            self.milk.save(using="gsharedb", update_fields=["stock"])  # not in the snapshot
+        self.assertIsNotNone(catalog_snapshot.fresh())
+
+        with self.captureOnCommitCallbacks(using="gsharedb", execute=True):
+            self.milk.price = Decimal("4.00")
+            self.milk.save(using="gsharedb")
+        self.assertIsNone(catalog_snapshot.fresh())
+
+    def test_build_lock_without_fcntl(self):
+        with mock.patch.object(catalog_snapshot, "fcntl", None):
+            with catalog_snapshot._build_lock(self.snapshot_path) as first:
+                with catalog_snapshot._build_lock(self.snapshot_path) as second:
+                    self.assertEqual((first, second), (True, False))
+            with catalog_snapshot._build_lock(self.snapshot_path) as again:
+                self.assertTrue(again)
@@ -0,0 +1,87 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from core.models import GeocodeCache
+from core.testing import CoreTestCase
+from core.utils import geo
+
+
+class LRUTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = geo._LRU(2)
+        lru.put("a", (1.0, 1.0), 60)
+        lru.put("b", (2.0, 2.0), 60)
+        lru.get("a")
+        lru.put("c", (3.0, 3.0), 60)
+        self.assertEqual([lru.get(k) for k in "abc"], [(True, (1.0, 1.0)), (False, None), (True, (3.0, 3.0))])
+
+    def test_expired_entries_miss(self):
+        lru = geo._LRU(2)
+        lru.put("a", (1.0, 1.0), -1)
+        self.assertEqual(lru.get("a"), (False, None))
+
+
+@override_settings(FAKE_GEOLOC=False)
+class GeocodeCacheTests(CoreTestCase):
+    core_models = [GeocodeCache]
+
+    def setUp(self):
+        geo._lru.clear()
+        self.addCleanup(geo._lru.clear)
+        patcher = mock.patch.object(geo, "_remote_geocode", return_value=((40.76, -111.89), True))
+        self.remote = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _rows(self):
+        return list(GeocodeCache.objects.using("gsharedb").values_list("address", "latitude", "longitude"))
+
+    def test_memory_hit_skips_database_and_remote(self):
+        self.assertEqual(geo.geoLoc("123 North Main Street"), (40.76, -111.89))
+        self.assertEqual(len(self._rows()), 1)
+
+        with self.assertNumQueries(0, using="gsharedb"):
+            self.assertEqual(geo.geoLoc("123 n. main st"), (40.76, -111.89))
+        self.assertEqual(self.remote.call_count, 1)
+
+    def test_database_hit_skips_remote_and_warms_memory(self):
+        GeocodeCache.objects.using("gsharedb").create(
+            address_key=geo.address_key("9 Elm Ave"), address="9 Elm Ave",
+            latitude=Decimal("1.5"), longitude=Decimal("2.5"), expires_at=timezone.now() + timedelta(days=1),
+        )
+        self.assertEqual(geo.geoLoc("9 Elm Avenue"), (1.5, 2.5))
+        self.remote.assert_not_called()
+        with self.assertNumQueries(0, using="gsharedb"):
+            geo.geoLoc("9 Elm Avenue")
+
+    def test_failed_lookups_are_not_stored_as_zero(self):
+        self.remote.return_value = (None, False)  # timeout / quota: not the address's fault
+        self.assertEqual(geo.geoLoc("1 Flaky Rd"), (0.0, 0.0))
+        self.assertEqual(self._rows(), [])
+
+        geo._lru.clear()  # the short in-process back-off has passed
+        self.remote.return_value = ((3.0, 4.0), True)
+        self.assertEqual(geo.geoLoc("1 Flaky Rd"), (3.0, 4.0))
+
+        self.remote.return_value = (None, True)  # ZERO_RESULTS: remembered, but as NULL, not (0, 0)
+        geo.geoLoc("Nowhere")
+        self.assertIn(("Nowhere", None, None), self._rows())
+
+    def test_geocode_many_resolves_each_address_once(self):
+        geo.geoLoc("1 Warm St")  # memory
+        GeocodeCache.objects.using("gsharedb").create(
+            address_key=geo.address_key("2 Stored St"), address="2 Stored St",
+            latitude=Decimal("5"), longitude=Decimal("6"), expires_at=timezone.now() + timedelta(days=1),
+        )
+        self.remote.reset_mock()
+
+        out = geo.geocode_many(["1 Warm St", "2 Stored St", "3 New St", "3 new street", ""])
+        self.assertEqual(out, {
+            "1 Warm St": (40.76, -111.89), "2 Stored St": (5.0, 6.0),
+            "3 New St": (40.76, -111.89), "3 new street": (40.76, -111.89), "": (0.0, 0.0),
+        })
+        self.assertEqual(self.remote.call_count, 1)
+        self.assertEqual(len(self._rows()), 3)
@@ -0,0 +1,83 @@
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from core import views
+from core.models import Orders, Stores, Users
+from core.testing import CoreTestCase
+from core.utils import map_tiles
+
+# a small Salt Lake City viewport, and points inside and just outside it
+VIEWPORT = (40.755, -111.895, 40.765, -111.885)
+INSIDE = (40.76, -111.89)
+OUTSIDE = (40.77, -111.89)
+
+
+def _order(order_id, point, address="1 Main", store_address="9 Store"):
+    return {
+        "order_id": order_id, "address": address, "items": [], "subtotal": 0,
+        "user": "buyer", "user_id": 1, "user_lat": point[0], "user_lng": point[1],
+        "store_id": 1, "store_name": "Store", "store_address": store_address,
+        "store_lat": None, "store_lng": None, "status": "placed",
+        "driver_id": None, "driver_name": None,
+    }
+
+
+class TileVersionTests(CoreTestCase):
+    core_models = [Users, Stores, Orders]
+
+    def setUp(self):
+        cache.clear()
+        self.tile = map_tiles.tile_for_point(*INSIDE, map_tiles.TILE_ZOOMS[-1])
+        self.builds = []
+
+    def _payloads(self):
+        def build(tile):
+            self.builds.append(tile)
+            return len(self.builds)
+        return map_tiles.get_tile_payloads([self.tile], build)[self.tile]
+
+    def test_payload_is_cached_until_a_point_inside_moves(self):
+        self.assertEqual((self._payloads(), self._payloads()), (1, 1))
+
+        map_tiles.bump_tiles_for_points([(-33.86, 151.2)])  # elsewhere on the globe
+        self.assertEqual(self._payloads(), 1)
+
+        map_tiles.bump_tiles_for_points([INSIDE])
+        self.assertEqual(self._payloads(), 2)
+
+    def test_bump_for_orders_uses_the_owners_location(self):
+        db = "gsharedb"
+        buyer = Users.objects.using(db).create(
+            name="Buyer", username="buyer", address="1 Main",
+            latitude=Decimal(str(INSIDE[0])), longitude=Decimal(str(INSIDE[1])),
+        )
+        store = Stores.objects.using(db).create(name="Store")
+        order = Orders.objects.using(db).create(user=buyer, store=store, status="placed")
+
+        self._payloads()
+        map_tiles.bump_tiles_for_orders([order.id])
+        self.assertEqual(self._payloads(), 2)
+
+
+class ViewportClipTests(CoreTestCase):
+    core_models = [Users]
+
+    def setUp(self):
+        cache.clear()
+        Users.objects.using("gsharedb").create(name="Viewer", username="viewer", email="viewer@example.com", address="1 Main")
+        self.request = mock.Mock(user=User(email="viewer@example.com"))
+
+    def test_cached_tiles_are_clipped_to_the_viewport(self):
+        orders = [_order(1, INSIDE), _order(2, OUTSIDE)]
+        with mock.patch.object(views, "_build_map_orders", return_value=orders):
+            self.assertEqual([o["order_id"] for o in views._map_orders_for_viewport(*VIEWPORT)], [1])
+
+    def test_orders_without_an_address_still_mark_their_store(self):
+        orders = [_order(1, INSIDE, address=None, store_address="9 Store")]
+        with mock.patch.object(views, "_build_map_orders", return_value=orders):
+            response = views.maps_data(self.request, *map(str, VIEWPORT))
+        self.assertEqual(json.loads(response.content), [{"address": "9 Store", "is_store": True, "orders": []}])
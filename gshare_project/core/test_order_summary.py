@@ -0,0 +1,65 @@
+from decimal import Decimal
+
+from core.models import CatalogTerm, Deliveries, Items, OrderItems, Orders, Stores, Users
+from core.testing import CoreTestCase
+from core.utils import order_lines
+from core.utils.order_summary import OrderSummaryService
+
+
+class OrderSummaryServiceTests(CoreTestCase):
+    core_models = [Users, Stores, Items, CatalogTerm, Orders, OrderItems, Deliveries]
+
+    def setUp(self):
+        db = "gsharedb"
+        self.buyer = Users.objects.using(db).create(name="Buyer", address="1 Main", username="buyer")
+        self.driver = Users.objects.using(db).create(name="Driver", address="2 Main", username="driver")
+        self.store = Stores.objects.using(db).create(name="Store")
+        self.milk = Items.objects.using(db).create(store=self.store, name="Milk", price=Decimal("2.50"))
+        self.bread = Items.objects.using(db).create(store=self.store, name="Bread", price=Decimal("3.00"))
+
+    def _orders(self, n):
+        db = "gsharedb"
+        ids = []
+        for _ in range(n):
+            order = Orders.objects.using(db).create(user=self.buyer, store=self.store, status="placed")
+            OrderItems.objects.using(db).create(order=order, item=self.milk, quantity=2)
+            OrderItems.objects.using(db).create(order=order, item=self.bread, quantity=1)
+            Deliveries.objects.using(db).create(order=order, delivery_person=self.driver, status="old")
+            Deliveries.objects.using(db).create(order=order, delivery_person=self.driver, status="pending")
+            ids.append(order.id)
+        return ids
+
+    def test_totals(self):
+        empty = Orders.objects.using("gsharedb").create(user=self.buyer, store=self.store, status="cart")
+        order_id = self._orders(1)[0]
+        summaries = OrderSummaryService().summarize([order_id, empty.id], with_delivery=True)
+
+        s = summaries[order_id]
+        self.assertEqual(sorted((i["name"], i["total"]) for i in s["items"]),
+                         [("Bread", Decimal("3.00")), ("Milk", Decimal("5.00"))])
+        self.assertEqual(s["summary"], {"subtotal": Decimal("8.00"), "tax": Decimal("0.56"), "total": Decimal("8.56")})
+        self.assertEqual(s["delivery"].status, "pending")
+        self.assertEqual(s["delivery"].delivery_person.name, "Driver")
+
+        self.assertEqual(summaries[empty.id]["items"], [])
+        self.assertIsNone(summaries[empty.id]["delivery"])
+
+    def test_query_count_does_not_grow_with_orders(self):
+        service = OrderSummaryService()
+        few, many = self._orders(1), self._orders(25)
+        # one query for lines, one for latest deliveries (delivery_person joined in)
+        for ids in (few, many):
+            with self.assertNumQueries(2, using="gsharedb"):
+                summaries = service.summarize(ids, with_delivery=True)
+                for s in summaries.values():
+                    s["delivery"].delivery_person.name
+        with self.assertNumQueries(1, using="gsharedb"):
+            service.summarize(many)
+
+    def test_lines_for_orders_are_named_rows(self):
+        first, second = self._orders(2)
+        with self.assertNumQueries(1, using="gsharedb"):
+            lines = order_lines.get_lines_for_orders([first, second, 10**6])
+        self.assertEqual(lines[10**6], [])
+        milk = next(line for line in lines[first] if line.item_id == self.milk.id)
+        self.assertEqual((milk.order_id, milk.name, milk.quantity, milk.item_price), (first, "Milk", 2, Decimal("2.50")))
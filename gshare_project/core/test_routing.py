@@ -0,0 +1,63 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from core.utils import routing
+
+ORIGIN = "1 Main St"
+STOP = "2 State St"
+COORDS = {
+    ORIGIN: (40.760001, -111.890001),
+    "1 main street": (40.760004, -111.890004),  # same address, geocoded a hair apart
+    STOP: (40.700000, -111.800000),
+}
+
+
+def _geocode(addresses):
+    return {a: COORDS.get(a, (0.0, 0.0)) for a in addresses}
+
+
+def _matrix(origins, destinations, api_key):
+    return [[routing._element(1000, 120, "0.6 mi", "2 mins") for _ in destinations] for _ in origins]
+
+
+class DriveMatrixTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        for name, side_effect in (("geocode_many", _geocode), ("_fetch_matrix", _matrix)):
+            patcher = mock.patch.object(routing, name, side_effect=side_effect)
+            setattr(self, name.strip("_"), patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_addresses_are_geocoded_in_one_batch(self):
+        routing.drive_matrix([ORIGIN], [STOP, (40.0, -111.0)])
+        self.geocode_many.assert_called_once_with([ORIGIN, STOP])
+
+    def test_cached_pairs_skip_the_api(self):
+        first = routing.drive_matrix([ORIGIN], [STOP])
+        self.assertEqual(routing.drive_matrix([ORIGIN], [STOP]), first)
+        self.assertEqual(self.fetch_matrix.call_count, 1)
+
+    def test_keys_are_normalised(self):
+        routing.drive_matrix([ORIGIN], [STOP])
+        # a different spelling within ~11 m, and the stop given as coordinates, share the entry
+        routing.drive_matrix(["1 main street"], [COORDS[STOP]])
+        self.assertEqual(self.fetch_matrix.call_count, 1)
+
+        # unresolvable addresses fall back to their whitespace/case-folded text
+        self.assertEqual(routing._place_key("  Nowhere   Rd ", None), "nowhere rd")
+
+    def test_failed_request_falls_back_to_an_uncached_estimate(self):
+        self.fetch_matrix.side_effect = RuntimeError("timeout")
+        el = routing.drive_time(ORIGIN, STOP)
+        self.assertTrue(el["estimated"])
+        expected = routing.haversine_m(COORDS[ORIGIN], COORDS[STOP]) * routing.DETOUR_FACTOR
+        self.assertEqual(el["distance_value"], int(expected))
+
+        self.fetch_matrix.side_effect = _matrix
+        self.assertFalse(routing.drive_time(ORIGIN, STOP)["estimated"])
+
+    def test_unresolvable_places_without_a_route_are_none(self):
+        self.fetch_matrix.side_effect = RuntimeError("timeout")
+        self.assertIsNone(routing.drive_time("Nowhere", STOP))
@@ -0,0 +1,79 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from core import views
+from core.models import Users
+from core.testing import CoreTestCase
+from core.utils.spatial_index import SpatialIndex, cell_of, cells_for_viewport
+
+
+class GridTests(SimpleTestCase):
+    def test_cell_of_floors_toward_negative(self):
+        self.assertEqual(cell_of(40.76, -111.89), (815, -2238))
+        self.assertEqual(cell_of(0.0, -0.01), (0, -1))
+
+    def test_viewport_cells(self):
+        self.assertEqual(cells_for_viewport(40.71, -111.92, 40.76, -111.88), [
+            (814, -2239), (814, -2238), (815, -2239), (815, -2238),
+        ])
+        # across the antimeridian: the columns at both edges, nothing in between
+        cols = {c for _, c in cells_for_viewport(0.01, 179.96, 0.02, -179.96)}
+        self.assertEqual(cols, {3599, 3600, -3600})
+
+    def test_too_large_or_non_finite_viewports_are_not_indexed(self):
+        self.assertIsNone(cells_for_viewport(40, -112, 41, -111))
+        self.assertIsNone(cells_for_viewport(float("nan"), 0, 1, 1))
+        self.assertIsNone(cells_for_viewport(0, 0, float("inf"), 1))
+
+
+class SpatialIndexTests(CoreTestCase):
+    core_models = [Users]
+
+    def setUp(self):
+        self.index = SpatialIndex(cache=LocMemCache("spatial-index-tests", {}))
+        self.alice = self._user("alice", "40.7600", "-111.8900")
+        self.bob = self._user("bob", "40.7000", "-111.8000")
+
+    def _user(self, name, lat, lng):
+        return Users.objects.using("gsharedb").create(
+            name=name, username=name, address="1 Main", latitude=Decimal(lat), longitude=Decimal(lng),
+        )
+
+    def _ids(self, *bbox):
+        return {r["id"] for r in self.index.users_in_viewport(*bbox)}
+
+    def test_cells_are_loaded_once_then_served_from_cache(self):
+        with self.assertNumQueries(1, using="gsharedb"):
+            self.assertEqual(self._ids(40.74, -111.91, 40.78, -111.87), {self.alice.id})
+        with self.assertNumQueries(0, using="gsharedb"):
+            self.assertEqual(self._ids(40.75, -111.90, 40.77, -111.88), {self.alice.id})
+
+    def test_profile_move_invalidates_old_and_new_cells(self):
+        bbox = (40.74, -111.91, 40.78, -111.87)
+        self.assertEqual(self._ids(*bbox), {self.alice.id})
+
+        old_point = (self.bob.latitude, self.bob.longitude)
+        Users.objects.using("gsharedb").filter(id=self.bob.id).update(latitude=Decimal("40.7610"), longitude=Decimal("-111.8910"))
+        self.assertEqual(self._ids(*bbox), {self.alice.id})  # still the cached cell
+        self.index.invalidate(old_point, (Decimal("40.7610"), Decimal("-111.8910")))
+        self.assertEqual(self._ids(*bbox), {self.alice.id, self.bob.id})
+
+    def test_large_viewports_fall_back_to_a_range_scan(self):
+        self.assertIsNone(self.index.users_in_viewport(40, -112, 41, -111))
+        with mock.patch.object(views, "user_index", self.index):
+            rows = views._users_in_viewport(40, -112, 41, -111)
+        self.assertEqual({r["id"] for r in rows}, {self.alice.id, self.bob.id})
+
+
+class ViewportBoundsTests(SimpleTestCase):
+    def test_non_finite_bounds_are_rejected(self):
+        request = mock.Mock(user=User(email="x@example.com"))
+        for bounds in (("nan", "0", "1", "1"), ("0", "-inf", "1", "1"), ("0", "0", "abc", "1")):
+            with self.subTest(bounds=bounds):
+                self.assertEqual(views.maps_data(request, *bounds).status_code, 400)
+                self.assertEqual(views.people_data(request, *bounds).status_code, 400)
+                self.assertEqual(views.live_data(request, *bounds).status_code, 400)
@@ -0,0 +1,32 @@
+"""
+Test bases for code that reads core's MySQL-owned tables.
+
+Those models are managed = False, so the test runner never creates them; a
+test class lists the ones it needs in core_models and gets them built on
+gsharedb for the class and dropped afterwards.
+"""
+from django.db import connections
+from django.test import TestCase
+
+
+class CoreTablesMixin:
+    databases = {"default", "gsharedb"}
+    core_models = []
+
+    @classmethod
+    def setUpClass(cls):
+        with connections["gsharedb"].schema_editor() as editor:
+            for model in cls.core_models:
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connections["gsharedb"].schema_editor() as editor:
+            for model in reversed(cls.core_models):
+                editor.delete_model(model)
+
+
+class CoreTestCase(CoreTablesMixin, TestCase):
+    pass
@@ -1,27 +1,68 @@
 
 import boto3
 import uuid
+import hashlib
 import mimetypes
+import threading
+import time
+from collections import OrderedDict
 from botocore.config import Config
 from django.conf import settings
+from django.core.cache import cache
 import uuid
 
+# Signed GET URLs are shared per (key, expiry slot): every caller within the same
+# URL_SLOT seconds gets the same URL, still valid for at least `expires` seconds.
+URL_SLOT = 15 * 60
+
+# One client per process: boto3 clients are thread-safe, and building one costs
+# milliseconds (endpoint/credential resolution) plus its own connection pool.
+_client = None
+_client_lock = threading.Lock()
+
+# Signed URLs kept in this process in front of the shared cache
+LOCAL_URL_CACHE_SIZE = 4096
+
+
 def get_s3_client():
-    region = settings.AWS_S3_REGION_NAME
-    key    = settings.AWS_ACCESS_KEY_ID
-    secret = settings.AWS_SECRET_ACCESS_KEY
-
-    if not key or not secret:
-        raise RuntimeError("AWS keys missing in settings.py")
-
-    return boto3.client(
-        "s3",
-        region_name=region,
-        aws_access_key_id=key,
-        aws_secret_access_key=secret,
-        endpoint_url=f"https://s3.{region}.amazonaws.com",
-        config=Config(signature_version="s3v4", s3={"addressing_style": "virtual"}),
-    )
+    global _client
+    if _client is not None:
+        return _client
+
+    with _client_lock:
+        if _client is None:
+            region = settings.AWS_S3_REGION_NAME
+            key    = settings.AWS_ACCESS_KEY_ID
+            secret = settings.AWS_SECRET_ACCESS_KEY
+
+            if not key or not secret:
+                raise RuntimeError("AWS keys missing in settings.py")
+
+            _client = boto3.client(
+                "s3",
+                region_name=region,
+                aws_access_key_id=key,
+                aws_secret_access_key=secret,
+                endpoint_url=getattr(settings, "AWS_S3_ENDPOINT_URL", None) or f"https://s3.{region}.amazonaws.com",
+                config=Config(
+                    signature_version="s3v4",
+                    s3={"addressing_style": "virtual"},
+                    max_pool_connections=getattr(settings, "AWS_S3_MAX_POOL_CONNECTIONS", 50),
+                    tcp_keepalive=True,
+                    connect_timeout=3,
+                    read_timeout=20,
+                    retries={"max_attempts": 3, "mode": "standard"},
+                ),
+            )
+    return _client
+
+
+def reset_s3_client():
+    """Drop the shared client (e.g. after changing credentials or endpoint)."""
+    global _client
+    with _client_lock:
+        _client = None
+    _local_urls.clear()
 
 def get_bucket_and_region():
     bucket = getattr(settings, "AWS_STORAGE_BUCKET_NAME", None) or getattr(settings, "AWS_S3_BUCKET_NAME", None)
@@ -40,11 +81,109 @@ def upload_file_like(file_obj, prefix="receipts/"):
     s3.upload_fileobj(file_obj, bucket, key, ExtraArgs={"ContentType": file_obj.content_type})
     return bucket, key
 
-def presigned_url(key, expires=3600):
-    s3 = get_s3_client()
+def _url_cache_key(bucket, key, expires, slot):
+    digest = hashlib.sha1(f"{bucket}/{key}".encode()).hexdigest()
+    return f"s3url:{expires}:{slot}:{digest}"
+
+
+class _LocalURLs:
+    """Bounded LRU of cache key -> (url, slot end), so hot images skip the cache round trip."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_many(self, cache_keys, now):
+        found = {}
+        with self.lock:
+            for ck in cache_keys:
+                hit = self.data.get(ck)
+                if hit is None:
+                    continue
+                url, valid_until = hit
+                if valid_until <= now:
+                    # slot is over; the next slot's key signs a fresh URL
+                    del self.data[ck]
+                    continue
+                self.data.move_to_end(ck)
+                found[ck] = url
+        return found
+
+    def set_many(self, urls, valid_until):
+        with self.lock:
+            for ck, url in urls.items():
+                self.data[ck] = (url, valid_until)
+                self.data.move_to_end(ck)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+_local_urls = _LocalURLs(LOCAL_URL_CACHE_SIZE)
+
+
+def presigned_urls(keys, expires=3600, bucket=None):
+    """
+    Return {key: signed GET url} for the given object keys, signing only the
+    ones not already cached for the current expiry slot.
+    """
+    keys = [k for k in dict.fromkeys(keys) if k]
+    if not keys:
+        return {}
+
+    if bucket is None:
+        bucket, _ = get_bucket_and_region()
+    now = time.time()
+    slot = int(now // URL_SLOT)
+    slot_end = (slot + 1) * URL_SLOT
+    remaining = int(slot_end - now) + 1
+
+    cache_keys = {_url_cache_key(bucket, k, expires, slot): k for k in keys}
+    found = _local_urls.get_many(cache_keys, now)
+    wanted = [ck for ck in cache_keys if ck not in found]
+    if wanted:
+        shared = cache.get_many(wanted)
+        _local_urls.set_many(shared, slot_end)
+        found.update(shared)
+    urls = {cache_keys[ck]: url for ck, url in found.items()}
+
+    missing = {ck: k for ck, k in cache_keys.items() if ck not in found}
+    if missing:
+        s3 = get_s3_client()
+        signed = {}
+        for ck, k in missing.items():
+            # valid until the slot ends plus `expires`, so a cached copy never has less left
+            urls[k] = signed[ck] = s3.generate_presigned_url(
+                "get_object", Params={"Bucket": bucket, "Key": k}, ExpiresIn=expires + remaining
+            )
+        cache.set_many(signed, remaining)
+        _local_urls.set_many(signed, slot_end)
+    return urls
+
+
+def presigned_url(key, expires=3600, bucket=None):
+    return presigned_urls([key], expires, bucket).get(key)
+
+def presigned_post(key, content_type, max_bytes, expires=300):
+    """
+    Let a browser upload one object straight to S3: returns {"url", "fields"}
+    for a multipart POST that only accepts this key, this Content-Type and at
+    most max_bytes.
+    """
     bucket, _ = get_bucket_and_region()
-    return s3.generate_presigned_url(
-        "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=expires
+    return get_s3_client().generate_presigned_post(
+        Bucket=bucket,
+        Key=key,
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, max_bytes],
+        ],
+        ExpiresIn=expires,
     )
 
 # upload image for chat functionality
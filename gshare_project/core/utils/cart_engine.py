@@ -0,0 +1,151 @@
+"""
+Cart mutations in one transaction of two statements (three for a partial removal).
+
+orders.cart_user_id (core migration 0005) is a stored generated column that
+equals user_id while status = 'cart' and is NULL otherwise. Its unique index
+means a user has at most one cart, so the cart is found or created by a single
+INSERT ... ON DUPLICATE KEY UPDATE and concurrent clicks land on the same row.
+orders.total_amount moves by the line's delta in that same statement instead
+of being re-summed from order_items.
+
+The shopper (users row) and item prices are cached, so a click does no reads
+before its writes.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core.models import Items, Users
+
+DB = "gsharedb"
+CACHE_TTL = 300
+
+Shopper = namedtuple("Shopper", "id address latitude longitude")
+ItemInfo = namedtuple("ItemInfo", "id name price store_id")
+
+
+def _shopper_key(email) -> str:
+    return f"cart:shopper:{email}"
+
+
+def _item_key(item_id) -> str:
+    return f"cart:item:{item_id}"
+
+
+def shopper_for(email):
+    """The users row behind an account email, or None."""
+    key = _shopper_key(email)
+    row = cache.get(key)
+    if row is None:
+        row = (
+            Users.objects.using(DB).filter(email=email)
+            .values_list("id", "address", "latitude", "longitude").first()
+        )
+        if row is None:
+            return None
+        cache.set(key, tuple(row), CACHE_TTL)
+    return Shopper(*row)
+
+
+def forget_shopper(email) -> None:
+    """Call after a user's address or email changes."""
+    cache.delete(_shopper_key(email))
+
+
+def item_info(item_id):
+    """Name, current price and store of an item, or None."""
+    key = _item_key(item_id)
+    row = cache.get(key)
+    if row is None:
+        row = Items.objects.using(DB).filter(id=item_id).values_list("id", "name", "price", "store_id").first()
+        if row is None:
+            return None
+        cache.set(key, tuple(row), CACHE_TTL)
+    return ItemInfo(*row)
+
+
+def forget_item(item_id) -> None:
+    """Call after an item's price changes."""
+    cache.delete(_item_key(item_id))
+
+
+def add(shopper, item, quantity, store_id=None) -> int:
+    """
+    Add quantity of item to the shopper's cart, creating the cart if needed.
+    The cart moves to store_id, or to the item's store when store_id is unset
+    or no longer exists (a stale session value). Returns the cart's order id.
+
+    A line already in the cart keeps the price it was added at; the total moves
+    by the item's current price, so the two only disagree if the price changed
+    in between (checkout charges the line prices).
+    """
+    delta = quantity * (item.price or 0)
+    with transaction.atomic(using=DB), connections[DB].cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO orders (user_id, store_id, status, order_date, total_amount, delivery_address)
+            VALUES (%s, COALESCE((SELECT id FROM stores WHERE id = %s), %s), 'cart', %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                id = LAST_INSERT_ID(id),
+                store_id = VALUES(store_id),
+                order_date = VALUES(order_date),
+                total_amount = COALESCE(total_amount, 0) + VALUES(total_amount)
+            """,
+            [shopper.id, store_id, item.store_id, timezone.now(), delta, shopper.address],
+        )
+        order_id = cur.lastrowid
+        cur.execute(
+            """
+            INSERT INTO order_items (order_id, item_id, quantity, price)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                quantity = quantity + VALUES(quantity)
+            """,
+            [order_id, item.id, quantity, item.price or 0],
+        )
+    return order_id
+
+
+def remove(shopper, item_id, quantity) -> bool:
+    """
+    Take quantity of an item off the shopper's cart, deleting the line when
+    nothing is left. False if the item isn't in the cart.
+
+    Removing a whole line (what the cart page does) is two statements; a
+    partial removal needs a third to decrement the line.
+    """
+    with transaction.atomic(using=DB), connections[DB].cursor() as cur:
+        # the total drops by what is actually removed, at the line's own price
+        cur.execute(
+            """
+            UPDATE orders o
+            JOIN order_items oi ON oi.order_id = o.id AND oi.item_id = %s
+            SET o.total_amount = GREATEST(COALESCE(o.total_amount, 0) - LEAST(oi.quantity, %s) * oi.price, 0)
+            WHERE o.cart_user_id = %s
+            """,
+            [item_id, quantity, shopper.id],
+        )
+        if cur.rowcount == 0:
+            return False
+
+        cur.execute(
+            """
+            DELETE oi FROM order_items oi
+            JOIN orders o ON o.id = oi.order_id
+            WHERE o.cart_user_id = %s AND oi.item_id = %s AND oi.quantity <= %s
+            """,
+            [shopper.id, item_id, quantity],
+        )
+        if cur.rowcount == 0:
+            cur.execute(
+                """
+                UPDATE order_items oi
+                JOIN orders o ON o.id = oi.order_id
+                SET oi.quantity = oi.quantity - %s
+                WHERE o.cart_user_id = %s AND oi.item_id = %s
+                """,
+                [quantity, shopper.id, item_id],
+            )
+    return True
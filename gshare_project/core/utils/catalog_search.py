@@ -0,0 +1,238 @@
+"""
+Catalog search for the cart browse view.
+
+core_catalogterm is an inverted index over item names and descriptions: one
+(term, item_id, weight) posting per distinct token of an item. A search looks
+up each query token's postings by index range, scores items by the summed
+weights and pages with a (score, item_id) keyset cursor, so no page costs an
+OFFSET scan and the total is only counted up to COUNT_CAP.
+
+Postings are rewritten whenever items are saved (index_items) and dropped
+with them (unindex_items); migration 0007 backfills the table and
+build_catalog_index rebuilds it on demand.
+"""
+import re
+from collections import namedtuple
+from functools import reduce
+from operator import add, or_
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Value, When
+
+from core.models import CatalogTerm, Items
+from core.utils import catalog_snapshot
+
+DB = "gsharedb"
+PAGE_SIZE = 15
+# Results are counted up to this many; past it the view shows "1000+".
+COUNT_CAP = 1000
+MAX_TERM = 64
+MAX_QUERY_TERMS = 8
+
+# A term in the name outweighs one in the description; an exact term match
+# outweighs a prefix match ("milk" vs. "milkshake" for the query "milk").
+NAME_WEIGHT = 4
+DESCRIPTION_WEIGHT = 1
+EXACT_BOOST = 2
+
+# Upper bound for a prefix range: term >= "milk" AND term < "milk" + _TOP. Terms
+# are compared by code point (utf8mb4_bin), so the range stays on the index where
+# LIKE 'milk%' with an ESCAPE clause may not.
+_TOP = "\U0010ffff"
+
+STOPWORDS = frozenset({"a", "an", "and", "the", "of", "with", "for", "in", "on", "or", "to", "by"})
+_WORD = re.compile(r"[^\W_]+")
+
+CatalogPage = namedtuple("CatalogPage", "items next_cursor count more")
+
+
+def _stem(word: str) -> str:
+    """'eggs' -> 'egg'; applied to items and queries alike, so it only has to be consistent."""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text) -> list:
+    """Lowercased, stemmed word tokens of text, stopwords dropped, in order."""
+    return [
+        _stem(w)[:MAX_TERM]
+        for w in _WORD.findall((text or "").casefold())
+        if w not in STOPWORDS
+    ]
+
+
+def item_terms(name, description=None) -> dict:
+    """{term: weight} postings for one item."""
+    terms = {}
+    for term in set(tokenize(name)):
+        terms[term] = NAME_WEIGHT
+    for term in set(tokenize(description)):
+        terms[term] = terms.get(term, 0) + DESCRIPTION_WEIGHT
+    return terms
+
+
+def index_items(items, batch_size=1000) -> int:
+    """
+    Replace the postings of the given Items (or any objects with id, name and
+    description). Returns the number of postings written.
+    """
+    items = list(items)
+    if not items:
+        return 0
+    rows = [
+        CatalogTerm(term=term, item_id=item.id, weight=weight)
+        for item in items
+        for term, weight in item_terms(item.name, item.description).items()
+    ]
+    with transaction.atomic(using=DB):
+        CatalogTerm.objects.using(DB).filter(item_id__in=[item.id for item in items]).delete()
+        CatalogTerm.objects.using(DB).bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def unindex_items(item_ids, batch_size=1000) -> None:
+    """Drop the postings of deleted items."""
+    item_ids = list(item_ids)
+    for start in range(0, len(item_ids), batch_size):
+        CatalogTerm.objects.using(DB).filter(item_id__in=item_ids[start:start + batch_size]).delete()
+
+
+def rebuild(batch_size=5000, stdout=None, items=None) -> int:
+    """
+    Reindex the whole catalog (or the given Items queryset) in id order,
+    batch_size items at a time. Returns items indexed.
+    """
+    items = Items.objects.using(DB) if items is None else items
+    done, last_id = 0, 0
+    while True:
+        batch = list(
+            items.filter(id__gt=last_id).order_by("id")
+            .only("id", "name", "description")[:batch_size]
+        )
+        if not batch:
+            return done
+        index_items(batch)
+        done += len(batch)
+        last_id = batch[-1].id
+        if stdout:
+            stdout.write(f"indexed {done} items")
+
+
+def encode_cursor(score, item_id, seen) -> str:
+    """seen is the capped match count from the first page, carried so later pages needn't recount."""
+    return f"{score}-{item_id}-{seen}"
+
+
+def decode_cursor(cursor):
+    """(score, item_id, seen) from a cursor string, or None for a missing or malformed one."""
+    try:
+        score, item_id, seen = (cursor or "").split("-")
+        return int(score), int(item_id), int(seen)
+    except ValueError:
+        return None
+
+
+def _filtered(qs, prefix, store, min_price, max_price):
+    if store:
+        qs = qs.filter(**{f"{prefix}store__name": store})
+    if min_price is not None:
+        qs = qs.filter(**{f"{prefix}price__gte": min_price})
+    if max_price is not None:
+        qs = qs.filter(**{f"{prefix}price__lte": max_price})
+    return qs
+
+
+def _prefixed(term) -> Q:
+    return Q(term__gte=term, term__lt=term + _TOP)
+
+
+def _ranked(terms, store, min_price, max_price):
+    """item_id, score rows matching every term (exactly or as a prefix), best first."""
+    postings = _filtered(
+        CatalogTerm.objects.using(DB).filter(reduce(or_, map(_prefixed, terms))),
+        "item__", store, min_price, max_price,
+    )
+    if len(terms) > 1:
+        # only items holding the (probably) rarest term can match them all
+        rarest = max(terms, key=len)
+        postings = postings.filter(item_id__in=CatalogTerm.objects.using(DB).filter(_prefixed(rarest)).values("item_id"))
+    per_term = {
+        f"s{i}": Max(Case(
+            When(term=t, then=F("weight") * EXACT_BOOST),
+            When(_prefixed(t), then=F("weight")),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+        for i, t in enumerate(terms)
+    }
+    return (
+        postings.values("item_id")
+        .annotate(**per_term)
+        .filter(**{f"{name}__gt": 0 for name in per_term})
+        .annotate(score=reduce(add, (F(name) for name in per_term)))
+        .order_by("-score", "item_id")
+    )
+
+
+def _hydrate(item_ids) -> dict:
+    """
+    {item_id: item} for a page, read from the shared catalog snapshot while
+    it is up to date (prices must agree with the price filter, which ran on
+    the database); otherwise, and for items newer than it, from the database.
+    """
+    try:
+        snap = catalog_snapshot.fresh()
+    except Exception as e:
+        print(f"Catalog snapshot unavailable, reading items from the database: {e}")
+        snap = None
+    found = {}
+    if snap is not None:
+        for item_id in item_ids:
+            item = snap.get(item_id)
+            if item is not None:
+                found[item_id] = item
+    missing = [item_id for item_id in item_ids if item_id not in found]
+    if missing:
+        found.update(Items.objects.using(DB).select_related("store").in_bulk(missing))
+    return found
+
+
+def search(query="", store=None, min_price=None, max_price=None, cursor=None, limit=PAGE_SIZE) -> CatalogPage:
+    """
+    One page of items (id, name, price, store.name) matching query and filters. With search
+    terms the page is ranked by relevance; without, it is the catalog in id
+    order. Pass the returned next_cursor to get the following page.
+
+    The first page reads up to COUNT_CAP + 1 ranked rows, which gives the page
+    and the result count in one query; later pages read limit + 1 rows past
+    the cursor.
+    """
+    after = decode_cursor(cursor)
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+    if terms:
+        matches = _ranked(terms, store, min_price, max_price)
+        if after:
+            score, item_id, _ = after
+            matches = matches.filter(Q(score__lt=score) | Q(score=score, item_id__gt=item_id))
+        rows = [(r["item_id"], r["score"]) for r in matches[:limit + 1 if after else COUNT_CAP + 1]]
+    else:
+        matches = _filtered(Items.objects.using(DB), "", store, min_price, max_price).order_by("id")
+        if after:
+            matches = matches.filter(id__gt=after[1])
+        rows = [(item_id, 0) for item_id in matches.values_list("id", flat=True)[:limit + 1 if after else COUNT_CAP + 1]]
+
+    seen = after[2] if after else len(rows)
+    next_cursor = None
+    if len(rows) > limit:
+        item_id, score = rows[limit - 1]
+        next_cursor = encode_cursor(score, item_id, seen)
+    rows = rows[:limit]
+    found = _hydrate([item_id for item_id, _ in rows])
+    return CatalogPage(
+        items=[found[item_id] for item_id, _ in rows if item_id in found],
+        next_cursor=next_cursor,
+        count=min(seen, COUNT_CAP),
+        more=seen > COUNT_CAP,
+    )
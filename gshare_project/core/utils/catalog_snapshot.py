@@ -0,0 +1,315 @@
+"""
+Read-only, memory-mapped snapshot of the item catalog shared by every worker.
+
+The snapshot is one file of fixed-width columns, so workers mmap it and read
+ids, prices and store ids in place instead of each loading the items + stores
+join into its own Python objects:
+
+    header | ids int32[n] | price_cents int64[n] | store_ids int32[n] | name_refs int32[n]
+           | name_offsets uint32[names + 1] | names utf-8
+           | store_table int32[stores] | store_name_offsets uint32[stores + 1] | store_names utf-8
+
+Rows are sorted by item id; identical item names are stored once (name_refs
+point into the interned names). A price of -1 cent means NULL.
+
+Item saves and deletes call mark_stale() through core.signals (bulk writers
+call it themselves). The next reader in any process starts a rebuild in the
+background (one process at a time, under a file lock) and keeps serving the
+old mapping; the new file is swapped in atomically and every process remaps
+when it sees the new file. Requests never build a snapshot themselves.
+"""
+import bisect
+import contextlib
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+try:
+    import fcntl
+except ImportError:  # Windows: rebuilds are only serialized within this process
+    fcntl = None
+
+from django.conf import settings
+from django.db import connections
+
+from core.models import Items, Stores
+
+DB = "gsharedb"
+MAGIC = b"GSCAT\x00\x00\x01"
+# magic, version, rows, started_ns, names, names_bytes, stores, store_names_bytes
+_HEADER = struct.Struct("<8sQQqQQQQ")
+NO_PRICE = -1
+
+StoreRef = namedtuple("StoreRef", "id name")
+SnapshotItem = namedtuple("SnapshotItem", "id name price store_id store")
+
+
+def _identity(path, st):
+    # inode numbers get reused once an old snapshot is unlinked; the mtime tells them apart
+    return path, st.st_ino, st.st_mtime_ns
+
+
+def snapshot_path() -> str:
+    return getattr(settings, "CATALOG_SNAPSHOT_PATH", None) or os.path.join(settings.BASE_DIR, "var", "catalog.snapshot")
+
+
+def _pad(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _price(cents):
+    return None if cents == NO_PRICE else Decimal(cents).scaleb(-2)
+
+
+def _strings(values):
+    """(offsets, blob) for a list of str: value i is blob[offsets[i]:offsets[i + 1]]."""
+    offsets, blob = [0], bytearray()
+    for v in values:
+        blob += (v or "").encode()
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def _columns(version, started_ns, rows, stores):
+    """Serialize (id, name, price, store_id) rows and (store_id, name) stores into snapshot bytes."""
+    rows = sorted(rows)
+    interned = {}
+    name_refs = [interned.setdefault(name or "", len(interned)) for _, name, _, _ in rows]
+    name_offsets, names = _strings(list(interned))
+    stores = sorted(stores)
+    store_offsets, store_names = _strings([name for _, name in stores])
+
+    sections = [
+        struct.pack(f"<{len(rows)}i", *(r[0] for r in rows)),
+        struct.pack(f"<{len(rows)}q", *(NO_PRICE if r[2] is None else int(r[2] * 100) for r in rows)),
+        struct.pack(f"<{len(rows)}i", *(r[3] or 0 for r in rows)),
+        struct.pack(f"<{len(rows)}i", *name_refs),
+        struct.pack(f"<{len(name_offsets)}I", *name_offsets),
+        names,
+        struct.pack(f"<{len(stores)}i", *(s[0] for s in stores)),
+        struct.pack(f"<{len(store_offsets)}I", *store_offsets),
+        store_names,
+    ]
+    header = _HEADER.pack(MAGIC, version, len(rows), started_ns, len(interned), len(names), len(stores), len(store_names))
+    out = bytearray(header)
+    for section in sections:
+        out += section
+        out += b"\x00" * (_pad(len(out)) - len(out))
+    return bytes(out)
+
+
+class CatalogSnapshot:
+    """
+    One mapped snapshot file. Columns are memoryviews over the mapping, so
+    lookups and scans read the shared pages without copying them.
+    Iterating yields (name, id, store_name, price) rows in id order.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.identity = _identity(path, os.fstat(f.fileno()))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._map)
+        if len(buf) < _HEADER.size or bytes(buf[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        _, self.version, n, self.started_ns, n_names, names_len, n_stores, store_names_len = _HEADER.unpack_from(buf)
+
+        pos = _HEADER.size
+
+        def take(nbytes, fmt=None):
+            nonlocal pos
+            view = buf[pos:pos + nbytes]
+            pos = _pad(pos + nbytes)
+            return view.cast(fmt) if fmt else view
+
+        self.ids = take(4 * n, "i")
+        self.price_cents = take(8 * n, "q")
+        self.store_ids = take(4 * n, "i")
+        self._name_refs = take(4 * n, "i")
+        self._name_offsets = take(4 * (n_names + 1), "I")
+        self._names = take(names_len)
+        self._store_table = take(4 * n_stores, "i")
+        self._store_offsets = take(4 * (n_stores + 1), "I")
+        self._store_names = take(store_names_len)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _name_at(self, ref) -> str:
+        return str(self._names[self._name_offsets[ref]:self._name_offsets[ref + 1]], "utf-8")
+
+    def name(self, i) -> str:
+        """Name of the item in row i."""
+        return self._name_at(self._name_refs[i])
+
+    def store_name(self, store_id):
+        i = bisect.bisect_left(self._store_table, store_id)
+        if i == len(self._store_table) or self._store_table[i] != store_id:
+            return None
+        return str(self._store_names[self._store_offsets[i]:self._store_offsets[i + 1]], "utf-8")
+
+    def row_of(self, item_id):
+        """Row index of an item id, or None."""
+        i = bisect.bisect_left(self.ids, item_id)
+        return i if i < len(self.ids) and self.ids[i] == item_id else None
+
+    def get(self, item_id):
+        """SnapshotItem for an id (store.name works like Items.store.name), or None."""
+        i = self.row_of(item_id)
+        if i is None:
+            return None
+        store_id = self.store_ids[i]
+        return SnapshotItem(item_id, self.name(i), _price(self.price_cents[i]), store_id,
+                            StoreRef(store_id, self.store_name(store_id)))
+
+    def __iter__(self):
+        store_names = {}
+        for i in range(len(self.ids)):
+            store_id = self.store_ids[i]
+            if store_id not in store_names:
+                store_names[store_id] = self.store_name(store_id)
+            yield self.name(i), self.ids[i], store_names[store_id], _price(self.price_cents[i])
+
+
+def _stale_path(path) -> str:
+    return path + ".stale"
+
+
+def mark_stale() -> None:
+    """Ask for a rebuild after items change; the next read in any worker picks it up."""
+    path = _stale_path(snapshot_path())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    now = time.time_ns()
+    with open(path, "a"):
+        pass
+    # set the mtime ourselves: the filesystem clock can lag time.time_ns() by a tick
+    os.utime(path, ns=(now, now))
+
+
+def build(path=None) -> CatalogSnapshot:
+    """Read the catalog and atomically replace the snapshot file with it."""
+    path = path or snapshot_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    started_ns = time.time_ns()
+    rows = Items.objects.using(DB).values_list("id", "name", "price", "store_id")
+    stores = Stores.objects.using(DB).values_list("id", "name")
+    try:
+        version = CatalogSnapshot(path).version + 1
+    except (OSError, ValueError):
+        version = 1
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_columns(version, started_ns, rows, stores))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return CatalogSnapshot(path)
+
+
+def _is_stale(snap, path) -> bool:
+    try:
+        return os.stat(_stale_path(path)).st_mtime_ns >= snap.started_ns
+    except FileNotFoundError:
+        return False
+
+
+_lock = threading.Lock()
+_current = None
+_rebuilding = threading.Event()
+_local_build_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _build_lock(path):
+    """Yields True if this process may build now, False if another worker already is."""
+    if fcntl is None:
+        acquired = _local_build_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                _local_build_lock.release()
+        return
+    with open(path + ".lock", "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _rebuild(path):
+    """Rebuild unless another worker already is; returns the new mapping or None."""
+    global _current
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _build_lock(path) as acquired:
+        if not acquired:
+            return None
+        # another worker may have finished a rebuild since this one was started
+        fresh = CatalogSnapshot(path) if os.path.exists(path) else None
+        if fresh is None or _is_stale(fresh, path):
+            fresh = build(path)
+    with _lock:
+        _current = fresh
+    return fresh
+
+
+def _rebuild_in_background(path):
+    if _rebuilding.is_set():
+        return
+    _rebuilding.set()
+
+    def run():
+        try:
+            _rebuild(path)
+        except Exception as e:
+            print(f"Catalog snapshot rebuild failed: {e}")
+        finally:
+            connections.close_all()
+            _rebuilding.clear()
+
+    threading.Thread(target=run, name="catalog-snapshot", daemon=True).start()
+
+
+def _mapped(path):
+    """(this process's mapping of the snapshot file or None, whether it is stale)."""
+    global _current
+    with _lock:
+        try:
+            identity = _identity(path, os.stat(path))
+        except FileNotFoundError:
+            identity = None
+        if identity is None:
+            _current = None
+        elif _current is None or _current.identity != identity:
+            _current = CatalogSnapshot(path)
+        snap = _current
+
+    stale = snap is None or _is_stale(snap, path)
+    if stale:
+        _rebuild_in_background(path)
+    return snap, stale
+
+
+def current():
+    """
+    This process's mapping of the newest snapshot (two stat calls when nothing
+    changed), or None before the first one exists. A missing or stale snapshot
+    is rebuilt by a background thread; a stale one keeps being served meanwhile.
+    """
+    return _mapped(snapshot_path())[0]
+
+
+def fresh():
+    """Like current(), but None while the snapshot is stale too: for readers that must agree with the database."""
+    snap, stale = _mapped(snapshot_path())
+    return None if stale else snap
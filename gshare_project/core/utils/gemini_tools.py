@@ -3,8 +3,8 @@ import json
 
 import google.generativeai as genai
 from django.conf import settings
-from django.db import connections
 
+from .order_lines import remove_quantities
 from .orders_for_driver import get_active_orders_for_driver
 from .order_resolver import assign_lines_to_orders
 
@@ -13,20 +13,7 @@ def _remove_items(order_id: int, items):
     """
     items: [{"item_id": int, "quantity": number}, ...]
     """
-    with connections["gsharedb"].cursor() as cur:
-        for it in items:
-            cur.execute(
-                """
-                UPDATE order_items
-                SET quantity = GREATEST(quantity - %s, 0)
-                WHERE order_id = %s AND item_id = %s
-                """,
-                [it["quantity"], order_id, it["item_id"]],
-            )
-        cur.execute(
-            "DELETE FROM order_items WHERE order_id = %s AND quantity <= 0",
-            [order_id],
-        )
+    remove_quantities(order_id, [(it["item_id"], it["quantity"]) for it in items])
 
 
 def _resolve_and_remove_by_name(driver_user_id: int, lines):
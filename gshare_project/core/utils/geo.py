@@ -1,7 +1,37 @@
 import requests
 from urllib.parse import urlencode
 from django.conf import settings
+from django.db import connections
+from django.utils import timezone
 import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+# How long a resolved address is trusted, and how long "no such address" is remembered.
+GEOCODE_TTL = timedelta(days=30)
+NEGATIVE_TTL = timedelta(days=1)
+# Transport errors / quota hits are not the address's fault: only remember them in-process, briefly.
+TRANSIENT_TTL = 60
+
+LRU_SIZE = 4096
+MAX_WORKERS = 8
+RATE_PER_SEC = 25  # Google's default geocoding QPS is 50; stay well under it
+
+_ABBREVIATIONS = {
+    "street": "st", "avenue": "ave", "road": "rd", "drive": "dr", "boulevard": "blvd",
+    "lane": "ln", "court": "ct", "place": "pl", "parkway": "pkwy", "highway": "hwy",
+    "circle": "cir", "suite": "ste", "apartment": "apt",
+    "north": "n", "south": "s", "east": "e", "west": "w",
+    "northeast": "ne", "northwest": "nw", "southeast": "se", "southwest": "sw",
+    "usa": "us",
+}
+
 
 def _fake_coords(address: str) -> tuple[float, float]:
     """Return deterministic fake coords in dev/test."""
@@ -10,24 +40,236 @@ def _fake_coords(address: str) -> tuple[float, float]:
     lng = -120 + ((h // 4000000) % 4000000) / 100000.0
     return round(lat, 6), round(lng, 6)
 
-def geoLoc(address: str) -> tuple[float, float]:
-    if not address or not address.strip():
-        return 0.0, 0.0
 
-    if getattr(settings, "FAKE_GEOLOC", False):
-        return _fake_coords(address)
+def normalize_address(address: str) -> str:
+    """Canonical form used as the cache key: '123 North Main Street.' == '123 n main st'."""
+    s = re.sub(r"[.,#;]", " ", (address or "").casefold())
+    words = [_ABBREVIATIONS.get(w, w) for w in s.split()]
+    return " ".join(words)
+
+
+def address_key(address: str) -> str:
+    return hashlib.sha1(normalize_address(address).encode()).hexdigest()
+
+
+class _LRU:
+    """Small thread-safe LRU of key -> (expires_at_monotonic, coords-or-None)."""
+
+    def __init__(self, size):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return False, None
+            if hit[0] < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, hit[1]
+
+    def put(self, key, coords, ttl_seconds):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl_seconds, coords)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_lru = _LRU(LRU_SIZE)
+
+
+class _RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_limiter = _RateLimiter(RATE_PER_SEC)
+
+
+# ---------- DB layer ----------
+
+def _db_lookup(keys) -> dict:
+    """Return {key: coords-or-None} for unexpired rows."""
+    from core.models import GeocodeCache
+
+    out = {}
+    try:
+        rows = (
+            GeocodeCache.objects.using('gsharedb')
+            .filter(address_key__in=list(keys), expires_at__gt=timezone.now())
+            .values_list("address_key", "latitude", "longitude")
+        )
+        for key, lat, lng in rows:
+            out[key] = None if lat is None or lng is None else (float(lat), float(lng))
+    except Exception as e:
+        print("Geocode cache read error:", e)
+    return out
 
+
+def _db_store(entries) -> None:
+    """entries: iterable of (key, address, coords-or-None)."""
+    from core.models import GeocodeCache
+
+    now = timezone.now()
+    objs = [
+        GeocodeCache(
+            address_key=key,
+            address=address[:255],
+            latitude=coords[0] if coords else None,
+            longitude=coords[1] if coords else None,
+            expires_at=now + (GEOCODE_TTL if coords else NEGATIVE_TTL),
+            updated_at=now,
+        )
+        for key, address, coords in entries
+    ]
+    if not objs:
+        return
+
+    features = connections['gsharedb'].features
+    kwargs = {"update_conflicts": True, "update_fields": ["address", "latitude", "longitude", "expires_at", "updated_at"]}
+    if features.supports_update_conflicts_with_target:
+        kwargs["unique_fields"] = ["address_key"]
+    try:
+        GeocodeCache.objects.using('gsharedb').bulk_create(objs, **kwargs)
+    except Exception as e:
+        print("Geocode cache write error:", e)
+
+
+# ---------- remote ----------
+
+def _remote_geocode(address: str, session=None):
+    """
+    Call the Google Geocoding API.
+    Returns (coords-or-None, definitive) where definitive=False means the failure
+    was transient and must not be cached as "address not found".
+    """
+    _limiter.wait()
     params = {"address": address.strip(), "key": settings.GOOGLE_MAPS_API_KEY}
-    url = f"https://maps.googleapis.com/maps/api/geocode/json?{urlencode(params)}"
+    url = f"{GEOCODE_URL}?{urlencode(params)}"
 
     try:
-        resp = requests.get(url, timeout=5)
+        resp = (session or requests).get(url, timeout=5)
         resp.raise_for_status()
         data = resp.json()
-        if data.get("status") == "OK" and data.get("results"):
+        status = data.get("status")
+        if status == "OK" and data.get("results"):
             loc = data["results"][0]["geometry"]["location"]
-            return float(loc["lat"]), float(loc["lng"])
+            return (float(loc["lat"]), float(loc["lng"])), True
+        if status == "ZERO_RESULTS":
+            return None, True
+        print("Geocode error:", status, data.get("error_message", ""))
     except Exception as e:
         print("Geocode error:", e)
 
-    return 0.0, 0.0
+    return None, False
+
+
+def _remember(key, address, coords, definitive=True, store=True):
+    if not definitive:
+        _lru.put(key, None, TRANSIENT_TTL)
+        return
+    ttl = GEOCODE_TTL if coords else NEGATIVE_TTL
+    _lru.put(key, coords, ttl.total_seconds())
+    if store:
+        _db_store([(key, address, coords)])
+
+
+def remember(address: str, lat, lng) -> None:
+    """Seed the cache with coordinates we already know (e.g. from the Kroger locations API)."""
+    if not address or not address.strip() or lat is None or lng is None:
+        return
+    _remember(address_key(address), address.strip(), (float(lat), float(lng)))
+
+
+# ---------- public API ----------
+
+def geoLoc(address: str) -> tuple[float, float]:
+    if not address or not address.strip():
+        return 0.0, 0.0
+
+    if getattr(settings, "FAKE_GEOLOC", False):
+        return _fake_coords(address)
+
+    key = address_key(address)
+    hit, coords = _lru.get(key)
+    if not hit:
+        found = _db_lookup([key])
+        if key in found:
+            coords = found[key]
+            _remember(key, address, coords, store=False)
+        else:
+            coords, definitive = _remote_geocode(address)
+            _remember(key, address.strip(), coords, definitive)
+
+    return coords if coords else (0.0, 0.0)
+
+
+def geocode_many(addresses, max_workers: int = MAX_WORKERS) -> dict:
+    """
+    Geocode a batch of addresses. Duplicates (after normalization) are resolved once,
+    cache misses are fetched concurrently under the shared rate limit, and every
+    result is written back with one bulk upsert.
+    Returns {address: (lat, lng)} with (0.0, 0.0) for anything unresolved.
+    """
+    by_key = {}
+    for a in addresses:
+        if a and a.strip():
+            by_key.setdefault(address_key(a), a.strip())
+
+    out_by_key = {}
+    if getattr(settings, "FAKE_GEOLOC", False):
+        out_by_key = {k: _fake_coords(a) for k, a in by_key.items()}
+    else:
+        missing = []
+        for key in by_key:
+            hit, coords = _lru.get(key)
+            if hit:
+                out_by_key[key] = coords
+            else:
+                missing.append(key)
+
+        if missing:
+            for key, coords in _db_lookup(missing).items():
+                out_by_key[key] = coords
+                _remember(key, by_key[key], coords, store=False)
+            missing = [k for k in missing if k not in out_by_key]
+
+        if missing:
+            with requests.Session() as session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+                results = list(pool.map(lambda k: _remote_geocode(by_key[k], session), missing))
+
+            to_store = []
+            for key, (coords, definitive) in zip(missing, results):
+                out_by_key[key] = coords
+                _remember(key, by_key[key], coords, definitive, store=False)
+                if definitive:
+                    to_store.append((key, by_key[key], coords))
+            _db_store(to_store)
+
+    out = {}
+    for a in addresses:
+        if a and a.strip():
+            out[a] = out_by_key.get(address_key(a)) or (0.0, 0.0)
+        else:
+            out[a] = (0.0, 0.0)
+    return out
@@ -0,0 +1,122 @@
+# core/utils/map_tiles.py
+import math
+import time
+
+from django.core.cache import cache
+
+from core.models import Orders
+
+# Zoom levels the viewport API snaps to, coarsest first.
+TILE_ZOOMS = (8, 10, 12, 14)
+# A viewport is served from at most this many tiles; beyond that it is built directly.
+MAX_TILES = 16
+TILE_TTL = 120
+MAX_LAT = 85.05112878  # web mercator limit
+
+
+def tile_for_point(lat: float, lng: float, z: int) -> tuple[int, int, int]:
+    """Return the (z, x, y) slippy-map tile containing a point."""
+    lat = max(-MAX_LAT, min(MAX_LAT, float(lat)))
+    n = 2 ** z
+    x = int((float(lng) + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return z, min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(tile) -> tuple[float, float, float, float]:
+    """Return (min_lat, min_lng, max_lat, max_lng) of a tile."""
+    z, x, y = tile
+    n = 2 ** z
+    min_lng = x / n * 360.0 - 180.0
+    max_lng = (x + 1) / n * 360.0 - 180.0
+    max_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    min_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def tiles_for_viewport(min_lat, min_lng, max_lat, max_lng):
+    """
+    Snap a viewport to the finest zoom in TILE_ZOOMS that covers it with at most
+    MAX_TILES tiles. Returns the tile list, or None if even the coarsest zoom is too many.
+    Handles antimeridian (min_lng > max_lng).
+    """
+    for z in reversed(TILE_ZOOMS):
+        _, x0, y0 = tile_for_point(max_lat, min_lng, z)   # north-west corner
+        _, x1, y1 = tile_for_point(min_lat, max_lng, z)   # south-east corner
+        n = 2 ** z
+        xs = list(range(x0, x1 + 1)) if x0 <= x1 else list(range(x0, n)) + list(range(0, x1 + 1))
+        ys = range(y0, y1 + 1)
+        if len(xs) * len(ys) <= MAX_TILES:
+            return [(z, x, y) for x in xs for y in ys]
+    return None
+
+
+def _version_key(tile) -> str:
+    return "maps:tilever:{}:{}:{}".format(*tile)
+
+
+def _payload_key(tile, version) -> str:
+    return "maps:tile:{}:{}:{}:v{}".format(*tile, version)
+
+
+def _fresh_version() -> int:
+    # Millisecond clock so a version key that was evicted never comes back
+    # with a number an older payload was cached under.
+    return int(time.time() * 1000)
+
+
+def get_tile_payloads(tiles, build):
+    """
+    Return {tile: payload} for the given tiles, calling build(tile) for any tile
+    whose payload is not cached under the tile's current version.
+    """
+    version_keys = {_version_key(t): t for t in tiles}
+    versions = cache.get_many(list(version_keys))
+    for key in version_keys:
+        if key not in versions:
+            cache.add(key, _fresh_version(), None)
+            versions[key] = cache.get(key)
+
+    payload_keys = {_payload_key(t, versions[_version_key(t)]): t for t in tiles}
+    cached = cache.get_many(list(payload_keys))
+
+    out = {}
+    to_store = {}
+    for key, tile in payload_keys.items():
+        if key in cached:
+            out[tile] = cached[key]
+        else:
+            out[tile] = to_store[key] = build(tile)
+    if to_store:
+        cache.set_many(to_store, TILE_TTL)
+    return out
+
+
+def bump_tiles_for_points(points) -> None:
+    """Invalidate every cached tile (at every zoom) that contains one of the (lat, lng) points."""
+    keys = set()
+    for lat, lng in points:
+        if lat is None or lng is None:
+            continue
+        for z in TILE_ZOOMS:
+            keys.add(_version_key(tile_for_point(lat, lng, z)))
+
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+
+
+def bump_tiles_for_orders(order_ids) -> None:
+    """Invalidate the tiles holding these orders (orders sit at their owner's location)."""
+    order_ids = [oid for oid in order_ids if oid]
+    if not order_ids:
+        return
+    points = (
+        Orders.objects.using("gsharedb")
+        .filter(id__in=order_ids)
+        .values_list("user__latitude", "user__longitude")
+    )
+    bump_tiles_for_points(points)
@@ -0,0 +1,119 @@
+"""
+Data access for the order_items table.
+
+order_items has a composite (order_id, item_id) key and no id column, so the
+ORM can read it but can't update or delete single rows: reads go through
+values_list and return OrderLine rows with only the columns callers use;
+writes are raw SQL against 'gsharedb', several lines per executemany.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import connections
+
+from core.models import OrderItems
+
+DB = "gsharedb"
+
+# price is what the line was added at; item_price is the item's current price
+OrderLine = namedtuple("OrderLine", "order_id item_id quantity price name item_price")
+_LINE_COLUMNS = ("order_id", "item_id", "quantity", "price", "item__name", "item__price")
+
+
+def _placeholders(values) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
+def _lines(using, **filters):
+    rows = OrderItems.objects.using(using).filter(**filters).order_by().values_list(*_LINE_COLUMNS)
+    return map(OrderLine._make, rows)
+
+
+def get_lines(order_id, using=DB) -> list:
+    """Every line of one order."""
+    return list(_lines(using, order_id=order_id))
+
+
+def get_lines_for_orders(order_ids, using=DB) -> dict:
+    """{order_id: [OrderLine, ...]} for several orders in one query; orders without lines map to []."""
+    order_ids = list(dict.fromkeys(order_ids))
+    lines = {oid: [] for oid in order_ids}
+    if not order_ids:
+        return lines
+
+    for line in _lines(using, order_id__in=order_ids):
+        lines[line.order_id].append(line)
+    return lines
+
+
+def add_lines(order_id, lines) -> None:
+    """
+    Add (item_id, quantity, price) lines to an order; an item already on the
+    order has its quantity bumped and keeps its original price.
+    """
+    rows = [(order_id, item_id, quantity, str(price or 0)) for item_id, quantity, price in lines]
+    if not rows:
+        return
+    with connections[DB].cursor() as cur:
+        cur.executemany(
+            """
+            INSERT INTO order_items (order_id, item_id, quantity, price)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                quantity = quantity + VALUES(quantity)
+            """,
+            rows,
+        )
+
+
+def insert_lines(order_id, lines) -> None:
+    """Insert (item_id, quantity, price) lines into an order that has none of these items yet."""
+    rows = [(order_id, item_id, quantity, price) for item_id, quantity, price in lines]
+    if not rows:
+        return
+    with connections[DB].cursor() as cur:
+        cur.executemany(
+            "INSERT INTO order_items (order_id, item_id, quantity, price) VALUES (%s, %s, %s, %s)",
+            rows,
+        )
+
+
+def remove_quantities(order_id, items) -> set:
+    """
+    Take (item_id, quantity) amounts off an order's lines, deleting lines that
+    reach zero. Returns the item ids that were on the order.
+    """
+    items = [(item_id, quantity) for item_id, quantity in items]
+    if not items:
+        return set()
+    item_ids = list(dict.fromkeys(item_id for item_id, _ in items))
+
+    with connections[DB].cursor() as cur:
+        cur.execute(
+            f"SELECT item_id FROM order_items WHERE order_id = %s AND item_id IN ({_placeholders(item_ids)})",
+            [order_id, *item_ids],
+        )
+        present = {row[0] for row in cur.fetchall()}
+        if not present:
+            return present
+
+        cur.executemany(
+            """
+            UPDATE order_items
+            SET quantity = GREATEST(quantity - %s, 0)
+            WHERE order_id = %s AND item_id = %s
+            """,
+            [(quantity, order_id, item_id) for item_id, quantity in items if item_id in present],
+        )
+        cur.execute("DELETE FROM order_items WHERE order_id = %s AND quantity <= 0", [order_id])
+    return present
+
+
+def order_total(order_id) -> Decimal:
+    """Sum of quantity * price over an order's lines."""
+    with connections[DB].cursor() as cur:
+        cur.execute(
+            "SELECT COALESCE(SUM(quantity * price), 0) FROM order_items WHERE order_id = %s",
+            [order_id],
+        )
+        return cur.fetchone()[0] or 0
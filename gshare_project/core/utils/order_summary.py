@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from core.models import Deliveries
+from core.utils.order_lines import get_lines_for_orders
+
+TAX_RATE = Decimal("0.07")
+
+
+def calculate_tax(subtotal):
+    """Calculate tax as 7% of subtotal, in cents (int), rounded to nearest cent."""
+    return round(subtotal * TAX_RATE * 100)
+
+
+def latest_deliveries(order_ids, using="gsharedb"):
+    """
+    The most recent Delivery per order in a single windowed query.
+    Returns {order_id: Deliveries}; orders without a delivery are absent.
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return {}
+
+    deliveries = (
+        Deliveries.objects.using(using)
+        .filter(order_id__in=order_ids)
+        .annotate(rn=Window(RowNumber(), partition_by=[F("order_id")], order_by=F("id").desc()))
+        .filter(rn=1)
+        .select_related("delivery_person")
+    )
+    return {d.order_id: d for d in deliveries}
+
+
+class OrderSummaryService:
+    """
+    Batched read model behind the cart and order JSON endpoints.
+
+    For any set of orders it loads every line (core.utils.order_lines) in
+    one query (plus, on request, each order's latest delivery in one more) and
+    totals each order in a single pass, so the query count does not grow with
+    the number of orders.
+    """
+
+    def __init__(self, using="gsharedb"):
+        self.using = using
+
+    def summarize(self, order_ids, with_delivery=False):
+        """
+        {order_id: {"items": [...], "summary": {"subtotal", "tax", "total"}, "delivery": Deliveries or None}},
+        in the order the ids were given. Line totals use the item's current price.
+        """
+        order_ids = list(dict.fromkeys(order_ids))
+        lines = get_lines_for_orders(order_ids, self.using)
+        deliveries = latest_deliveries(order_ids, self.using) if with_delivery else {}
+
+        summaries = {}
+        for oid in order_ids:
+            subtotal = 0
+            items = []
+            for line in lines[oid]:
+                total = (line.quantity or 0) * (line.item_price or 0)
+                subtotal += total
+                items.append({
+                    'id': line.item_id,
+                    'name': line.name,
+                    'quantity': line.quantity,
+                    'price': line.item_price,
+                    'total': total,
+                })
+
+            tax = Decimal(calculate_tax(subtotal)) / 100  # cents -> dollars for display
+            summaries[oid] = {
+                'items': items,
+                'summary': {
+                    'subtotal': subtotal,
+                    'tax': tax,
+                    'total': round(subtotal + tax, 2),
+                },
+                'delivery': deliveries.get(oid),
+            }
+        return summaries
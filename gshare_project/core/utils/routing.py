@@ -0,0 +1,171 @@
+# core/utils/routing.py
+import math
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+from core.utils.geo import geocode_many
+
+MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+# (connect, read) seconds; past this checkout falls back to the haversine estimate
+TIMEOUT = (2, 3)
+ROUTE_TTL = 15 * 60
+# 4 decimals ~ 11 m: close enough that two spellings of one address share an entry
+COORD_PRECISION = 4
+
+# Haversine fallback: straight-line distance times a road detour factor at city speed.
+DETOUR_FACTOR = 1.3
+FALLBACK_SPEED_MPS = 13.4  # ~30 mph
+EARTH_RADIUS_M = 6_371_000
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+
+def haversine_m(a, b) -> float:
+    """Great-circle distance in metres between two (lat, lng) points."""
+    lat1, lng1 = map(math.radians, a)
+    lat2, lng2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+def _coords(places) -> list:
+    """
+    (lat, lng) for each address string or coordinate pair, or None where it
+    can't be resolved. Addresses are geocoded in one batch (cache misses
+    concurrently), not one round trip per stop.
+    """
+    addresses = [p for p in places if not isinstance(p, (tuple, list))]
+    found = geocode_many(addresses) if addresses else {}
+    out = []
+    for place in places:
+        if isinstance(place, (tuple, list)):
+            out.append((float(place[0]), float(place[1])))
+        else:
+            coords = found.get(place, (0.0, 0.0))
+            out.append(None if coords == (0.0, 0.0) else coords)
+    return out
+
+
+def _place_key(place, coords) -> str:
+    if coords is not None:
+        return f"{coords[0]:.{COORD_PRECISION}f},{coords[1]:.{COORD_PRECISION}f}"
+    return " ".join(str(place).casefold().split())
+
+
+def _query_value(place) -> str:
+    if isinstance(place, (tuple, list)):
+        return f"{place[0]},{place[1]}"
+    return str(place)
+
+
+def _element(distance_m, duration_s, distance_text, duration_text, estimated=False):
+    return {
+        "distance_text": distance_text,
+        "distance_value": distance_m,
+        "duration_text": duration_text,
+        "duration_value": duration_s,
+        "estimated": estimated,
+    }
+
+
+def _fallback_element(a, b):
+    if a is None or b is None:
+        return None
+    distance = haversine_m(a, b) * DETOUR_FACTOR
+    duration = distance / FALLBACK_SPEED_MPS
+    return _element(
+        int(distance), int(duration),
+        f"{distance / 1609.344:.1f} mi", f"{max(1, round(duration / 60))} mins",
+        estimated=True,
+    )
+
+
+def _fetch_matrix(origins, destinations, api_key):
+    """One Distance Matrix request. Returns rows[i][j] element dicts (None where not routable)."""
+    params = {
+        "origins": "|".join(_query_value(o) for o in origins),
+        "destinations": "|".join(_query_value(d) for d in destinations),
+        "key": api_key,
+    }
+    resp = _session.get(MATRIX_URL, params=params, timeout=TIMEOUT)
+    resp.raise_for_status()
+    data = resp.json()
+    if data.get("status") != "OK":
+        raise RuntimeError(f"distance matrix status {data.get('status')}")
+
+    out = []
+    for row in data["rows"]:
+        cells = []
+        for el in row["elements"]:
+            if el.get("status") == "OK":
+                cells.append(_element(
+                    el["distance"]["value"], el["duration"]["value"],
+                    el["distance"]["text"], el["duration"]["text"],
+                ))
+            else:
+                cells.append(None)
+        out.append(cells)
+    return out
+
+
+def drive_matrix(origins, destinations, api_key=None):
+    """
+    Driving distance/duration for every origin x destination pair.
+
+    Places can be address strings or (lat, lng) pairs. Cached pairs are served
+    from the cache (keyed by rounded coordinates); the rest are fetched with a
+    single Distance Matrix request. If that request fails or times out the
+    missing pairs get a haversine estimate (marked "estimated": True), which
+    is not cached.
+
+    Returns a list of rows: result[i][j] is the element for origins[i] ->
+    destinations[j], or None when no route (or estimate) is available.
+    """
+    api_key = api_key or settings.GOOGLE_MAPS_API_KEY
+    coords = _coords(list(origins) + list(destinations))
+    o_coords, d_coords = coords[:len(origins)], coords[len(origins):]
+    o_keys = [_place_key(o, c) for o, c in zip(origins, o_coords)]
+    d_keys = [_place_key(d, c) for d, c in zip(destinations, d_coords)]
+
+    pair_keys = {
+        (i, j): f"route:{o_keys[i]}:{d_keys[j]}"
+        for i in range(len(origins))
+        for j in range(len(destinations))
+    }
+    cached = cache.get_many(list(set(pair_keys.values())))
+    result = [[cached.get(pair_keys[(i, j)]) for j in range(len(destinations))] for i in range(len(origins))]
+
+    missing = [ij for ij, key in pair_keys.items() if key not in cached]
+    if not missing:
+        return result
+
+    # fetch the smallest sub-matrix that covers every missing pair
+    rows = sorted({i for i, _ in missing})
+    cols = sorted({j for _, j in missing})
+    try:
+        fetched = _fetch_matrix([origins[i] for i in rows], [destinations[j] for j in cols], api_key)
+    except Exception as e:
+        print("Distance matrix error:", e)
+        for i, j in missing:
+            result[i][j] = _fallback_element(o_coords[i], d_coords[j])
+        return result
+
+    to_store = {}
+    for ri, i in enumerate(rows):
+        for ci, j in enumerate(cols):
+            el = fetched[ri][ci]
+            result[i][j] = el
+            if el is not None:
+                to_store[pair_keys[(i, j)]] = el
+    if to_store:
+        cache.set_many(to_store, ROUTE_TTL)
+    return result
+
+
+def drive_time(origin, destination, api_key=None):
+    """Single-pair convenience wrapper around drive_matrix."""
+    return drive_matrix([origin], [destination], api_key)[0][0]
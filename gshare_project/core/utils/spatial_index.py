@@ -0,0 +1,168 @@
+# core/utils/spatial_index.py
+import math
+
+from django.core.cache import caches
+
+from core.models import Users
+
+# Grid cells are CELL_DEG x CELL_DEG degrees (~5.5 km tall at 0.05).
+CELL_DEG = 0.05
+CELL_TTL = 600
+# Past this many cells the viewport is zoomed out too far for the grid to help.
+MAX_CELLS = 400
+# Padding on cell bounds so DECIMAL -> float rounding never drops a boundary row.
+_EPS = 1e-6
+
+
+def cell_of(lat: float, lng: float) -> tuple[int, int]:
+    """Return the (row, col) grid cell containing a point."""
+    return int(math.floor(float(lat) / CELL_DEG)), int(math.floor(float(lng) / CELL_DEG))
+
+
+def cells_for_viewport(min_lat, min_lng, max_lat, max_lng):
+    """
+    Return the list of (row, col) cells covering the viewport, or None when the
+    viewport needs more than MAX_CELLS cells (or isn't made of finite numbers).
+    Handles antimeridian (min_lng > max_lng).
+    """
+    if not all(math.isfinite(b) for b in (min_lat, min_lng, max_lat, max_lng)):
+        return None
+    r0, _ = cell_of(min_lat, 0)
+    r1, _ = cell_of(max_lat, 0)
+
+    if min_lng <= max_lng:
+        col_ranges = [(cell_of(0, min_lng)[1], cell_of(0, max_lng)[1])]
+    else:
+        col_ranges = [
+            (cell_of(0, min_lng)[1], cell_of(0, 180)[1]),
+            (cell_of(0, -180)[1], cell_of(0, max_lng)[1]),
+        ]
+
+    n_rows = r1 - r0 + 1
+    n_cols = sum(c1 - c0 + 1 for c0, c1 in col_ranges)
+    if n_rows <= 0 or n_cols <= 0 or n_rows * n_cols > MAX_CELLS:
+        return None
+
+    return [
+        (r, c)
+        for r in range(r0, r1 + 1)
+        for c0, c1 in col_ranges
+        for c in range(c0, c1 + 1)
+    ]
+
+
+def _in_viewport(row, min_lat, min_lng, max_lat, max_lng) -> bool:
+    lat, lng = row["latitude"], row["longitude"]
+    if not (min_lat <= lat <= max_lat):
+        return False
+    if min_lng <= max_lng:
+        return min_lng <= lng <= max_lng
+    return lng >= min_lng or lng <= max_lng
+
+
+class SpatialIndex:
+    """
+    Grid index of user locations for the map endpoints.
+
+    Each cell is a cache entry holding the users whose lat/lng fall inside it,
+    so a viewport query is a handful of cache lookups instead of a range scan
+    over the whole users table. Cells are filled lazily from the database and
+    dropped whenever a user inside them changes address.
+    """
+
+    def __init__(self, cache_alias="default", cache=None):
+        self._cache_alias = cache_alias
+        self._cache = cache
+
+    @property
+    def cache(self):
+        return self._cache if self._cache is not None else caches[self._cache_alias]
+
+    @staticmethod
+    def key(cell) -> str:
+        return f"geo:cell:{cell[0]}:{cell[1]}"
+
+    def prime(self, rows) -> int:
+        """Bucket already-loaded user rows into cells and store them. Returns cell count."""
+        buckets = {}
+        for r in rows:
+            buckets.setdefault(cell_of(r["latitude"], r["longitude"]), []).append(r)
+        self.cache.set_many({self.key(c): v for c, v in buckets.items()}, CELL_TTL)
+        return len(buckets)
+
+    def _load_cells(self, cells) -> dict:
+        """Fill the given cells from the database with one query per longitude band."""
+        buckets = {c: [] for c in cells}
+
+        # a viewport crossing the antimeridian must not collapse into a world-wide band
+        cols = [c[1] for c in cells]
+        if max(cols) - min(cols) > MAX_CELLS:
+            bands = [[c for c in cells if c[1] >= 0], [c for c in cells if c[1] < 0]]
+        else:
+            bands = [cells]
+
+        for band in bands:
+            if not band:
+                continue
+            rows = [c[0] for c in band]
+            cols = [c[1] for c in band]
+            qs = (
+                Users.objects.using("gsharedb")
+                .filter(
+                    latitude__gte=min(rows) * CELL_DEG - _EPS,
+                    latitude__lt=(max(rows) + 1) * CELL_DEG + _EPS,
+                    longitude__gte=min(cols) * CELL_DEG - _EPS,
+                    longitude__lt=(max(cols) + 1) * CELL_DEG + _EPS,
+                )
+                .values("id", "name", "address", "longitude", "latitude")
+            )
+            for r in qs:
+                r["longitude"] = float(r["longitude"])
+                r["latitude"] = float(r["latitude"])
+                cell = cell_of(r["latitude"], r["longitude"])
+                if cell in buckets:
+                    buckets[cell].append(r)
+
+        self.cache.set_many({self.key(c): v for c, v in buckets.items()}, CELL_TTL)
+        return buckets
+
+    def users_in_viewport(self, min_lat, min_lng, max_lat, max_lng, limit=500, exclude_id=None):
+        """
+        Return user rows inside the viewport, or None if the viewport is too large
+        for the grid (callers should fall back to a plain range scan).
+        """
+        cells = cells_for_viewport(min_lat, min_lng, max_lat, max_lng)
+        if cells is None:
+            return None
+
+        keys = {self.key(c): c for c in cells}
+        found = self.cache.get_many(list(keys))
+        missing = [c for k, c in keys.items() if k not in found]
+        if missing:
+            for c, rows in self._load_cells(missing).items():
+                found[self.key(c)] = rows
+
+        out = []
+        for k in keys:
+            for r in found.get(k) or ():
+                if r["id"] == exclude_id:
+                    continue
+                if not _in_viewport(r, min_lat, min_lng, max_lat, max_lng):
+                    continue
+                out.append(r)
+                if len(out) >= limit:
+                    return out
+        return out
+
+    def invalidate(self, *points) -> None:
+        """Drop the cells holding the given (lat, lng) points; they reload on next query."""
+        keys = set()
+        for p in points:
+            if not p or p[0] is None or p[1] is None:
+                continue
+            keys.add(self.key(cell_of(p[0], p[1])))
+        if keys:
+            self.cache.delete_many(list(keys))
+
+
+user_index = SpatialIndex()
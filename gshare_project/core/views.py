@@ -2,7 +2,6 @@ from django.db import transaction
 from decimal import Decimal, InvalidOperation
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
-from django.core.paginator import Paginator
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
@@ -23,9 +22,19 @@ from django.db import connection
 from django.core.files.storage import default_storage
 from core.utils.simple_gemini import scan_receipt, chat_about_receipt, suggest_matching_order
 import json
+import math
 import re
-import requests
 from core.utils.geo import geoLoc
+from core.utils import geo as geo_cache
+from core.utils.spatial_index import user_index, _in_viewport
+from core.utils import map_tiles
+from core.utils import routing
+from core.utils import order_lines
+from core.utils import cart_engine
+from core.utils import catalog_search
+from core.utils import catalog_snapshot
+from core.utils.order_summary import OrderSummaryService, calculate_tax, latest_deliveries
+from chat.presence import get_presence
 from core.utils.permissions import user_can_use_scan
 from urllib.parse import urlencode
 from . import kroger_api
@@ -43,6 +52,8 @@ from .tasks import parse_receipt_task
 from .utils.aws_s3 import upload_file_like, presigned_url
 from django.views.decorators.http import require_POST
 from chat.models import ChatGroup
+from chat.notify import announce_membership_change
+from chat.usernames import username_index
 from groqai.groq_proxy import call_groq
 from groqai.instructions import VOICE_ORDER_CHAT_INSTRUCTIONS, VOICE_ORDER_FINALIZE_INSTRUCTIONS
 from core.models import (
@@ -56,10 +67,6 @@ from core.models import (
 
 """helper functions"""
 
-def calculate_tax(subtotal):
-    """Calculate tax as 7% of subtotal, in cents (int), rounded to nearest cent."""
-    return round(subtotal * Decimal('0.07') * 100)
-
 """
 Retrieve all feedback for a specific user and calculate their average rating.
 
@@ -162,6 +169,7 @@ def edit_user(user_email: str, field: str, value: str):
         user = Users.objects.using("gsharedb").get(email=user_email)
         setattr(user, field, value)
         user.save(using='gsharedb')
+        cart_engine.forget_shopper(user_email)
         return user
     except Users.DoesNotExist:
         return None
@@ -205,7 +213,7 @@ def create_user_signin(name: str, email: str, address: str = "Not provided", use
     if lat != 0 and lng != 0:
         try:
             with transaction.atomic(using='gsharedb'):
-                return Users.objects.using('gsharedb').create(
+                created = Users.objects.using('gsharedb').create(
                     name=name,
                     email=email,     # email is unique but nullable
                     phone=phone,     # optional
@@ -214,6 +222,8 @@ def create_user_signin(name: str, email: str, address: str = "Not provided", use
                     latitude= lat,
                     longitude= lng
                 )
+            user_index.invalidate((lat, lng))
+            return created
         except IntegrityError as e:
             # e.g., duplicate email or other constraint violations
             raise
@@ -347,49 +357,25 @@ Returns:
     QuerySet or list: A QuerySet of order items if they exist, otherwise an empty list.
 """
 def get_order_items(order: Orders):
-
-     # Upsert into order_items (composite PK table) and recompute total
-    with transaction.atomic(using='gsharedb'):
-        print("Fetching items for order:", order.id)
-        with connections['gsharedb'].cursor() as cur:
-            # Fetch items with their details
-            cur.execute(
-                """
-                SELECT oi.*, i.name, i.price, i.store_id
-                FROM order_items oi
-                JOIN items i ON oi.item_id = i.id
-                WHERE oi.order_id = %s
-                """,
-                [order.id]
-            )
-
-        items = cur.fetchall()
-   # items = OrderItems.objects.using('gsharedb').filter(order=order).select_related('item')
-   # if not items.exists():
-   #     return []
-    return items
+    """The order's lines as OrderLine rows (order_id, item_id, quantity, price, name, item_price)."""
+    return order_lines.get_lines(order.id)
 
 def get_order_items_by_order_id(order_id: int):
-     # Upsert into order_items (composite PK table) and recompute total
-    with transaction.atomic(using='gsharedb'):
-        print("Fetching items for order:", order_id)
-        with connections['gsharedb'].cursor() as cur:
-            # Fetch items with their details
-            cur.execute(
-                """
-                SELECT oi.*, i.name, i.price, i.store_id
-                FROM order_items oi
-                JOIN items i ON oi.item_id = i.id
-                WHERE oi.order_id = %s
-                """,
-                [order_id]
-            )
+    return order_lines.get_lines(order_id)
+
+def get_order_items_for_orders(order_ids):
+    """
+    Batched version of get_order_items_by_order_id: one query for all orders.
+    Returns {order_id: [OrderLine, ...]}.
+    """
+    return order_lines.get_lines_for_orders(order_ids)
 
-        items = cur.fetchall()
-   # items = OrderItems.objects.using('gsharedb').filter(order=order).select_related('item')
-   # if not items.exists():
-   #     return []
-    return items
+def get_latest_deliveries_for_orders(order_ids):
+    """
+    Batched version of get_delivery_for_order: the most recent Delivery per order
+    in a single windowed query. Returns {order_id: Deliveries}.
+    """
+    return latest_deliveries(order_ids)
 
 
 """
@@ -405,6 +391,7 @@ def change_order_status(order_id: int, new_status: str) -> bool:
         order = Orders.objects.using('gsharedb').get(id=order_id)
         order.status = new_status
         order.save(using='gsharedb')
+        map_tiles.bump_tiles_for_orders([order_id])
         return True
     except Orders.DoesNotExist:
         return False
@@ -442,6 +429,7 @@ def change_order_status_with_driver(request, order_id, new_status):
     try:
         order.status = new_status
         order.save(using='gsharedb')
+        map_tiles.bump_tiles_for_orders([order.id])
 
         if new_status == 'pending':
             return True
@@ -520,6 +508,7 @@ def confirm_delivery_json(request, order_id):
         order.save(using='gsharedb')
         delivery.status = 'delivered'
         delivery.save(using='gsharedb')
+        map_tiles.bump_tiles_for_orders([order.id])
 
     return JsonResponse({'success': True, 'fully_delivered': fully})
 
@@ -625,6 +614,7 @@ def remove_delivery_json(request, order_id):
             if success:
                 order.status = 'placed'
                 order.save(using='gsharedb')
+                map_tiles.bump_tiles_for_orders([order.id])
 
             return JsonResponse({'success': success})
 
@@ -633,6 +623,7 @@ def remove_delivery_json(request, order_id):
                 order = Orders.objects.using('gsharedb').get(id=order_id)
                 order.status = 'placed'
                 order.save(using='gsharedb')
+                map_tiles.bump_tiles_for_orders([order.id])
                 return JsonResponse({'success': True})
             except Orders.DoesNotExist:
                 return JsonResponse(
@@ -656,6 +647,7 @@ def create_delivery_json(request, order_id):
 
         delivery = Create_delivery(order, delivery_person)
         if delivery:
+            map_tiles.bump_tiles_for_orders([order.id])
             return JsonResponse({'success': True, 'delivery_id': delivery.id})
         else:
             return JsonResponse({'success': False, 'error': 'Failed to create delivery'}, status=500)
@@ -667,6 +659,7 @@ def delivery_accepted_json(request, order_id):
         try:
             delivery = Deliveries.objects.using('gsharedb').get(order__id=order_id)
             success = delivery_done(delivery)
+            map_tiles.bump_tiles_for_orders([order_id])
             return JsonResponse({'success': success})
         except Deliveries.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Delivery not found'}, status=404)
@@ -751,6 +744,7 @@ def update_delivery_person(request, order_id):
         delivery.save(using='gsharedb')
         order.status = 'inprogress'
         order.save(using='gsharedb')
+        map_tiles.bump_tiles_for_orders([order.id])
 
         return JsonResponse({'success': True})
     except Exception as e:
@@ -772,6 +766,7 @@ def remove_delivery_person(request, order_id):
         Deliveries.objects.using('gsharedb').filter(order=order).delete()
         order.status = 'placed'
         order.save(using='gsharedb')
+        map_tiles.bump_tiles_for_orders([order.id])
 
         return JsonResponse({'success': True})
     except Exception as e:
@@ -818,6 +813,7 @@ def create_delivery_json(request, order_id):
     if not delivery:
         return JsonResponse({'success': False, 'error': 'Failed to create delivery'}, status=500)
 
+    map_tiles.bump_tiles_for_orders([order.id])
     return JsonResponse({'success': True, 'delivery_id': delivery.id})
 
 def delivery_accepted_json(request, order_id):
@@ -825,6 +821,7 @@ def delivery_accepted_json(request, order_id):
         try:
             delivery = Deliveries.objects.using('gsharedb').get(order__id=order_id)
             success = delivery_done(delivery)
+            map_tiles.bump_tiles_for_orders([order_id])
             return JsonResponse({'success': success})
         except Deliveries.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Delivery not found'}, status=404)
@@ -1146,11 +1143,12 @@ def verify_group_password(group, raw_password: str) -> bool:
         max_lat (float): Maximum latitude of the viewport.
         max_lng (float): Maximum longitude of the viewport.
         limit (int): Maximum number of orders to retrieve (default: 500).
+        statuses (tuple): If given, return every order in these statuses regardless of viewer.
 
     Returns:
         list: A list of dictionaries containing order details and user information.
 """
-def orders_in_viewport(min_lat, min_lng, max_lat, max_lng, limit=500, viewer=None):
+def orders_in_viewport(min_lat, min_lng, max_lat, max_lng, limit=500, viewer=None, statuses=None):
     print(f"orders_in_viewport: {min_lat}, {min_lng}, {max_lat}, {max_lng}, limit={limit}")
     # Get users within the viewport
     users_in_viewport = _users_in_viewport(min_lat, min_lng, max_lat, max_lng, limit)
@@ -1165,7 +1163,9 @@ def orders_in_viewport(min_lat, min_lng, max_lat, max_lng, limit=500, viewer=Non
 
     base_qs = Orders.objects.using('gsharedb').filter(user_id__in=user_ids)
 
-    if viewer is not None:
+    if statuses is not None:
+        orders = base_qs.filter(status__in=statuses).select_related('user', 'store')
+    elif viewer is not None:
         orders = base_qs.filter(
             Q(status="placed") |
             Q(status="inprogress", user=viewer) |
@@ -1175,9 +1175,10 @@ def orders_in_viewport(min_lat, min_lng, max_lat, max_lng, limit=500, viewer=Non
         orders = base_qs.filter(status="placed").select_related('user', 'store')
 
     # Prepare the output
+    users_by_id = {u['id']: u for u in users_in_viewport}
     orders_with_users = []
     for order in orders:
-        user = next((u for u in users_in_viewport if u['id'] == order.user_id), None)
+        user = users_by_id.get(order.user_id)
         if not user:
             continue
 
@@ -1203,9 +1204,15 @@ def orders_in_viewport(min_lat, min_lng, max_lat, max_lng, limit=500, viewer=Non
 Return users whose (latitude, longitude) fall inside the map viewport.
 Works with your current schema: latitude, longitude DECIMAL(9,6).
 Handles antimeridian (min_lng > max_lng).
+Served from the spatial grid index; falls back to a range scan when the
+viewport is zoomed out past the grid's cell budget.
 """
 
 def _users_in_viewport(min_lat, min_lng, max_lat, max_lng, limit=500, exclude_id=None):
+    rows = user_index.users_in_viewport(min_lat, min_lng, max_lat, max_lng, limit=limit, exclude_id=exclude_id)
+    if rows is not None:
+        return rows
+
     qs = (Users.objects.using('gsharedb')        # ← use MySQL
           .filter(latitude__isnull=False, longitude__isnull=False))
 
@@ -1270,11 +1277,7 @@ def upload_image(request):
     object_url = f"https://{bucket}.s3.{region}.amazonaws.com/{key}"
 
     try:
-        presigned_url = s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": key},
-            ExpiresIn=3600,  # 1 hour
-        )
+        signed_url = presigned_url(key)  # 1 hour
     except Exception as e:
         return JsonResponse({"ok": False, "error": f"Presign failed: {e}"}, status=500)
 
@@ -1285,7 +1288,7 @@ def upload_image(request):
             "key": key,
             "content_type": content_type,
             "object_url": object_url,
-            "presigned_url": presigned_url,
+            "presigned_url": signed_url,
         },
         status=201,
     )
@@ -1301,16 +1304,11 @@ def get_image_url(request, image_id):
     except UploadedImage.DoesNotExist:
         return JsonResponse({"ok": False, "error": "Not found"}, status=404)
 
-    s3 = get_s3_client()
     bucket, region = get_bucket_and_region()
     object_url = f"https://{bucket}.s3.{region}.amazonaws.com/{img.key}"
 
     try:
-        presigned_url = s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": img.key},
-            ExpiresIn=3600,
-        )
+        signed_url = presigned_url(img.key)
     except Exception as e:
         return JsonResponse({"ok": False, "error": f"Presign failed: {e}"}, status=500)
 
@@ -1320,7 +1318,7 @@ def get_image_url(request, image_id):
             "id": img.id,
             "key": img.key,
             "object_url": object_url,
-            "presigned_url": presigned_url,
+            "presigned_url": signed_url,
         }
     )
 
@@ -1358,11 +1356,7 @@ def upload_user_avatar(request, user_id: int):
 
     # Return a presigned URL to preview immediately
     try:
-        presigned = s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": key},
-            ExpiresIn=3600,
-        )
+        presigned = presigned_url(key)
     except Exception as e:
         return JsonResponse({"ok": False, "error": f"Presign failed: {e}"}, status=500)
 
@@ -1387,15 +1381,8 @@ def get_user_avatar_url(request, user_id: int):
         # Optional: return a default image (S3 key) or None
         return JsonResponse({"ok": True, "user_id": user_id, "image_key": None, "url": None})
 
-    s3 = get_s3_client()
-    bucket, region = get_bucket_and_region()
-
     try:
-        url = s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": user.image_key},
-            ExpiresIn=3600,
-        )
+        url = presigned_url(user.image_key)
     except Exception as e:
         return JsonResponse({"ok": False, "error": f"Presign failed: {e}"}, status=500)
 
@@ -1438,11 +1425,7 @@ def upload_user_avatar_helper(user_id: int, uploaded_file) -> dict:
             pass
 
     # Build presigned URL
-    url = s3.generate_presigned_url(
-        "get_object",
-        Params={"Bucket": bucket, "Key": new_key},
-        ExpiresIn=3600,
-    )
+    url = presigned_url(new_key)
 
     return {"ok": True, "key": new_key, "url": url}
 
@@ -1459,13 +1442,7 @@ def get_user_avatar_url_helper(user_id: int) -> str | None:
     if not user.image_key:
         return None
 
-    s3 = get_s3_client()
-    bucket, region = get_bucket_and_region()
-    return s3.generate_presigned_url(
-        "get_object",
-        Params={"Bucket": bucket, "Key": user.image_key},
-        ExpiresIn=3600,
-    )
+    return presigned_url(user.image_key)
 
 
 """Main functions"""
@@ -1486,16 +1463,10 @@ def home(request):
     return render(request, 'home.html', context)
 
 def video_url(video_key):
-    s3 = get_s3_client()
-    bucket, region = get_bucket_and_region()
     object_url = f"https://gshare-media-prod.s3.us-east-2.amazonaws.com/uploads/Tutorial_Video.mp4"
 
     try:
-        presigned_url = s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": video_key},
-            ExpiresIn=3600,
-        )
+        signed_url = presigned_url(video_key)
     except Exception as e:
         return JsonResponse({"ok": False, "error": f"Presign failed: {e}"}, status=500)
     return JsonResponse(
@@ -1503,7 +1474,7 @@ def video_url(video_key):
             "ok": True,
             "key": video_key,
             "object_url": object_url,
-            "presigned_url": presigned_url,
+            "presigned_url": signed_url,
         }
     )
 
@@ -1568,6 +1539,9 @@ def signup_view(request):
             return redirect('signup')
 
 
+        # make the new name searchable in chat autocomplete on every worker
+        username_index.add(u)
+
         # Login and redirect
         auth_login(request, auth_user)
         messages.success(request, "Account created successfully!")
@@ -1598,6 +1572,8 @@ def handlePasswordChange(request, newPassword):
     request.user.save()
 
 def updateProfile(profile, data, files):
+    old_email = profile.email
+
     if 'name' in data:
         profile.name = data['name']
     
@@ -1607,6 +1583,8 @@ def updateProfile(profile, data, files):
     if 'phone' in data:
         profile.phone = data['phone']
     
+    old_point = (profile.latitude, profile.longitude)
+
     if 'address' in data:
         address = data['address']
 
@@ -1633,6 +1611,9 @@ def updateProfile(profile, data, files):
     
     # Save the profile
     profile.save(using='gsharedb')
+    cart_engine.forget_shopper(old_email)
+    user_index.invalidate(old_point, (profile.latitude, profile.longitude))
+    map_tiles.bump_tiles_for_points([old_point, (profile.latitude, profile.longitude)])
     return True
 
 
@@ -1712,7 +1693,7 @@ def receipt_detail_view(request, rid: int):
     image_url = None
     if getattr(receipt, "s3_bucket", None) and getattr(receipt, "s3_key", None):
         try:
-            image_url = presigned_url(receipt.s3_bucket, receipt.s3_key)
+            image_url = presigned_url(receipt.s3_key, bucket=receipt.s3_bucket)
         except Exception:
             image_url = None
 
@@ -1883,23 +1864,12 @@ def receipt_match_orders_view(request, rid: int):
         print("No active delivery orders found for driver", driver_user_id and order_rows)
         return redirect("receipt_detail", rid=receipt.id)
 
-    # 3) For each order, pull items via raw SQL (avoids composite-PK ORM issues)
+    # 3) Pull every order's items in one query
+    lines_by_order = order_lines.get_lines_for_orders(oid for oid, _, _, _ in order_rows)
     for oid, status, store_id, order_date in order_rows:
-        with connections["gsharedb"].cursor() as cur:
-            cur.execute(
-                """
-                SELECT i.name, oi.quantity
-                FROM order_items oi
-                JOIN items i ON i.id = oi.item_id
-                WHERE oi.order_id = %s
-                """,
-                [oid],
-            )
-            item_rows = cur.fetchall()
-
         line_items = [
-            {"name": name, "quantity": float(qty or 0)}
-            for (name, qty) in item_rows
+            {"name": line.name, "quantity": float(line.quantity or 0)}
+            for line in lines_by_order[oid]
         ]
 
         candidate_orders.append(
@@ -2064,6 +2034,8 @@ def userprofile(request):
             return redirect('profile')
 
         if 'save_profile' in request.POST:
+            old_point = (profile.latitude, profile.longitude)
+            old_email = profile.email
             try:
                 with transaction.atomic(using='gsharedb'):
                     # ---- Profile fields ----
@@ -2096,6 +2068,11 @@ def userprofile(request):
                         if not res.get("ok"):
                             raise RuntimeError("Avatar upload failed")
 
+                # Drop the cached cart shopper and the map grid cells and tiles for the old and new location
+                cart_engine.forget_shopper(old_email)
+                user_index.invalidate(old_point, (profile.latitude, profile.longitude))
+                map_tiles.bump_tiles_for_points([old_point, (profile.latitude, profile.longitude)])
+
                 # Sync Django auth email if changed
                 if 'email' in request.POST and request.user.email != request.POST['email']:
                     request.user.email = request.POST['email']
@@ -2186,16 +2163,13 @@ def add_to_cart(request, item_id, quantity=1):
     print("Adding item to cart:", item_id)
     print("Quantity:", quantity)
 
-    profile = get_user("email", request.user.email)
+    profile = cart_engine.shopper_for(request.user.email)
     if not profile:
         messages.error(request, "Profile not found.")
         return redirect('cart')
 
-
-    # Grab item
-    try:
-        item = Items.objects.using('gsharedb').get(id=item_id)
-    except Items.DoesNotExist:
+    item = cart_engine.item_info(item_id)
+    if not item:
         messages.error(request, "Item not found.")
         return redirect('cart') 
     
@@ -2204,58 +2178,9 @@ def add_to_cart(request, item_id, quantity=1):
         or request.session.get('active_store_id') 
     )
 
-    active_store = None
-    active_store = Stores.objects.using('gsharedb').filter(id=active_store_id).first()
-
-    if(active_store_id == None):
-        active_store = Items.objects.using('gsharedb').filter(id=item_id).first().store
-
-    # Get or create cart
-    order = Orders.objects.using('gsharedb').filter(user=profile, status='cart').first()
-    if not order:
-        order = Orders.objects.using('gsharedb').create(
-            user=profile,
-            status='cart',
-            order_date=timezone.now(),
-            store=active_store,                  
-            total_amount=0,
-            delivery_address=profile.address,
-        )
-    else:
-        if active_store and (order.store_id != active_store.id):
-            order.store = active_store
-            order.save(using='gsharedb', update_fields=['store'])
-
-
-    # Upsert into order_items (composite PK table) and recompute total
-    with transaction.atomic(using='gsharedb'):
-        with connections['gsharedb'].cursor() as cur:
-            # Insert or bump quantity
-            cur.execute(
-                """
-                INSERT INTO order_items (order_id, item_id, quantity, price)
-                VALUES (%s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    quantity = quantity + VALUES(quantity)
-                """,
-                [order.id, item.id, quantity, str(item.price or 0)]
-            )
-
-            # RECALC TOTAL from line items
-            cur.execute(
-                """
-                SELECT COALESCE(SUM(quantity * price), 0)
-                FROM order_items
-                WHERE order_id = %s
-                """,
-                [order.id]
-            )
-            total = cur.fetchone()[0] or 0
-
-    # Update order fields using ORM
-    order.total_amount = total
-    order.order_date = timezone.now()
-    order.save(using='gsharedb')
+    # Find or create the cart, move its total, and insert or bump the line
+    cart_engine.add(profile, item, quantity, store_id=active_store_id)
+    map_tiles.bump_tiles_for_points([(profile.latitude, profile.longitude)])
     
     # Always return JSON for AJAX
     if request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.content_type == "application/json":
@@ -2267,58 +2192,23 @@ def add_to_cart(request, item_id, quantity=1):
 
 @login_required
 def remove_from_cart(request, item_id, quantity=1):
-    profile = get_user("email", request.user.email)
+    profile = cart_engine.shopper_for(request.user.email)
     if not profile:
         messages.error(request, "Profile not found.")
         return redirect('cart')
 
-    order = Orders.objects.using('gsharedb').filter(user=profile, status='cart').first()
-    if not order:
-        messages.error(request, "No active cart.")
-        return redirect('cart')
+    if not cart_engine.remove(profile, item_id, quantity):
+        messages.warning(request, "Item not found in cart.")
+        return redirect("cart_view")
 
-    with transaction.atomic(using='gsharedb'):
-
-        # RECALC TOTAL from line items
-        with connections['gsharedb'].cursor() as cur:
-            cur.execute("""
-                SELECT quantity FROM order_items
-                WHERE order_id=%s AND item_id=%s
-                LIMIT 1
-            """, [order.id, item_id])
-            line = cur.fetchone()
-            if not line:
-                messages.warning(request, "Item not found in cart.")
-                return redirect("cart_view")
-
-            if line[0] > quantity:
-                cur.execute("UPDATE order_items SET quantity=quantity-%s WHERE order_id=%s AND item_id=%s ", [quantity, order.id, item_id])
-            else:
-                cur.execute("DELETE FROM order_items WHERE order_id=%s AND item_id=%s ", [order.id, item_id])
-
-            # 3) Recompute order total
-            cur.execute("""
-                UPDATE orders o
-                JOIN (
-                    SELECT order_id, COALESCE(SUM(price * quantity),0) AS total
-                    FROM order_items
-                    WHERE order_id=%s
-                ) t ON t.order_id = o.id
-                SET o.total_amount = t.total
-                WHERE o.id=%s
-            """, [order.id, order.id])
-            total = cur.fetchone() or 0
-
-        order.total_amount = total
-        order.save(using='gsharedb')
-
-        item = Items.objects.using('gsharedb').filter(id=item_id).first()
+    item = cart_engine.item_info(item_id)
+    name = item.name if item else "item"
 
     # Always return JSON for AJAX
     if request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.content_type == "application/json":
-        return JsonResponse({"success": True, "message": f"removed {item.name} frpm your cart."})
+        return JsonResponse({"success": True, "message": f"removed {name} frpm your cart."})
 
-    messages.success(request, f"Removed {item.name} from your cart.")
+    messages.success(request, f"Removed {name} from your cart.")
     return redirect('shoppingcart')
 
 
@@ -2329,30 +2219,32 @@ def cart(request):
     search_query = request.GET.get('Item_Search_Bar', '').strip()
     zip_code = (request.GET.get('zip_code') or '').strip()
 
-    items = Items.objects.using('gsharedb').all()
+    store = None
     if store_filter and store_filter != 'All' and store_filter != 'Kroger':
-        items = items.filter(store__name=store_filter)
+        store = store_filter
+    lo = hi = None
     if price_filter and price_filter != 'Any':
         if price_filter == '100+':
-            items = items.filter(price__gte=100)
+            lo = 100
         else:
             lo, hi = map(float, price_filter.split('-'))
-            items = items.filter(price__gte=lo, price__lte=hi)
-    if search_query:
-        items = items.filter(name__icontains=search_query)
+
+    # Ranked by relevance when there is a query; keyset-paged via the cursor param
+    cursor = request.GET.get('cursor')
+    results = catalog_search.search(search_query, store=store, min_price=lo, max_price=hi, cursor=cursor)
 
     context = {
         'store_filter': store_filter,
         'price_filter': price_filter,
         'search_query': search_query,
         'zip_code': zip_code,
+        'page_obj': results.items,
+        'next_cursor': results.next_cursor,
+        'is_first_page': not cursor,
+        'result_count': results.count,
+        'more_results': results.more,
     }
 
-    paginator = Paginator(items, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    context['page_obj'] = page_obj
-
     if store_filter == 'Kroger':
         context['using_kroger'] = True
         if zip_code and search_query:
@@ -2480,6 +2372,14 @@ def upsert_kroger_store_from_location(loc):
     lat = geo.get("latitude")
     lng = geo.get("longitude")
 
+    if full_location:
+        if lat is not None and lng is not None:
+            geo_cache.remember(full_location, lat, lng)
+        else:
+            coords = geoLoc(full_location)
+            if coords != (0.0, 0.0):
+                lat, lng = coords
+
     defaults = {
         "name": store_name,     
         "street": street,
@@ -2586,7 +2486,7 @@ def save_kroger_results(request):
         except Exception:
             continue
 
-        _, was_created = Items.objects.using('gsharedb').update_or_create(
+        item, was_created = Items.objects.using('gsharedb').update_or_create(
             name=name,
             store=kroger_store,
             defaults={'price': price_dec, 'stock': 0, 'description': name}
@@ -2630,9 +2530,10 @@ def checkout(request):
     })
 
 import random
-def estimate_order_time(user_address, store_address, num_items, api_key):
-    
-    drive_info = drive_time(user_address, store_address, api_key)
+def estimate_order_time(user_address, store_address, num_items, api_key, drive_info=None):
+    # callers that already routed user -> store (pickup_price) pass it in
+    if drive_info is None:
+        drive_info = drive_time(user_address, store_address, api_key)
     print(f"drive info: {drive_info}")
     if not drive_info:
         return None
@@ -2657,83 +2558,56 @@ def estimate_order_time(user_address, store_address, num_items, api_key):
     }
     
 def drive_time(user_address, store_address, api_key):
-    print(f"api info: {api_key}")
-    url = f"https://maps.googleapis.com/maps/api/distancematrix/json?origins={user_address}&destinations={store_address}&key={api_key}"
-    
-    print(f"user_address info: {user_address}")
-
-    print(f"store_address info: {store_address}")
-    response = requests.get(url)
-    data = response.json()
-    print(f"data info: {data}")
-    
-    if data["status"] == "OK":
-        element = data['rows'][0]["elements"][0]
-        if element["status"] == "OK":
-            distance_text = element["distance"]["text"]
-            distance_value = element["distance"]["value"]
-            duration_text = element["duration"]["text"]
-            duration_value = element["duration"]["value"]
-            return {
-                "distance_text": distance_text,
-                "distance_value": distance_value,
-                "duration_text": duration_text,
-                "duration_value": duration_value,
-            }
-    return None
+    return routing.drive_time(user_address, store_address, api_key)
 
     
-def maps_data(request, min_lat, min_lng, max_lat, max_lng):
-    min_lat = float(min_lat)
-    min_lng = float(min_lng)
-    max_lat = float(max_lat)
-    max_lng = float(max_lng)
+MAP_ORDER_STATUSES = ("placed", "inprogress")
 
-    info = {}
+def _build_map_orders(min_lat, min_lng, max_lat, max_lng):
+    """
+    Viewer-independent map payload for a bounding box: every placed/in-progress
+    order with its items and current driver. maps_data and people_data cache
+    this per map tile and filter it for the viewer afterwards.
+    """
+    oiv = orders_in_viewport(min_lat, min_lng, max_lat, max_lng, statuses=MAP_ORDER_STATUSES)
 
-    viewer = get_user("email", request.user.email)
-    oiv = orders_in_viewport(min_lat, min_lng, max_lat, max_lng, viewer=viewer)
+    # Load deliveries and line items for every order up front (one query each)
+    order_ids = [order["order_id"] for order in oiv]
+    deliveries = get_latest_deliveries_for_orders(order_ids)
+    items_by_order = get_order_items_for_orders(order_ids)
 
+    orders = []
     for order in oiv:
-        address = order.get("delivery_address")
-        if not address:
-            continue
-
-        user = get_user("id", order["user"]["id"])
-
-        delivery = (
-            Deliveries.objects.using("gsharedb")
-            .filter(order_id=order["order_id"])
-            .select_related("delivery_person")
-            .first()
-        )
+        # orders without a delivery address are kept: maps_data still marks their store
+        user = order["user"]
+        delivery = deliveries.get(order["order_id"])
 
         driver_id = delivery.delivery_person.id if delivery and delivery.delivery_person else None
         driver_name = delivery.delivery_person.name if delivery and delivery.delivery_person else None
 
-        items = get_order_items_by_order_id(order["order_id"])
-
         subtotal = 0
         items_with_totals = []
-        for item in items:
-            total = float(item[2]) * float(item[5])  
+        for line in items_by_order.get(order["order_id"], []):
+            total = float(line.quantity) * float(line.item_price)
             subtotal += total
             items_with_totals.append(
                 {
-                    "name": item[4],          
-                    "quantity": int(item[2]),
-                    "price": float(item[5]),  
+                    "name": line.name,
+                    "quantity": int(line.quantity),
+                    "price": float(line.item_price),
                     "total": total,
                 }
             )
 
-        order_data = {
+        orders.append({
             "address": order["delivery_address"],
             "items": items_with_totals,
             "subtotal": subtotal,
             "order_id": order["order_id"],
-            "user": user.name,
-            "user_id": user.id,
+            "user": user["name"],
+            "user_id": user["id"],
+            "user_lat": user["latitude"],
+            "user_lng": user["longitude"],
             "store_id": order.get("store_id"),
             "store_name": order.get("store_name", ""),
             "store_address": order.get("store_address", ""),
@@ -2742,8 +2616,72 @@ def maps_data(request, min_lat, min_lng, max_lat, max_lng):
             "status": order["status"],
             "driver_id": driver_id,
             "driver_name": driver_name,
-        }
+        })
+
+    return orders
+
+def _map_orders_for_viewport(min_lat, min_lng, max_lat, max_lng):
+    """
+    Snap the viewport to map tiles and return the map orders inside the
+    viewport, served from the tile cache. Viewports too large to tile are
+    built directly.
+    """
+    tiles = map_tiles.tiles_for_viewport(min_lat, min_lng, max_lat, max_lng)
+    if tiles is None:
+        return _build_map_orders(min_lat, min_lng, max_lat, max_lng)
+
+    payloads = map_tiles.get_tile_payloads(
+        tiles, lambda tile: _build_map_orders(*map_tiles.tile_bounds(tile))
+    )
+
+    seen = set()
+    orders = []
+    for tile in tiles:
+        for order_data in payloads[tile]:
+            if order_data["order_id"] in seen:
+                continue
+            seen.add(order_data["order_id"])
+            # tiles overhang the viewport; keep only orders the viewer can see
+            point = {"latitude": order_data["user_lat"], "longitude": order_data["user_lng"]}
+            if _in_viewport(point, min_lat, min_lng, max_lat, max_lng):
+                orders.append(order_data)
+    return orders
 
+def _map_order_visible_to(order_data, viewer):
+    """Placed orders are public; in-progress ones only to their buyer and driver."""
+    if order_data["status"] == "placed":
+        return True
+    return viewer is not None and viewer.id in (order_data["user_id"], order_data["driver_id"])
+
+def _viewport_bounds(*bounds):
+    """(min_lat, min_lng, max_lat, max_lng) floats from URL strings, or None if any is not a finite number."""
+    try:
+        bounds = tuple(float(b) for b in bounds)
+    except ValueError:
+        return None
+    return bounds if all(math.isfinite(b) for b in bounds) else None
+
+def maps_data(request, min_lat, min_lng, max_lat, max_lng):
+    bounds = _viewport_bounds(min_lat, min_lng, max_lat, max_lng)
+    if bounds is None:
+        return HttpResponseBadRequest("Invalid bounds")
+    min_lat, min_lng, max_lat, max_lng = bounds
+
+    info = {}
+    store_addresses = []
+
+    viewer = get_user("email", request.user.email)
+
+    for order_data in _map_orders_for_viewport(min_lat, min_lng, max_lat, max_lng):
+        if not _map_order_visible_to(order_data, viewer):
+            continue
+
+        if order_data["store_address"]:
+            store_addresses.append(order_data["store_address"])
+
+        address = order_data["address"]
+        if not address:
+            continue
         if address not in info:
             info[address] = {
                 "address": address,
@@ -2752,10 +2690,7 @@ def maps_data(request, min_lat, min_lng, max_lat, max_lng):
             }
         info[address]["orders"].append(order_data)
 
-    for order in oiv:
-        store_address = order.get("store_address")
-        if not store_address:
-            continue
+    for store_address in store_addresses:
         if store_address not in info:
             info[store_address] = {
                 "address": store_address,
@@ -2763,7 +2698,7 @@ def maps_data(request, min_lat, min_lng, max_lat, max_lng):
                 "orders": [], 
             }
 
-    user_name = get_user("email", request.user.email).name
+    user_name = viewer.name
 
     grouped_info = list(info.values())
 
@@ -2772,63 +2707,57 @@ def maps_data(request, min_lat, min_lng, max_lat, max_lng):
     return response
 
 
-def people_data(request, min_lat, min_lng, max_lat, max_lng):
-    min_lat = float(min_lat)
-    min_lng = float(min_lng)
-    max_lat = float(max_lat)
-    max_lng = float(max_lng)
-    
-    # users = _users_in_viewport(min_lat, min_lng, max_lat, max_lng, limit=500)
-        
-    orders = orders_in_viewport(min_lat, min_lng, max_lat, max_lng, limit=20)
+def people_data(request, min_lat, min_lng, max_lat, max_lng, limit=20):
+    bounds = _viewport_bounds(min_lat, min_lng, max_lat, max_lng)
+    if bounds is None:
+        return HttpResponseBadRequest("Invalid bounds")
+    min_lat, min_lng, max_lat, max_lng = bounds
     
     people_info = []
+    people_ids = set()
 
-    for order in orders:
-        address = order.get('delivery_address')
-        if not address:
+    for order_data in _map_orders_for_viewport(min_lat, min_lng, max_lat, max_lng):
+        if order_data["status"] != "placed" or not order_data["address"]:
             continue
 
-        user_info = order.get('user')
-        if not user_info:
-            continue
-
-        # Optional: load extra user data if needed
-        # user = get_user("id", user_info['id'])
+        # cap the list at `limit` distinct people, keeping all of their orders
+        if order_data["user_id"] not in people_ids:
+            if len(people_ids) >= limit:
+                continue
+            people_ids.add(order_data["user_id"])
 
-        items = get_order_items_by_order_id(order['order_id'])
-        
         #  maybe find the distance between user and order owner here
 
-        subtotal = 0
-        total_items = 0
-        for item in items:
-            # assuming item format: (id, order_id, quantity, ..., price, ...)
-            quantity = float(item[2])
-            price = float(item[5])
-            subtotal += quantity * price
-            total_items += int(quantity)
-
-        # attach full order data to each person
-        order_data = {
-            'order_id': order['order_id'],
-            'item_total': total_items,
-            'subtotal': round(subtotal, 2),
-        }
+        subtotal = sum(item["total"] for item in order_data["items"])
+        total_items = sum(item["quantity"] for item in order_data["items"])
 
         person_entry = {
-            'id': user_info['id'],
-            'name': user_info['name'],
-            'address': address,
-            'latitude': user_info.get('latitude'),
-            'longitude': user_info.get('longitude'),
-            'order_data': order_data,
+            'id': order_data["user_id"],
+            'name': order_data["user"],
+            'address': order_data["address"],
+            'latitude': order_data["user_lat"],
+            'longitude': order_data["user_lng"],
+            'order_data': {
+                'order_id': order_data["order_id"],
+                'item_total': total_items,
+                'subtotal': round(subtotal, 2),
+            },
         }
 
         people_info.append(person_entry)
 
     return JsonResponse({'people': people_info}, safe=False)
 
+@login_required
+def live_data(request, min_lat, min_lng, max_lat, max_lng):
+    """Drivers currently sharing their location inside the viewport (snapshot of the LocationHub stream)."""
+    bbox = _viewport_bounds(min_lat, min_lng, max_lat, max_lng)
+    if bbox is None:
+        return HttpResponseBadRequest("Invalid bounds")
+
+    drivers = get_presence().in_viewport(*bbox, role="driver")
+    return JsonResponse({'drivers': drivers or []})
+
 @login_required
 def maps(request):
     stores = Stores.objects.all()
@@ -2860,35 +2789,11 @@ def placed_data(request):
     if not orders:
         return JsonResponse({'items': [], 'order': {'subtotal': 0, 'tax': 0, 'total': 0}, 'id': None})
 
-    order_list = []
-    
-    for order in orders:
-        items = get_order_items(order) if order else []
-        subtotal = 0
-        items_with_totals = []
-        for item in items:
-            total = item[2] * item[5]  # quantity * price
-            subtotal += total
-            items_with_totals.append({
-                'name': item[4],  # item name
-                'quantity': item[2],
-                'price': item[5],  # item price
-                'total': total,
-            })
-        
-        tax = Decimal(calculate_tax(subtotal)) / 100
-        grand_total = round(subtotal + tax, 2)
-
-        order_summary = {
-            'subtotal': subtotal,
-            'tax': tax,
-            'total': grand_total,
-        }
-        order_list.append({
-            'id': order.id,
-            'summary': order_summary,
-            'items': items_with_totals,
-        })
+    summaries = OrderSummaryService().summarize(order.id for order in orders)
+    order_list = [
+        {'id': order_id, 'summary': s['summary'], 'items': s['items']}
+        for order_id, s in summaries.items()
+    ]
     print(order_list)
     return JsonResponse({
         'orders': order_list
@@ -2909,35 +2814,13 @@ def pending_orders(request):
         return JsonResponse({'items': [], 'order': {'subtotal': 0, 'tax': 0, 'total': 0}, 'id': None})
 
     order_list = []
-    for order in orders:
-        items = get_order_items(order) if order else []
-        order_id = order.id
-        delivery = get_delivery_for_order(order)
-        print("delivery:", delivery)
-        subtotal = 0
-        items_with_totals = []
-        for item in items:
-            total = item[2] * item[5]  # quantity * price
-            subtotal += total
-            items_with_totals.append({
-                'name': item[4],  # item name
-                'quantity': item[2],
-                'price': item[5],  # item price
-                'total': total,
-            })
-        
-        tax = Decimal(calculate_tax(subtotal)) / 100
-        grand_total = round(subtotal + tax, 2)
-
-        order_summary = {
-            'subtotal': subtotal,
-            'tax': tax,
-            'total': grand_total,
-        }
+    summaries = OrderSummaryService().summarize((order.id for order in orders), with_delivery=True)
+    for order_id, s in summaries.items():
+        delivery = s['delivery']
         order_list.append({
-            'id': order.id,
-            'summary': order_summary,
-            'items': items_with_totals,
+            'id': order_id,
+            'summary': s['summary'],
+            'items': s['items'],
             'delivery_person': delivery.delivery_person.name if delivery and delivery.delivery_person else None,
             'delivery_person_id': delivery.delivery_person.id if delivery and delivery.delivery_person else None,
         })
@@ -2960,72 +2843,27 @@ def inprogress_data(request):
     if not my_orders:
         return JsonResponse({'items': [], 'order': {'subtotal': 0, 'tax': 0, 'total': 0}, 'id': None})
 
+    deliveries = list(get_orders_by_delivery_person(profile, 'inprogress'))
+    print("deliveries:", deliveries)
+
+    # my orders and the orders I'm delivering are summarized together
+    my_order_ids = [order.id for order in my_orders]
+    delivery_order_ids = [d.order_id for d in deliveries]
+    summaries = OrderSummaryService().summarize(my_order_ids + delivery_order_ids)
+
     my_order_list = []
-    
-    for order in my_orders:
-        items = get_order_items(order) if order else []
-        if (items.__len__() == 0):
+    for order_id in my_order_ids:
+        s = summaries[order_id]
+        if not s['items']:
             continue
-        subtotal = 0
-        items_with_totals = []
-        for item in items:
-            total = item[2] * item[5]  # quantity * price
-            subtotal += total
-            items_with_totals.append({
-                'name': item[4],  # item name
-                'quantity': item[2],
-                'price': item[5],  # item price
-                'total': total,
-            })
-        
-        tax = Decimal(calculate_tax(subtotal)) / 100
-        grand_total = round(subtotal + tax, 2)
+        my_order_list.append({'id': order_id, 'summary': s['summary'], 'items': s['items']})
 
-        order_summary = {
-            'subtotal': subtotal,
-            'tax': tax,
-            'total': grand_total,
-        }
-        my_order_list.append({
-            'id': order.id,
-            'summary': order_summary,
-            'items': items_with_totals,
-        })
-        
     my_deliveries = []
-    deliveries = get_orders_by_delivery_person(profile, 'inprogress')
-    print("deliveries:", deliveries)
-        
-    for order in deliveries:
-        print("order:", order)
-        items = get_order_items(order) if order else []
-        if(items.__len__() == 0):
+    for order_id in delivery_order_ids:
+        s = summaries[order_id]
+        if not s['items']:
             continue
-        subtotal = 0
-        items_with_totals = []
-        for item in items:
-            total = item[2] * item[5]  # quantity * price
-            subtotal += total
-            items_with_totals.append({
-                'name': item[4],  # item name
-                'quantity': item[2],
-                'price': item[5],  # item price
-                'total': total,
-            })
-        
-        tax = Decimal(calculate_tax(subtotal)) / 100
-        grand_total = round(subtotal + tax, 2)
-
-        order_summary = {
-            'subtotal': subtotal,
-            'tax': tax,
-            'total': grand_total,
-        }
-        my_deliveries.append({
-            'id': order.id,
-            'summary': order_summary,
-            'items': items_with_totals,
-        })
+        my_deliveries.append({'id': order_id, 'summary': s['summary'], 'items': s['items']})
     print(my_deliveries)
     return JsonResponse({
         'orders': my_order_list,
@@ -3080,18 +2918,18 @@ def group_data(request):
         orders_payload = []
 
         # Build each order
+        lines_by_order = order_lines.get_lines_for_orders(order.id for order in orders)
         for order in orders:
             items_list = []
-            items = get_order_items(order)
 
-            for item in items:
-                quantity = Decimal(item[2])
-                price = Decimal(item[5])
+            for line in lines_by_order[order.id]:
+                quantity = Decimal(line.quantity)
+                price = Decimal(line.item_price)
                 total = quantity * price
                 combined_subtotal += total
 
                 items_list.append({
-                    "name": item[4],
+                    "name": line.name,
                     "quantity": int(quantity),
                     "price": float(price),
                     "total": float(total),
@@ -3135,7 +2973,7 @@ def publish_group_order(request, group_id: int):
     Create a master 'group order' for the group owner, with all items
     from each member's order combined. Master -> status='placed'.
     Child orders -> status='placedGroup', group_master_order=master.
-    Uses raw SQL for order_items because table has composite PK and no id.
+    order_items has a composite PK and no id, so lines go through core.utils.order_lines.
     """
     app_user = get_app_user_from_request(request)
     if not app_user:
@@ -3181,40 +3019,24 @@ def publish_group_order(request, group_id: int):
         #    aggregate: item_id -> {quantity, price}
         aggregate = {}
 
-        for m in memberships:
-            child_order = m.order
-            # your helper returns tuples; indexes must match your existing code
-            # e.g. (order_id, item_id, quantity, ..., name, price, ...)
-            items = get_order_items_by_order_id(child_order.id)
-
-            for row in items:
-                item_id = row[1]          # item_id
-                quantity = int(row[2])    # quantity
-                price = Decimal(row[5])   # price
-
-                if item_id not in aggregate:
-                    aggregate[item_id] = {
+        lines_by_order = order_lines.get_lines_for_orders(m.order_id for m in memberships)
+        for lines in lines_by_order.values():
+            for line in lines:
+                if line.item_id not in aggregate:
+                    aggregate[line.item_id] = {
                         "quantity": 0,
-                        "price": price,
+                        "price": Decimal(line.item_price),
                     }
-                aggregate[item_id]["quantity"] += quantity
-
-        # 3) Insert into order_items with raw SQL (no id column)
-        total_amount = Decimal("0.00")
-        with connections["gsharedb"].cursor() as cur:
-            for item_id, data in aggregate.items():
-                qty = data["quantity"]
-                price = data["price"]
+                aggregate[line.item_id]["quantity"] += int(line.quantity)
 
-                cur.execute(
-                    """
-                    INSERT INTO order_items (order_id, item_id, quantity, price)
-                    VALUES (%s, %s, %s, %s)
-                    """,
-                    [master_order.id, item_id, qty, price],
-                )
-
-                total_amount += price * Decimal(qty)
+        # 3) Insert the combined lines in one batch
+        order_lines.insert_lines(
+            master_order.id,
+            [(item_id, data["quantity"], data["price"]) for item_id, data in aggregate.items()],
+        )
+        total_amount = sum(
+            (data["price"] * Decimal(data["quantity"]) for data in aggregate.values()), Decimal("0.00")
+        )
 
         # 4) Update master order total
         master_order.total_amount = total_amount
@@ -3233,6 +3055,8 @@ def publish_group_order(request, group_id: int):
         group.status = "published"
         group.save(using="gsharedb")
 
+    map_tiles.bump_tiles_for_orders([master_order.id] + [m.order_id for m in memberships])
+
     return JsonResponse({
         "ok": True,
         "master_order_id": master_order.id,
@@ -3252,32 +3076,11 @@ def cart_data(request):
     if not order:
         return JsonResponse({'items': [], 'order': {'subtotal': 0, 'tax': 0, 'total': 0}, 'id': None})
 
-    items = get_order_items(order[0]) if order[0] else []
-    subtotal = 0
-    items_with_totals = []
-    for item in items:
-        total = item[2] * item[5]  # quantity * price
-        subtotal += total
-        items_with_totals.append({
-            'name': item[4],  # item name
-            'quantity': item[2],
-            'price': item[5],  # item price
-            'total': total,
-            'id': item[1],  # item id
-        })
-        
-    tax = Decimal(calculate_tax(subtotal))/100  # Convert to dollars for display
-    grand_total = round(subtotal + tax, 2)
-
-    order_summary = {
-        'subtotal': subtotal,
-        'tax': tax,
-        'total': grand_total,
-    }
+    cart = OrderSummaryService().summarize([order[0].id])[order[0].id]
     return JsonResponse({
-        'items': items_with_totals,
-        'order': order_summary,
-        'id': order[0].id if order else None,
+        'items': cart['items'],
+        'order': cart['summary'],
+        'id': order[0].id,
     })
     
 def group_carts(request):
@@ -3292,35 +3095,11 @@ def group_carts(request):
     if not orders:
         return JsonResponse({'carts': []})
 
-    carts = []
-    for order in orders:
-        items = get_order_items(order) if order else []
-        subtotal = 0
-        items_with_totals = []
-        for item in items:
-            total = item[2] * item[5]  # quantity * price
-            subtotal += total
-            items_with_totals.append({
-                'name': item[4],  # item name
-                'quantity': item[2],
-                'price': item[5],  # item price
-                'total': total,
-            })
-            
-        tax = Decimal(calculate_tax(subtotal))/100  # Convert to dollars for display
-        grand_total = round(subtotal + tax, 2)
-
-        order_summary = {
-            'subtotal': subtotal,
-            'tax': tax,
-            'total': grand_total,
-        }
-
-        carts.append({
-            'order_id': order.id,
-            'items': items_with_totals,
-            'order_summary': order_summary,
-        })
+    summaries = OrderSummaryService().summarize(order.id for order in orders)
+    carts = [
+        {'order_id': order_id, 'items': s['items'], 'order_summary': s['summary']}
+        for order_id, s in summaries.items()
+    ]
 
     return JsonResponse({'carts': carts})
 
@@ -3346,15 +3125,15 @@ def shoppingcart(request):
     items = get_order_items(order[0]) if order[0] else []
     subtotal = 0
     items_with_totals = []
-    for item in items:
-        total = item[2] * item[5]  # quantity * price
+    for line in items:
+        total = line.quantity * line.item_price
         subtotal += total
-        print(item)
+        print(line)
         items_with_totals.append({
-            'id': item[1],  # item id
-            'name': item[4],  # item name
-            'quantity': item[2],
-            'price': item[5],  # item price
+            'id': line.item_id,
+            'name': line.name,
+            'quantity': line.quantity,
+            'price': line.item_price,
             'total': total,
         })
         
@@ -3385,16 +3164,15 @@ def myorders(request):
     
     # each tuple is (order, items)
     orders_with_items = []
+    lines_by_order = order_lines.get_lines_for_orders(order.id for order in all_orders)
     for order in all_orders:
-        items = get_order_items(order)
         items_with_totals = []
-        for item in items:
-            total = item[2] * item[5]  # quantity * price
+        for line in lines_by_order[order.id]:
             items_with_totals.append({
-                'name': item[4],  # item name
-                'quantity': item[2],
-                'price': item[5],  # item price
-                'total': total,
+                'name': line.name,
+                'quantity': line.quantity,
+                'price': line.item_price,
+                'total': line.quantity * line.item_price,
             })
         orders_with_items.append((order, items_with_totals))
 
@@ -3453,7 +3231,7 @@ def payments(request, order_id):
         # carts data
         for ord in orders:
             items = get_order_items(ord)
-            subtotal = sum(item[2] * item[5] for item in items)  # quantity * price
+            subtotal = sum(line.quantity * line.item_price for line in items)
             tax = Decimal(calculate_tax(subtotal)) / 100  # Convert to dollars for display
             total = round(subtotal + tax, 2)
             user_name = ord.user.name
@@ -3485,7 +3263,7 @@ def payments(request, order_id):
 
         for ord in orders:
             items = get_order_items(ord)
-            subtotal = sum(item[2] * item[5] for item in items)  # quantity * price
+            subtotal = sum(line.quantity * line.item_price for line in items)
             tax = Decimal(calculate_tax(subtotal)) / 100  # Convert to dollars for display
             total = round(subtotal + tax, 2)
             user_name = ord.user.name
@@ -3566,18 +3344,18 @@ def paymentsCheckout(request, order_id):
         
         itemObjects = []
         for oi in orderItems:
-            # oi: (order_id, item_id, quantity, price, name, item_price, store_id)
+            # charged at the price stored on the line
             itemObjects.append({
                 'price_data': {
                     'currency': 'usd',
-                    'product_data': {'name': oi[4]},
-                    'unit_amount': int(oi[3] * 100),  # cents
+                    'product_data': {'name': oi.name},
+                    'unit_amount': int(oi.price * 100),  # cents
                 },
-                'quantity': oi[2],
+                'quantity': oi.quantity,
             })
 
         # BELOW IS fallback for tax: add a manual 7% tax line (when not using Automatic Tax)
-        subtotal_cents = int(sum(oi[2] * oi[3] for oi in orderItems) * 100)
+        subtotal_cents = int(sum(oi.quantity * oi.price for oi in orderItems) * 100)
         tax_cents = int(round(subtotal_cents * Decimal('0.07')))
         if tax_cents > 0:
             itemObjects.append({
@@ -3644,10 +3422,14 @@ def createGroupForShoppingCart(request, order_id):
 import math
 def pickup_price(user_location, drop_off_location, num_items, store_address, api_key, base_rate=2.0, scale=0.3, item_rate=0.3):
     
-    distance_from_user_to_store = drive_time(user_location, store_address, api_key)
-    distance_from_dropoff_to_store = drive_time(drop_off_location, store_address, api_key)
-    
-    time_taken = estimate_order_time(user_location, store_address, num_items, api_key)
+    # one matrix request (or cache hit) covers both legs and the time estimate
+    (distance_from_user_to_store,), (distance_from_dropoff_to_store,) = routing.drive_matrix(
+        [user_location, drop_off_location], [store_address], api_key
+    )
+
+    time_taken = estimate_order_time(
+        user_location, store_address, num_items, api_key, drive_info=distance_from_user_to_store
+    )
     time_cost = time_taken['total_estimate'] * 0.05
     
     diff_distance = abs(distance_from_user_to_store['distance_value'] - distance_from_dropoff_to_store['distance_value'])
@@ -3858,6 +3640,7 @@ def group_map(request, slug):
 def join_group(request, slug):
     group = get_object_or_404(ChatGroup, slug=slug)
     group.members.add(request.user)
+    announce_membership_change(group)
     return redirect('group_map', slug=slug)
 
 # Voice Orders
@@ -3867,8 +3650,8 @@ def getItemNamesForUser(user, statuses = ['delivered']):
         orders = get_orders(user, status)
         for order in orders:
             items = get_order_items(order)
-            for row in items:
-                namesAndId.append((row[4], row[1]))
+            for line in items:
+                namesAndId.append((line.name, line.item_id))
 
     return namesAndId
 
@@ -3910,6 +3693,11 @@ def _parseCartEntry(entry):
         quantity = int(quantity)
     except (TypeError, ValueError):
         quantity = 1
+
+    try:
+        item_id = int(item_id)
+    except (TypeError, ValueError):
+        return None
     
     if not item_id or quantity <= 0:
         return None
@@ -3922,72 +3710,37 @@ def _getOrCreateCartOrder(profile, item_store=None):
     order = Orders.objects.using('gsharedb').filter(user=profile, status='cart').first()
     
     if not order and item_store:
-        order = Orders.objects.using('gsharedb').create(
-            user=profile,
-            status='cart',
-            order_date=timezone.now(),
-            store=item_store,
-            total_amount=0,
-            delivery_address=profile.address,
-        )
+        try:
+            with transaction.atomic(using='gsharedb'):
+                order = Orders.objects.using('gsharedb').create(
+                    user=profile,
+                    status='cart',
+                    order_date=timezone.now(),
+                    store=item_store,
+                    total_amount=0,
+                    delivery_address=profile.address,
+                )
+        except IntegrityError:
+            # a concurrent add created the cart first (one cart per user)
+            order = Orders.objects.using('gsharedb').filter(user=profile, status='cart').first()
     
     return order
 
 
-def _addItemToCart(cursor, order_id, item_id, quantity, price):
-    """Add or update item quantity in cart."""
-    cursor.execute(
-        """
-        INSERT INTO order_items (order_id, item_id, quantity, price)
-        VALUES (%s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            quantity = quantity + VALUES(quantity)
-        """,
-        [order_id, item_id, quantity, str(price or 0)],
-    )
+def _addItemsToCart(order_id, lines):
+    """Add or bump (item_id, quantity, price) lines in one batch."""
+    order_lines.add_lines(order_id, lines)
 
 
-def _removeItemFromCart(cursor, order_id, item_id, quantity):
-    """Remove or reduce item quantity from cart. Returns True if operation succeeded."""
-    cursor.execute("""
-        SELECT quantity FROM order_items
-        WHERE order_id=%s AND item_id=%s
-        LIMIT 1
-    """, [order_id, item_id])
-    
-    row = cursor.fetchone()
-    if not row:
-        return False
-    
-    current_qty = row[0]
-    
-    if current_qty > quantity:
-        cursor.execute("""
-            UPDATE order_items 
-            SET quantity = quantity - %s 
-            WHERE order_id=%s AND item_id=%s
-        """, [quantity, order_id, item_id])
-    else:
-        cursor.execute("""
-            DELETE FROM order_items 
-            WHERE order_id=%s AND item_id=%s
-        """, [order_id, item_id])
-    
-    return True
+def _removeItemsFromCart(order_id, items):
+    """Reduce or remove (item_id, quantity) lines. Returns the item ids that were in the cart."""
+    return order_lines.remove_quantities(order_id, items)
 
 
-def _recalculateOrderTotal(cursor, order):
+def _recalculateOrderTotal(order):
     """Recalculate and update order total."""
-    cursor.execute(
-        """
-        SELECT COALESCE(SUM(quantity * price), 0)
-        FROM order_items
-        WHERE order_id = %s
-        """,
-        [order.id],
-    )
-    total = cursor.fetchone()[0] or 0
-    
+    total = order_lines.order_total(order.id)
+
     order.total_amount = total
     order.order_date = timezone.now()
     order.save(using='gsharedb')
@@ -4015,49 +3768,38 @@ def apply_voice_cart_items(profile, cart):
     removed_count = 0
 
     with transaction.atomic(using='gsharedb'):
-        with connections['gsharedb'].cursor() as cur:
-            # Process items to ADD
-            for entry in items:
-                parsed = _parseCartEntry(entry)
-                if not parsed:
-                    continue
-                
-                item_id, quantity = parsed
-                
-                try:
-                    item = Items.objects.using('gsharedb').get(id=item_id)
-                except Items.DoesNotExist:
-                    continue
-
-                if order is None:
-                    order = _getOrCreateCartOrder(profile, item.store)
-                
-                _addItemToCart(cur, order.id, item.id, quantity, item.price)
-                added_count += 1
-            
-            # Process items to REMOVE
-            for entry in items_to_remove:
-                parsed = _parseCartEntry(entry)
-                if not parsed:
-                    continue
-                
-                item_id, quantity = parsed
-                
-                if order is None:
-                    order = _getOrCreateCartOrder(profile)
-                    if not order:
-                        continue
-                
-                if _removeItemFromCart(cur, order.id, item_id, quantity):
-                    removed_count += 1
-
-            # Recalculate order total if we have an order
-            if order is not None:
-                _recalculateOrderTotal(cur, order)
-            else:
-                if added_count == 0 and removed_count == 0:
-                    return {"success": False, "error": "No valid items to add or remove"}
-                return {"success": True, "order_id": None, "added_count": 0, "removed_count": 0}
+        # Process items to ADD
+        to_add = [p for p in map(_parseCartEntry, items) if p]
+        found = Items.objects.using('gsharedb').select_related('store').in_bulk([item_id for item_id, _ in to_add])
+        lines = []
+        for item_id, quantity in to_add:
+            item = found.get(item_id)
+            if item is None:
+                continue
+
+            if order is None:
+                order = _getOrCreateCartOrder(profile, item.store)
+
+            lines.append((item.id, quantity, item.price))
+        if lines:
+            _addItemsToCart(order.id, lines)
+            added_count = len(lines)
+
+        # Process items to REMOVE
+        to_remove = [p for p in map(_parseCartEntry, items_to_remove) if p]
+        if to_remove and order is None:
+            order = _getOrCreateCartOrder(profile)
+        if to_remove and order is not None:
+            present = _removeItemsFromCart(order.id, to_remove)
+            removed_count = sum(1 for item_id, _ in to_remove if item_id in present)
+
+        # Recalculate order total if we have an order
+        if order is not None:
+            _recalculateOrderTotal(order)
+        else:
+            if added_count == 0 and removed_count == 0:
+                return {"success": False, "error": "No valid items to add or remove"}
+            return {"success": True, "order_id": None, "added_count": 0, "removed_count": 0}
 
     return {
         "success": True, 
@@ -4085,7 +3827,7 @@ def voice_order_chat(request):
     user = get_user("email", request.user.email)
     userPastItems = getItemNamesForUser(user, ["delivered"])
     userCartItems = get_user_cart_items(user)
-    allItems = getAllItemsFromDatabase()
+    allItems = getAllItemsFromCatalog()
     context_lines = []
     if userPastItems:
         context_lines.append("User past items (name and ID):")
@@ -4183,13 +3925,18 @@ def voice_order_chat(request):
         return JsonResponse({"success": False, "error": "Empty response from AI"}, status=502)
     return JsonResponse({"success": True, "assistant": assistant_msg})
 
-def getAllItemsFromDatabase():
-    items_qs = Items.objects.using('gsharedb').select_related('store').values(
-        'id', 'name', 'store__name', 'price'
-    )
-
-    result = []
-    for row in items_qs:
-        result.append((row.get('name'), row.get('id'), row.get('store__name'), row.get('price')))
-
-    return result
+def getAllItemsFromCatalog():
+    """
+    Every item as (name, id, store_name, price), read from the shared catalog
+    snapshot instead of loading the items + stores join on each request.
+    """
+    try:
+        snap = catalog_snapshot.current()
+    except Exception as e:
+        print(f"Catalog snapshot unavailable, reading items from the database: {e}")
+        snap = None
+    if snap is not None:
+        return snap
+    # no snapshot yet (the first one is being built in the background)
+    items_qs = Items.objects.using('gsharedb').values_list('name', 'id', 'store__name', 'price')
+    return list(items_qs)